@@ -1,11 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, request
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, request, Response
 import json
+import math
 import unicodedata
 import atexit, os
-import re
+import threading
+import time
 from services import db, buscador
+from services import arbol
+from services import difusion
+from services import intenciones
+from services import nombres
+from services import compatibilidad
 from services import efecto
-from datetime import datetime, timedelta
+from services import persistencia
+from datetime import datetime
 import random
 from services.gestor import GestorEventos
 from services.efecto import edad_actual
@@ -20,6 +28,11 @@ gestor: GestorEventos | None = None
 app.config["LAST_GESTOR_EVENTS"] = []
 app._gestor_started = False  # evita doble arranque con el reloader
 
+# Carpeta del diario + snapshots de las familias (persistencia entre reinicios)
+app.config["ESTADO_DIR"] = os.environ.get("ARBOL_ESTADO_DIR") or os.path.join(
+    os.path.dirname(__file__), "data", "estado"
+)
+
 def _start_gestor_if_needed():
     # En modo debug, Flask lanza un proceso padre y otro hijo; solo arrancamos en el hijo.
     if app.debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
@@ -27,9 +40,21 @@ def _start_gestor_if_needed():
     if getattr(app, "_gestor_started", False):
         return
 
+    # Restaurar familias guardadas (snapshot + deltas del diario) antes de que el simulador empiece a mutarlas
+    almacen = persistencia.abrir(app.config["ESTADO_DIR"])
+    app.logger.info("Estado restaurado en %ss (%s operaciones del diario)",
+                    almacen.stats["segundos"], almacen.stats["operaciones_repetidas"])
+
     def on_cambios(eventos):
         app.logger.info("Tick gestor: %s eventos", len(eventos))
         app.config["LAST_GESTOR_EVENTS"] = eventos
+        # A los navegadores suscriptos a /api/stream
+        difusion.publicar("tick", {"hoy": gestor.hoy.isoformat(), "eventos": eventos})
+        difusion.publicar("reloj", _reloj(gestor.reloj()))
+
+    def on_delta(delta):
+        persistencia.registrar_tick(delta)
+        arbol.registrar_delta(delta)  # nacimientos se agregan al árbol cacheado sin rearmarlo
 
     global gestor
     gestor = GestorEventos(
@@ -37,10 +62,16 @@ def _start_gestor_if_needed():
         anios_por_tick=1,
         rng_seed=42,
         on_change=on_cambios,
+        on_delta=on_delta,
         max_uniones_por_familia_por_tick=1,
         prob_nacimiento_por_pareja_por_tick=0.005, 
+        trabajadores=int(os.environ.get("ARBOL_SIM_TRABAJADORES", "1")),
     )
+    if almacen.hoy:
+        # Seguir desde la fecha simulada guardada, no desde hoy
+        gestor.hoy = datetime.fromisoformat(almacen.hoy).date()
     gestor.start()
+    threading.Thread(target=_emitir_reloj, name="reloj-stream", daemon=True).start()
     app._gestor_started = True
 
 # Flask 3 Calcula si hay versiones antiguas y si no, de una sirve la app!
@@ -66,6 +97,7 @@ if hasattr(app, "after_serving"):
                 gestor.stop()
             except Exception:
                 pass
+        persistencia.cerrar()
 else:
     @atexit.register
     def _stop_gestor():
@@ -75,8 +107,20 @@ else:
                 gestor.stop()
             except Exception:
                 pass
+        persistencia.cerrar()
 # --- fin simulador ---
 
+# Las vistas que recorren matrices o dicts de personas leen bajo db.lectura():
+# el tick del simulador (escritor) no las deja ver a medio aplicar y viceversa.
+from functools import wraps
+
+def solo_lectura(vista):
+    @wraps(vista)
+    def envuelta(*args, **kwargs):
+        with db.lectura():
+            return vista(*args, **kwargs)
+    return envuelta
+
 # Limpiar Cookies
 import uuid
 BOOT_ID = uuid.uuid4().hex
@@ -134,182 +178,64 @@ def personas():
     return render_template("personas.html", **ctx())
 
 @app.route("/ver_matriz")
+@solo_lectura
 def ver_matriz():
     fam = session.get("familia_activa")
     matriz = db.obtener_matriz(fam) if fam else None
-    return {
+    # jsonify serializa acá mismo, todavía dentro de la lectura
+    return jsonify({
         "familia_activa": fam,
         "matriz": matriz,
         "todas_familias": db.listar_familias(),
-    }
+    })
 
 @app.route("/tree")
+@solo_lectura
 def tree():
     fam = session.get("familia_activa")
-    matriz = db.obtener_matriz(fam) if fam else None
-
-    def to_elements(matriz):
-        if not matriz:
-            return []
-
-        # ====== Layout espacioso ======
-        CELL_W = 560
-        CELL_H = 300
-        PAD_X  = 180
-        PAD_Y  = 140
-        SLOT   = 180  # separación dentro de la celda (parejas)
-
-        def base_pos(r, c):
-            return (PAD_X + c * CELL_W, PAD_Y + r * CELL_H)
-
-        # --- clave única por persona ---
-        def person_key(p: dict) -> str:
-            ced = (p.get("cedula") or "").strip()
-            if ced:
-                return f"ced-{ced}"
-            # fallback razonable si no hay cédula
-            nom = (p.get("nombre") or "").strip()
-            ape = (p.get("apellidos") or "").strip()
-            nac = (p.get("fecha_nacimiento") or "").strip()
-            return f"nf-{nom}|{ape}|{nac}"
-
-        def photo_url(p: dict) -> str:
-            genero = (p.get("genero") or "").lower()
-            digits = "".join(ch for ch in (p.get("cedula") or "") if ch.isdigit())
-            seed = int(digits[-2:], 10) % 90 if digits else 0
-            if "fem" in genero:
-                return f"https://randomuser.me/api/portraits/women/{seed}.jpg"
-            if "mas" in genero:
-                return f"https://randomuser.me/api/portraits/men/{seed}.jpg"
-            return f"https://picsum.photos/seed/{seed}/200/200"
-
-        def is_couple_row(r: int) -> bool:
-            # En tu convención, parejas en filas 0 y 2
-            return r in (0, 2)
-
-        elements = []
-
-        # Mapas para deduplicar:
-        #   key_persona -> node_id (único en el grafo)
-        #   pos_id(r-c-i) -> node_id (para “resolver” al crear edges)
-        seen_person: dict[str, str] = {}
-        pos_to_node: dict[str, str]  = {}
-
-        # --- 1) Crear nodos de personas (SIN duplicar) ---
-        for r, fila in enumerate(matriz or []):
-            for c, celda in enumerate(fila):
-                n = len(celda)
-                for i, p in enumerate(celda):
-                    pos_id = f"{r}-{c}-{i}"
-                    k = person_key(p)
-
-                    if k in seen_person:
-                        # Ya existe: no dibujamos otro nodo, solo mapeamos posición->nodo existente
-                        pos_to_node[pos_id] = seen_person[k]
-                        continue
-
-                    # Crear nodo NUEVO
-                    node_id = f"p-{k}"
-                    seen_person[k] = node_id
-                    pos_to_node[pos_id] = node_id
-
-                    x0, y0 = base_pos(r, c)
-                    offset = (i - (n - 1) / 2) * SLOT
-                    fallecido = bool((p.get("fecha_defuncion") or "").strip())
-                    # ---- Edad actual (del gestor o recalculada) ----
-                    edad_txt = p.get("edad")
-                    if edad_txt is None:
-                        edad_txt = edad_actual(p)
-                    edad_txt = str(edad_txt) if edad_txt is not None else "—"
-                    detalle = (
-                        f"<b>{p.get('nombre','')} {p.get('apellidos','')}</b><br>"
-                        f"Cédula: {p.get('cedula','—')}<br>"
-                        f"Edad: {edad_txt}<br>"
-                        f"Nac: {p.get('fecha_nacimiento','—')}"
-                        + (f"<br>Fallec: {p['fecha_defuncion']}" if fallecido else "")
-                        + (f"<br>Provincia: {p.get('residencia','—')}" if p.get("residencia") else "")
-                        + (f"<br>Estado civil: {p.get('estado_civil','—')}" if p.get("estado_civil") else "")
-                    )
-
-                    # Si tiene tutores legales, los añadimos
-                    if p.get("tutores_legales"):
-                        detalle += f"<br><i>Tutores:</i> {', '.join(p['tutores_legales'])}"
-
-                    elements.append({
-                        "data": {
-                            "id": node_id,
-                            "kind": "person",
-                            "label": f"{p.get('nombre','')} {p.get('apellidos','')}",
-                            "detalle": detalle,
-                            "img": photo_url(p),
-                            "fallecido": 1 if fallecido else 0
-                        },
-                        "position": {"x": x0 + offset, "y": y0}
-                    })
-
-                # --- 2) Uniones matrimoniales centradas + edges ---
-        seen_unions = set()  # evitar duplicados
-
-        for r, fila in enumerate(matriz or []):
-            if not is_couple_row(r):
-                continue
-
-            for c, celda in enumerate(fila):
-                # parejas por pares consecutivos [0,1], [2,3], ...
-                pairs = [(k, k + 1) for k in range(0, len(celda) - 1, 2)]
-                for pair_idx, (iA, iB) in enumerate(pairs):
-                    idA = pos_to_node.get(f"{r}-{c}-{iA}")
-                    idB = pos_to_node.get(f"{r}-{c}-{iB}")
-                    if not idA or not idB:
-                        continue
-
-                    pA, pB = celda[iA], celda[iB]
-
-                    # 1) Ambos deben estar casados
-                    if pA.get("estado_civil") != "Casado" or pB.get("estado_civil") != "Casado":
-                        continue
-
-                    # 2) Evitar uniones duplicadas (misma pareja en otra fila/columna)
-                    cedA, cedB = (pA.get("cedula") or "").strip(), (pB.get("cedula") or "").strip()
-                    union_key = tuple(sorted([cedA, cedB]))
-                    if union_key in seen_unions:
-                        continue
-                    seen_unions.add(union_key)
-
-                    # Crear nodo unión centrado
-                    x0, y0 = base_pos(r, c)
-                    union_id = f"u-{r}-{c}-{pair_idx}"
-                    elements.append({
-                        "data": {"id": union_id, "kind": "union"},
-                        "position": {"x": x0, "y": y0 + 12}
-                    })
-
-                    # Matrimonio: dos segmentos hacia el centro
-                    elements.append({
-                        "data": {"id": f"mA-{r}-{c}-{pair_idx}",
-                                 "source": idA, "target": union_id, "etype": "marriage"}
-                    })
-                    elements.append({
-                        "data": {"id": f"mB-{r}-{c}-{pair_idx}",
-                                 "source": idB, "target": union_id, "etype": "marriage"}
-                    })
-
-                    # Hijos: fila r+1, misma columna c (cuelgan de la unión)
-                    if r + 1 < len(matriz) and c < len(matriz[r + 1]):
-                        for j in range(len(matriz[r + 1][c])):
-                            child_node = pos_to_node.get(f"{r+1}-{c}-{j}")
-                            if not child_node:
-                                continue
-                            elements.append({
-                                "data": {"id": f"h-{union_id}-{child_node}",
-                                         "source": union_id, "target": child_node, "etype": "child"}
-                            })
-
-
-        return elements
-
-    elements = to_elements(matriz)
-    return render_template("tree.html", elements=elements, **ctx())
+    # Si la familia entra entera (hasta arbol.LIMITE_VENTANA personas) va completa y se
+    # actualiza con /api/tree/cambios; si no, agrupada y el navegador pide ventanas
+    vista = arbol.ventana(fam)
+    if vista["detalle"] == "personas":
+        elements, cursor = arbol.instantanea(fam)  # cacheado por versión de la familia
+        return render_template("tree.html", elements=elements, cursor=cursor, ventana=False, **ctx())
+    return render_template("tree.html", elements=vista["elements"], cursor=vista["cursor"],
+                           ventana=True, **ctx())
+
+@app.route("/api/tree/ventana")
+@solo_lectura
+def api_tree_ventana():
+    """Parte del árbol, para familias grandes:
+      ?x1&y1&x2&y2            caja en coordenadas del árbol (la vista del navegador)
+      ?fila_desde&fila_hasta  rango de generaciones
+      ?limite                 personas sueltas como máximo (1..2000, por defecto 500)
+    Lo de afuera, y lo de adentro si pasa el límite, llega como nodos "grupo"."""
+    args = request.args
+    try:
+        caja = None
+        if any(k in args for k in ("x1", "y1", "x2", "y2")):
+            caja = tuple(float(args[k]) for k in ("x1", "y1", "x2", "y2"))
+            if not all(math.isfinite(v) for v in caja):
+                raise ValueError
+        filas = None
+        if "fila_desde" in args or "fila_hasta" in args:
+            filas = (int(args.get("fila_desde", 0)), int(args.get("fila_hasta", 0xFFFFF)))
+        limite = int(args.get("limite", arbol.LIMITE_VENTANA))
+    except (KeyError, ValueError):
+        return jsonify({"error": "caja (x1, y1, x2, y2), filas y limite deben ser números"}), 400
+    if not 1 <= limite <= 2000:
+        return jsonify({"error": "limite debe estar entre 1 y 2000"}), 400
+    fam = session.get("familia_activa")
+    return jsonify(arbol.ventana(fam, caja, filas, limite))
+
+@app.route("/api/tree/cambios")
+@solo_lectura
+def api_tree_cambios():
+    """Parches del árbol desde ?desde=<cursor> (el de /tree o el de la respuesta anterior):
+    {"cursor", "cambios": [{"op": "add"|"update", "element"} | {"op": "remove", "id"}]}.
+    Si el cursor ya no sirve: {"cursor", "reset": true, "elements": [...]} con el árbol entero."""
+    fam = session.get("familia_activa")
+    return jsonify(arbol.cambios(fam, request.args.get("desde")))
 
 # ---- Familias: crear y seleccionar
 @app.route("/familia/nueva", methods=["POST"])
@@ -335,8 +261,14 @@ def seleccionar_familia():
 
 
 # Limpiar reinicio del servidor
+# (salvo en los endpoints que no usan la sesión: /api/time es cacheable public y
+# no puede llevar Set-Cookie, /api/stream es una conexión larga)
+_SIN_SESION = {"api_time", "api_stream"}
+
 @app.before_request
 def _reset_si_reinicio():
+    if request.endpoint in _SIN_SESION:
+        return
     if session.get("boot_id") != BOOT_ID:
         session.clear()
         session["boot_id"] = BOOT_ID
@@ -359,17 +291,6 @@ with open(DATA_PATH, "r", encoding="utf-8") as f:
     RESPONSES = json.load(f)
 
 
-def normalize_text(text: str) -> str:
-    """Convierte texto a minúsculas, elimina tildes y signos raros."""
-    text = text.lower()
-    text = unicodedata.normalize("NFD", text)
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    # quitar signos de puntuación y caracteres no alfanuméricos (excepto espacios)
-    text = re.sub(r"[^a-z0-9\s]", "", text)
-    return text.strip()
-
-
-
 def get_active_family_and_matrix():
     fam = session.get("familia_activa")
     if not fam or not db.existe_familia(fam):
@@ -377,103 +298,101 @@ def get_active_family_and_matrix():
     matriz = db.obtener_matriz(fam) if fam else []
     return fam, (matriz or [])
 
+# Respuesta de cada intención de services/intenciones.py: (buscador, familia, argumentos) -> texto
+_MAX_AMBIGUOS = 8
+
+def _ambiguo(b, *escritos):
+    """Respuesta pidiendo precisar el primer nombre escrito que coincide por igual con
+    varias personas (None si todos se resuelven a una sola o a ninguna)."""
+    for escrito in escritos:
+        opciones = b.resolver(escrito) if escrito else []
+        if len(opciones) > 1:
+            lista = ", ".join(opciones[:_MAX_AMBIGUOS])
+            if len(opciones) > _MAX_AMBIGUOS:
+                lista += f" y {len(opciones) - _MAX_AMBIGUOS} más"
+            return f"“{escrito}” es ambiguo, ¿a quién te referís?: {lista}."
+    return None
+
+def _resuelto(b, escrito):
+    """Nombre de la persona a la que se responde: el escrito si existe tal cual, si no el
+    más parecido (así la respuesta nombra a quien se encontró, no lo que se tipeó)."""
+    opciones = b.resolver(escrito) if escrito else []
+    return opciones[0] if len(opciones) == 1 else escrito
+
+def _chat_relacion(b, fam, args):
+    if not args:
+        return "No entendí los nombres de las personas."
+    try:
+        duda = _ambiguo(b, args["a"], args["b"])
+        if duda:
+            return duda
+        return b.relacion(_resuelto(b, args["a"]), _resuelto(b, args["b"]))
+    except Exception as e:
+        return f"Error al procesar los nombres: {e}"
+
+def _chat_primos(b, fam, args):
+    duda = _ambiguo(b, args["nombre"])
+    if duda:
+        return duda
+    nombre = _resuelto(b, args["nombre"])
+    lista = b.primos_primer_grado(nombre)
+    return f"Primos de primer grado de {nombre.title()}: {', '.join(lista) if lista else 'ninguno'}."
+
+def _chat_antepasados_maternos(b, fam, args):
+    duda = _ambiguo(b, args["nombre"])
+    if duda:
+        return duda
+    nombre = _resuelto(b, args["nombre"])
+    cadena = b.antepasados_maternos(nombre) if nombre else []
+    return f"Antepasados maternos de {nombre or '—'}: {', '.join(cadena) if cadena else 'ninguno'}."
+
+def _chat_descendientes_vivos(b, fam, args):
+    duda = _ambiguo(b, args["nombre"])
+    if duda:
+        return duda
+    nombre = _resuelto(b, args["nombre"])
+    lista = b.descendientes_vivos(nombre)
+    return f"Descendientes vivos de {nombre.title()}: {', '.join(lista) if lista else 'ninguno'}."
+
+def _chat_nacidos_10_anios(b, fam, args):
+    actuales = db.nacidos_ultimos_10_anios(fam) if fam else []
+    return f"Nacidos en los últimos 10 años: {', '.join(actuales) or 'ninguno'}."
+
+def _chat_parejas_con_hijos(b, fam, args):
+    lista = b.parejas_con_mas_de_dos_hijos()
+    return f"Parejas con 2 o más hijos: {', '.join(lista) if lista else 'ninguna'}."
+
+def _chat_fallecidos_menores_50(b, fam, args):
+    menores = db.fallecidos_menores_de_50(fam) if fam else []
+    return f"Personas fallecidas antes de los 50: {', '.join(menores) or 'ninguna'}."
+
+_RESPUESTAS_CHAT = {
+    "saludo": lambda b, fam, args: RESPONSES["saludos"][0],
+    "despedida": lambda b, fam, args: RESPONSES["despedidas"][0],
+    "relacion": _chat_relacion,                           # P1
+    "primos": _chat_primos,                               # P2
+    "antepasados_maternos": _chat_antepasados_maternos,   # P3
+    "descendientes_vivos": _chat_descendientes_vivos,     # P4
+    "nacidos_10_anios": _chat_nacidos_10_anios,           # P5
+    "parejas_con_hijos": _chat_parejas_con_hijos,         # P6
+    "fallecidos_menores_50": _chat_fallecidos_menores_50, # P7
+}
+
 @app.route("/chat", methods=["POST"])
+@solo_lectura
 def chat():
     user_raw = (request.form.get("query") or "").strip()
-    user_msg = normalize_text(user_raw)
+    user_msg = intenciones.normalizar(user_raw)
 
-    # Exponer matriz al módulo 'buscador'
-    fam, matriz = get_active_family_and_matrix()
-    setattr(buscador, "matriz", matriz)  # <- clave para que 'relacion()' funcione
+    # Consultas sobre la familia activa (objeto propio del request, cacheado por versión)
+    fam, _ = get_active_family_and_matrix()
+    b = buscador.para(fam)
 
+    intencion = intenciones.clasificar(user_msg)
     reply = None
-
-    # ----- saludos/despedidas -----
-    if any(saludo in user_msg for saludo in ["hola", "buenas", "hey"]):
-        reply = RESPONSES["saludos"][0]
-
-    elif any(desp in user_msg for desp in ["adios", "chao", "bye"]):
-        reply = RESPONSES["despedidas"][0]
-
-    # ----- P1: relación A-B -----
-    elif "relacion" in user_msg and "entre" in user_msg:
-        try:
-            after_entre = user_msg.split("entre", 1)[1].strip()
-            partes = after_entre.split(" y ")
-            if len(partes) == 2:
-                persona_a = partes[0].replace("persona", "").strip()
-                persona_b = partes[1].replace("persona", "").strip()
-                reply = buscador.relacion(persona_a, persona_b)
-            else:
-                reply = "No entendí los nombres de las personas."
-        except Exception as e:
-            reply = f"Error al procesar los nombres: {e}"
-
-     # -----------------------
-    # P2: Primos de X (sin helpers; basado en normalize_text)
-    elif "primos" in user_msg:
-        # Quitamos ruidos comunes para que el nombre quede limpio
-        texto = user_msg
-        texto = texto.replace("de primer grado", "").replace("primer grado", "")
-        # Extrae lo que venga después de "primos" o "primos de"
-        m = re.search(r"primos(?:\s+de)?\s+(?P<nombre>.+)$", texto)
-        if m:
-            nombre = m.group("nombre").strip().strip("?!.:,;").strip()
-        else:
-            nombre = user_msg.split()[-1].strip("?!.:,;")
-        lista = buscador.primos_primer_grado(nombre)
-        reply = f"Primos de primer grado de {nombre.title()}: {', '.join(lista) if lista else 'ninguno'}."
-
-    # -----------------------
-    # P3: Antepasados maternos de X
-    elif "antepasados" in user_msg and "maternos" in user_msg:
-        m = re.search(r"\bantepasados\s+maternos(?:\s+de)?\s+(?P<nombre>.+)$", user_msg)
-        raw = m.group("nombre") if m else (user_msg.split()[-1] if user_msg.split() else "")
-        stop = {"de", "la", "el", "los", "las", "y", "del", "al", "persona", "personas"}
-        nombre_tokens = [t for t in raw.split() if t not in stop and not t.isdigit()]
-        nombre = " ".join(nombre_tokens).strip().title()
-        cadena = buscador.antepasados_maternos(nombre) if nombre else []
-        reply = f"Antepasados maternos de {nombre or '—'}: {', '.join(cadena) if cadena else 'ninguno'}."
-
-    # -----------------------
-    elif "descendientes" in user_msg and "vivos" in user_msg:
-    # Soporta: "descendientes de X vivos", "cuales descendientes de X estan vivos actualmente", etc.
-    # (trabajamos sobre user_msg ya normalizado)
-        m = re.search(
-            r"descendientes(?:\s+de)?\s+(?P<nombre>.+?)\s+(?:estan\s+)?vivos\b",
-            user_msg
-        )
-        if m:
-            nombre = m.group("nombre").strip()
-        else:
-            # Fallback: toma lo que sigue a "descendientes de" y limpia ruido al final
-            m2 = re.search(r"descendientes(?:\s+de)?\s+(?P<nombre>.+)$", user_msg)
-            nombre = (m2.group("nombre") if m2 else user_msg).strip()
-
-        # Quitar tokens de cierre *iterativamente* (no solo uno)
-        ruido_final = {"estan", "esta", "vivos", "actualmente", "ahora", "hoy"}
-        toks = [t for t in nombre.split() if t]
-        while toks and toks[-1] in ruido_final:
-            toks.pop()
-        nombre = " ".join(toks)
-
-        lista = buscador.descendientes_vivos(nombre)
-        reply = f"Descendientes vivos de {nombre.title()}: {', '.join(lista) if lista else 'ninguno'}."
-
-    # ----- P5: nacidos últimos 10 años -----
-    elif "ultimos 10 anos" in user_msg or "ultimos 10 años" in user_msg:
-        actuales = db.nacidos_ultimos_10_anios(fam) if fam else []
-        reply = f"Nacidos en los últimos 10 años: {', '.join(actuales) or 'ninguno'}."
-
-    # ----- P6: parejas con 2+ hijos -----
-    elif "parejas" in user_msg and "hijos" in user_msg:
-        lista = buscador.parejas_con_mas_de_dos_hijos()
-        reply = f"Parejas con 2 o más hijos: {', '.join(lista) if lista else 'ninguna'}."
-
-    # ----- P7: fallecidos <50 -----
-    elif "fallecieron" in user_msg and "50" in user_msg:
-        menores = db.fallecidos_menores_de_50(fam) if fam else []
-        reply = f"Personas fallecidas antes de los 50: {', '.join(menores) or 'ninguna'}."
+    if intencion:
+        nombre, args = intencion
+        reply = _RESPUESTAS_CHAT[nombre](b, fam, args)
 
     # ----- default -----
     if not reply:
@@ -508,6 +427,7 @@ def history():
     return render_template("history.html", **ctx())
 
 @app.route("/api/history")
+@solo_lectura
 def api_history():
     """
     Devuelve JSON con:
@@ -527,18 +447,12 @@ def api_history():
         fam = next(iter(db.familias), None)
     matriz = db.familias.get(fam, [])
 
-    # Buscar persona y sus posiciones
+    # Buscar persona y sus posiciones (índice de db, sin recorrer la matriz)
+    positions: list[tuple[int,int,int]] = db.posiciones_de(fam, nombre_q) if fam else []
     target = None
-    positions: list[tuple[int,int,int]] = []
-    tnorm = _norm_name(nombre_q)
-
-    for r, fila in enumerate(matriz):
-        for c, celda in enumerate(fila):
-            for i, p in enumerate(celda):
-                if _norm_name(_full_name(p)) == tnorm:
-                    if target is None:
-                        target = p
-                    positions.append((r, c, i))
+    if positions:
+        r, c, i = positions[0]
+        target = matriz[r][c][i]
 
     if not target:
         # No encontrada
@@ -654,14 +568,8 @@ def api_history():
 @app.route("/love", methods=["GET", "POST"])
 def love():
     from datetime import datetime, date
-    import unicodedata
-
-    # ---------- helpers de normalización / búsqueda ----------
-    def _norm(s: str) -> str:
-        s = (s or "").strip().lower()
-        s = unicodedata.normalize("NFD", s)
-        return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
 
+    # ---------- helpers de búsqueda ----------
     def _full(p: dict) -> str:
         return p.get("nombre_completo") or f"{p.get('nombre','')} {p.get('apellidos','')}".strip()
 
@@ -670,24 +578,11 @@ def love():
         m = db.obtener_matriz(fam) if fam else []
         return fam, (m or [])
 
-    def find_positions(nombre: str, matriz: list[list[list[dict]]]):
-        t = _norm(nombre)
-        out = []
-        for i, fila in enumerate(matriz):
-            for j, celda in enumerate(fila):
-                for k, p in enumerate(celda):
-                    if _norm(_full(p)) == t:
-                        out.append((i, j, k))
-        return out
-
-    def find_person(nombre: str, matriz: list[list[list[dict]]]) -> dict | None:
-        t = _norm(nombre)
-        for fila in matriz:
-            for celda in fila:
-                for p in celda:
-                    if _norm(_full(p)) == t:
-                        return p
-        return None
+    def find_positions(nombre: str, fam: str):
+        return db.posiciones_de(fam, nombre)
+
+    def find_person(nombre: str, fam: str) -> dict | None:
+        return db.buscar_por_nombre(fam, nombre)
 
     # ---------- helpers de edad / reglas ----------
     def _age_from_ymd(fecha: str) -> int | None:
@@ -717,21 +612,24 @@ def love():
         score = round(100 * inter / base)
         return score, inter
 
-    def genetica_ok(a: dict, b: dict, matriz: list[list[list[dict]]]) -> tuple[bool, str]:
+    def genetica_ok(a: dict, b: dict, fam: str) -> tuple[bool, str]:
         ap_a = (a.get("apellidos") or "").strip().lower()
         ap_b = (b.get("apellidos") or "").strip().lower()
         if ap_a and ap_a == ap_b:
             return False, "Apellidos idénticos (riesgo genético)."
         # hermanos consanguíneos: misma celda en filas 1 o 3
-        pos_a = find_positions(_full(a), matriz)
-        pos_b = find_positions(_full(b), matriz)
+        pos_a = find_positions(_full(a), fam)
+        pos_b = find_positions(_full(b), fam)
         for (fa, ca, ia) in pos_a:
             for (fb, cb, ib) in pos_b:
                 if fa == fb and ca == cb and ia != ib and fa in (1, 3):
                     return False, "Parentesco directo (hermanos)."
+        motivo = compatibilidad.parentesco_cercano(fam, db.clave_persona(a), db.clave_persona(b))
+        if motivo:
+            return False, f"Parentesco cercano: {motivo}"
         return True, "Riesgo bajo"
 
-    def validar_union(pA: dict, pB: dict, matriz: list[list[list[dict]]]) -> dict:
+    def validar_union(pA: dict, pB: dict, fam: str) -> dict:
         reasons = []
         rules = {}
 
@@ -780,7 +678,7 @@ def love():
 
 
         # 5) Compatibilidad genética
-        g_ok, g_det = genetica_ok(pA, pB, matriz)
+        g_ok, g_det = genetica_ok(pA, pB, fam)
         rules["genetica_ok"] = bool(g_ok)
         rules["genetica_detalle"] = g_det
         if not rules["genetica_ok"]:
@@ -790,41 +688,20 @@ def love():
         return {"ok": ok, "score": score, "rules": rules, "reasons": reasons}
 
     # ---------- helpers para reflejar la unión en la MATRIZ (fila 2) ----------
-    def _pkey(p: dict) -> str:
-        ced = (p.get("cedula") or "").strip()
-        if ced:
-            return f"ced-{ced}"
-        return f"{p.get('nombre','')}|{p.get('apellidos','')}|{p.get('fecha_nacimiento','')}"
-
-    def _ensure_cell(matriz, r, c):
-        while len(matriz) <= r:
-            matriz.append([])
-        while len(matriz[r]) <= c:
-            matriz[r].append([])
-
-    def _remove_from_row2(matriz, pkey: str):
-        if len(matriz) <= 2:
-            return
-        for celda in matriz[2]:
-            for i in range(len(celda) - 1, -1, -1):
-                if _pkey(celda[i]) == pkey:
-                    del celda[i]
-
-    def _place_couple_in_row2(matriz, col: int, A: dict, B: dict):
-        _ensure_cell(matriz, 2, col)
-        _remove_from_row2(matriz, _pkey(A))
-        _remove_from_row2(matriz, _pkey(B))
-        celda = matriz[2][col]
-        existing = {_pkey(x) for x in celda}
-        if _pkey(A) not in existing:
-            celda.append(A)
-        if _pkey(B) not in existing:
-            celda.append(B)
-
-    def _choose_col_for_union(matriz, A: dict, B: dict) -> int:
+    def _aplicar_union(fam: str, A: dict, B: dict):
+        # Marca estado / metadatos en todas las apariciones y ubica la pareja en fila 2
+        # (vía db, para que quede registrado en el diario de persistencia).
+        cA, cB = db.clave_persona(A), db.clave_persona(B)
+        anio = datetime.now().year
+        db.actualizar_persona(fam, cA, {"estado_civil": "Casado", "union_con": _full(B), "anio_union": anio})
+        db.actualizar_persona(fam, cB, {"estado_civil": "Casado", "union_con": _full(A), "anio_union": anio})
+        col = _choose_col_for_union(fam, A, B)
+        db.colocar_pareja(fam, col, cA, cB)
+
+    def _choose_col_for_union(fam: str, A: dict, B: dict) -> int:
         # preferí columna donde ya esté alguno en fila 2; si no, la de fila 1; si no, 0.
-        posA = find_positions(_full(A), matriz)
-        posB = find_positions(_full(B), matriz)
+        posA = find_positions(_full(A), fam)
+        posB = find_positions(_full(B), fam)
         for (r, c, _) in posA:
             if r == 2:
                 return c
@@ -849,32 +726,26 @@ def love():
                                **ctx())
 
     # ---------- POST JSON API (fetch desde love.html) ----------
-    if request.is_json:
-        data = request.get_json(force=True) or {}
-        mode = (data.get("mode") or "").lower()
+    def love_json(data: dict, mode: str):
         fam, matriz = get_active()
 
         if not fam or not db.existe_familia(fam):
             return jsonify({"ok": False, "message": "Seleccioná una familia activa."}), 400
 
         if mode == "search":
-            q = _norm(data.get("q") or "")
-            items, seen = [], set()
-            for fila in matriz:
-                for celda in fila:
-                    for p in celda:
-                        name = _full(p); tn = _norm(name)
-                        if q and q not in tn: 
-                            continue
-                        if tn in seen: 
-                            continue
-                        seen.add(tn)
-                        items.append({"nombre_completo": name})
-            return jsonify({ "ok": True, "items": items[:25] })
+            # Palabras parciales o con errores de tipeo, ordenado por parecido (ver nombres.py);
+            # "cursor" de la respuesta anterior = página siguiente
+            try:
+                limite = min(max(int(data.get("limite") or 25), 1), 100)
+            except (TypeError, ValueError):
+                limite = 25
+            q = data.get("q")
+            items, cursor = nombres.para(fam).pagina(q if isinstance(q, str) else "", limite, data.get("cursor"))
+            return jsonify({ "ok": True, "items": items, "cursor": cursor })
 
         if mode == "persona":
             nombre = data.get("nombre") or ""
-            p = find_person(nombre, matriz)
+            p = find_person(nombre, fam)
             if not p:
                 return jsonify({ "ok": False, "message": "No encontrado" }), 404
             out = dict(p)
@@ -883,43 +754,46 @@ def love():
             out["afinidades"] = p.get("afinidades") or []
             return jsonify(out)
 
+        if mode == "candidatos":
+            # Mejores parejas posibles para una persona, de la matriz de compatibilidad
+            # de la familia (mismas reglas que "validar", ver compatibilidad.py)
+            p = find_person(data.get("nombre") or "", fam)
+            if not p:
+                return jsonify({ "ok": False, "message": "No encontrado" }), 404
+            try:
+                n = min(max(int(data.get("n") or 10), 1), 50)
+            except (TypeError, ValueError):
+                n = 10
+            items = compatibilidad.para(fam).candidatos(db.clave_persona(p), n)
+            return jsonify({ "ok": True, "items": items })
+
         if mode in ("validar", "validate"):
             a = data.get("a") or ""; b = data.get("b") or ""
-            pA = find_person(a, matriz); pB = find_person(b, matriz)
+            pA = find_person(a, fam); pB = find_person(b, fam)
             if not pA or not pB:
                 return jsonify({"ok": False, "message": "Persona(s) no encontradas"}), 404
-            res = validar_union(pA, pB, matriz)
+            res = validar_union(pA, pB, fam)
             res["message"] = "Compatibilidad suficiente." if res["ok"] else "No cumplen las reglas."
             return jsonify(res)
 
         if mode in ("unir", "union"):
             a = data.get("a") or ""; b = data.get("b") or ""
-            pA = find_person(a, matriz); pB = find_person(b, matriz)
+            pA = find_person(a, fam); pB = find_person(b, fam)
             if not pA or not pB:
                 return jsonify({"ok": False, "message": "Persona(s) no encontradas"}), 404
 
-            res = validar_union(pA, pB, matriz)
+            res = validar_union(pA, pB, fam)
             if not res["ok"]:
                 res["message"] = "No se pudo unir"
                 return jsonify(res), 200
 
-            # 1) Marcar estado / metadatos
-            pA["estado_civil"] = "Casado"
-            pB["estado_civil"] = "Casado"
-            pA["union_con"] = _full(pB)
-            pB["union_con"] = _full(pA)
-            pA["anio_union"] = datetime.now().year
-            pB["anio_union"] = datetime.now().year
-
-            # 2) Colocar físicamente la pareja en la FILA 2 de la matriz (misma columna)
-            col = _choose_col_for_union(matriz, pA, pB)
-            _place_couple_in_row2(matriz, col, pA, pB)
+            # 1) Marcar estado / metadatos  2) Colocar la pareja en la FILA 2 (misma columna)
+            _aplicar_union(fam, pA, pB)
 
             # 3) (Opcional) devolver elements para refrescar árbol si el front quiere
             payload = {"ok": True, "message": "Pareja unida correctamente", "rules": res["rules"], "reasons": []}
             try:
-                elements = build_elements(matriz or [])
-                payload["elements"] = elements
+                payload["elements"] = arbol.elementos(fam)
             except Exception:
                 pass
             return jsonify(payload), 200
@@ -927,36 +801,46 @@ def love():
         return jsonify({"ok": False, "message": "Modo no soportado"}), 400
 
     # ---------- POST clásico (form de pre buscar la unión) ----------
-    a = (request.form.get("a") or "").strip()
-    b = (request.form.get("b") or "").strip()
-    fam, matriz = get_active()
-    if not fam or not db.existe_familia(fam):
-        flash("Seleccioná una familia activa.")
-        return redirect(url_for("love"))
+    def love_form():
+        a = (request.form.get("a") or "").strip()
+        b = (request.form.get("b") or "").strip()
+        fam, matriz = get_active()
+        if not fam or not db.existe_familia(fam):
+            flash("Seleccioná una familia activa.")
+            return redirect(url_for("love"))
 
-    if not a or not b:
-        flash("Indicá ambos nombres.")
-        return redirect(url_for("love"))
+        if not a or not b:
+            flash("Indicá ambos nombres.")
+            return redirect(url_for("love"))
 
-    pA = find_person(a, matriz); pB = find_person(b, matriz)
-    if not pA or not pB:
-        flash("Persona(s) no encontradas.")
-        return redirect(url_for("love"))
+        pA = find_person(a, fam); pB = find_person(b, fam)
+        if not pA or not pB:
+            flash("Persona(s) no encontradas.")
+            return redirect(url_for("love"))
 
-    res = validar_union(pA, pB, matriz)
-    if not res["ok"]:
-        flash("No se pudo unir: " + "; ".join(res["reasons"]))
+        res = validar_union(pA, pB, fam)
+        if not res["ok"]:
+            flash("No se pudo unir: " + "; ".join(res["reasons"]))
+            return redirect(url_for("love"))
+
+        # aplicar unión + mover a fila 2
+        _aplicar_union(fam, pA, pB)
+
+        flash("¡Pareja unida correctamente!")
         return redirect(url_for("love"))
 
-    # aplicar unión + mover a fila 2
-    pA["estado_civil"] = "Casado"; pB["estado_civil"] = "Casado"
-    pA["union_con"] = _full(pB);   pB["union_con"] = _full(pA)
-    pA["anio_union"] = datetime.now().year; pB["anio_union"] = datetime.now().year
-    col = _choose_col_for_union(matriz, pA, pB)
-    _place_couple_in_row2(matriz, col, pA, pB)
+    if request.is_json:
+        data = request.get_json(force=True) or {}
+        mode = (data.get("mode") or "").lower()
+        if mode in ("unir", "union"):
+            # validar + aplicar sin que otro escritor cambie a la pareja en el medio
+            with db.cerrojo:
+                return love_json(data, mode)
+        with db.lectura():
+            return love_json(data, mode)
 
-    flash("¡Pareja unida correctamente!")
-    return redirect(url_for("love"))
+    with db.cerrojo:
+        return love_form()
 
 
 # ============================
@@ -969,60 +853,82 @@ def procesar_colaterales_endpoint():
     if not fam or not db.existe_familia(fam):
         return jsonify({"ok": False, "message": "Familia no activa"}), 400
 
-    matriz = db.obtener_matriz(fam)
-    efecto.procesar_colaterales(matriz)
+    with db.cerrojo:  # muta dicts de personas, igual que el tick
+        matriz = db.obtener_matriz(fam)
+        efecto.procesar_colaterales(matriz)
+        arbol.marcar(fam)
     return jsonify({"ok": True, "message": "Efectos colaterales aplicados"})
 
 
 
-# Fecha de arranque (naive, sin tz)
-GAME_TIME = {"date": datetime(2025, 1, 1)}
-
-# Configuración del reloj acelerado
-SECONDS_PER_DAY = 0.0274  # 10 / 365 ~0.0274 s por día
+# Reloj: el del simulador (gestor.reloj()), una sola fecha para todos los clientes y
+# la misma de los eventos. /api/time y el stream solo la leen.
+RELOJ_STREAM_SEG = 2.0  # cada cuánto se empuja el reloj a los suscriptos de /api/stream
 MESES_ES = [
     "Enero","Febrero","Marzo","Abril","Mayo","Junio",
     "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"
 ]
 
+def _reloj(fecha) -> dict:
+    return {"dia": fecha.day, "mes": MESES_ES[fecha.month - 1], "anio": fecha.year}
+
+def _emitir_reloj():
+    """Hilo: un push del reloj cada RELOJ_STREAM_SEG para todas las pestañas abiertas."""
+    while True:
+        time.sleep(RELOJ_STREAM_SEG)
+        if gestor and difusion.suscriptores():
+            difusion.publicar("reloj", _reloj(gestor.reloj()))
+
+@app.route("/api/stream")
+def api_stream():
+    """Server-Sent Events del simulador, una conexión por pestaña en lugar de polling:
+      reloj   {dia, mes, anio}   fecha simulada (al conectar, en cada tick y cada RELOJ_STREAM_SEG)
+      tick    {hoy, eventos}     nacimientos, fallecimientos y cumpleaños del tick
+      avance  {desde, hasta, ...} resumen de /api/sim/avanzar
+    """
+    inicial = [("reloj", _reloj(gestor.reloj()))] if gestor else []
+    return Response(difusion.stream(inicial), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/api/time")
 def api_time():
-    """Devuelve {dia, mes, anio} del tiempo simulado.
-    - Avanza un día cada SECONDS_PER_DAY segundos reales.
-    - No mezcla datetime naive/aware.
+    """Devuelve {dia, mes, anio} del reloj del simulador.
+    - Solo lee gestor.reloj(): no escribe la sesión ni avanza nada por consultar.
+    - Cacheable un segundo (el mismo valor sirve a todos los clientes).
     - No mete texto extra que rompa el layout.
     """
-    now = datetime.now()
-
-    # Guardamos el último tick en sesión como ISO string para evitar 
-    start_iso = session.get("last_tick_iso")
-    if start_iso:
-        try:
-            start = datetime.fromisoformat(start_iso)
-        except Exception:
-            # Si hubiese basura en sesión, reseteamos 
-            start = now
-            session["last_tick_iso"] = now.isoformat()
-    else:
-        start = now
-        session["last_tick_iso"] = now.isoformat()
-
-    elapsed = (now - start).total_seconds()
-
-    # Consumimos los días completos transcurridos y dejamos el resto como "carry"
-    if elapsed >= SECONDS_PER_DAY:
-        dias_extra = int(elapsed // SECONDS_PER_DAY)
-        GAME_TIME["date"] += timedelta(days=dias_extra)
-        # Avanzamos el marcador exactamente la cantidad consumida (no a "now")
-        new_start = start + timedelta(seconds=dias_extra * SECONDS_PER_DAY)
-        session["last_tick_iso"] = new_start.isoformat()
-
-    fecha = GAME_TIME["date"]
-    return jsonify({
-        "dia":  fecha.day,
-        "mes":  MESES_ES[fecha.month - 1],
-        "anio": fecha.year,
-    })
+    if not gestor:
+        return jsonify({"error": "Simulador detenido"}), 503
+    resp = jsonify(_reloj(gestor.reloj()))
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 1
+    return resp
+
+
+@app.route("/api/sim/metricas")
+def api_sim_metricas():
+    """Latencia de los ticks, atraso respecto del reloj y desbordes del simulador."""
+    if not gestor:
+        return jsonify({"error": "Simulador detenido"}), 503
+    return jsonify(gestor.metricas())
+
+
+@app.route("/api/sim/avanzar", methods=["POST"])
+def api_sim_avanzar():
+    """Adelanta la simulación N años de una vez: {"anios": N, "eventos": false} -> resumen."""
+    if not gestor:
+        return jsonify({"error": "Simulador detenido"}), 503
+    data = request.get_json(silent=True) or {}
+    try:
+        anios = int(data.get("anios", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "anios debe ser un entero"}), 400
+    if not 1 <= anios <= 1000:
+        return jsonify({"error": "anios debe estar entre 1 y 1000"}), 400
+    resumen = gestor.advance(years=anios, eventos=bool(data.get("eventos")))
+    difusion.publicar("avance", {k: v for k, v in resumen.items() if k != "eventos"})
+    difusion.publicar("reloj", _reloj(gestor.reloj()))
+    return jsonify(resumen)
 
 
 
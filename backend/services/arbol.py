@@ -0,0 +1,629 @@
+# services/arbol.py
+# Elementos de Cytoscape (nodos de personas, uniones y aristas) de cada familia,
+# para /tree y para refrescar el árbol desde /love.
+#
+# El grafo se arma una vez por familia y se guarda junto a db.version(familia):
+#   - si la versión no cambió, se devuelve la lista ya armada;
+#   - si el simulador solo agregó nacimientos (registrar_delta los anota), se
+#     agregan esos nodos y se reacomoda la celda de cada uno, sin rearmar el resto;
+#   - los cambios en el lugar (edad, defunción, estado civil, tutores...) se
+#     detectan comparando la "firma" de cada persona y solo se re-renderizan
+#     los nodos que cambiaron;
+#   - cualquier otro cambio de versión (altas desde la app, uniones, restauración)
+#     rearma el grafo completo.
+# Las posiciones las calcula services/disposicion.py (layout por capas, por celda)
+# y se guardan con el grafo; un nacimiento solo recalcula su fila y las de abajo
+# y reubica las personas de las celdas que se movieron.
+# Las listas y los dicts de elementos que se devuelven no se modifican después
+# (un parche crea elementos y lista nuevos), así que un request puede serializar
+# la suya mientras otro la actualiza.
+#
+# Cada parche o rearmado que cambia algo es una "revisión" de la familia, con sus
+# operaciones add/update/remove por id de elemento. cambios(familia, cursor) las
+# junta desde el cursor del cliente para que el navegador aplique solo la
+# diferencia; el cursor es "<linaje>.<revisión>" y el linaje cambia al reiniciar
+# el proceso, así que un cursor viejo nunca se confunde con uno actual.
+#
+# Para familias muy grandes, ventana(familia, caja, filas, limite) devuelve solo lo
+# que cae en un rectángulo y/o rango de generaciones; lo de afuera se resume en
+# nodos "grupo" (arriba, abajo, y a izquierda/derecha por generación) y, si adentro
+# hay más de 'limite' personas, también se agrupan por celda o por generación. Así
+# la respuesta queda acotada sin importar el tamaño de la familia.
+from __future__ import annotations
+
+import threading
+import uuid
+from collections import deque
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import db
+from .disposicion import CELL_H, CELL_W, Disposicion, es_fila_pareja
+from .efecto import edad_actual
+
+HISTORIAL = 200  # revisiones que se guardan para cambios(); más atrás, el cliente recarga todo
+LIMITE_VENTANA = 500  # personas sueltas por ventana; más que eso se agrupan
+
+Elemento = Dict[str, Any]
+Operacion = Tuple[str, str, Optional[Elemento]]  # (op, id, elemento)
+
+def person_key(p: dict) -> str:
+    """Clave única por persona (cédula o, si no hay, nombre|apellidos|nacimiento)."""
+    ced = (p.get("cedula") or "").strip()
+    if ced:
+        return f"ced-{ced}"
+    nom = (p.get("nombre") or "").strip()
+    ape = (p.get("apellidos") or "").strip()
+    nac = (p.get("fecha_nacimiento") or "").strip()
+    return f"nf-{nom}|{ape}|{nac}"
+
+def photo_url(p: dict) -> str:
+    genero = (p.get("genero") or "").lower()
+    digits = "".join(ch for ch in (p.get("cedula") or "") if ch.isdigit())
+    seed = int(digits[-2:], 10) % 90 if digits else 0
+    if "fem" in genero:
+        return f"https://randomuser.me/api/portraits/women/{seed}.jpg"
+    if "mas" in genero:
+        return f"https://randomuser.me/api/portraits/men/{seed}.jpg"
+    return f"https://picsum.photos/seed/{seed}/200/200"
+
+def _edad_txt(p: dict) -> str:
+    # ---- Edad actual (del gestor o recalculada) ----
+    edad = p.get("edad")
+    if edad is None:
+        edad = edad_actual(p)
+    return str(edad) if edad is not None else "—"
+
+def _firma(p: dict) -> tuple:
+    """Todo lo que se ve en el nodo de la persona; si no cambia, el nodo tampoco."""
+    return (
+        p.get("nombre"), p.get("apellidos"), p.get("cedula"), _edad_txt(p),
+        p.get("fecha_nacimiento"), p.get("fecha_defuncion"), p.get("residencia"),
+        p.get("estado_civil"), p.get("genero"), tuple(p.get("tutores_legales") or ()),
+    )
+
+_FOTO = itemgetter(2, 8)    # cédula, género
+_UNION = itemgetter(2, 7)   # cédula, estado civil
+
+def _datos_persona(node_id: str, p: dict, img: Optional[str] = None) -> Elemento:
+    fallecido = bool((p.get("fecha_defuncion") or "").strip())
+    detalle = (
+        f"<b>{p.get('nombre','')} {p.get('apellidos','')}</b><br>"
+        f"Cédula: {p.get('cedula','—')}<br>"
+        f"Edad: {_edad_txt(p)}<br>"
+        f"Nac: {p.get('fecha_nacimiento','—')}"
+        + (f"<br>Fallec: {p['fecha_defuncion']}" if fallecido else "")
+        + (f"<br>Provincia: {p.get('residencia','—')}" if p.get("residencia") else "")
+        + (f"<br>Estado civil: {p.get('estado_civil','—')}" if p.get("estado_civil") else "")
+    )
+    # Si tiene tutores legales, los añadimos
+    if p.get("tutores_legales"):
+        detalle += f"<br><i>Tutores:</i> {', '.join(p['tutores_legales'])}"
+    return {
+        "id": node_id,
+        "kind": "person",
+        "label": f"{p.get('nombre','')} {p.get('apellidos','')}",
+        "detalle": detalle,
+        "img": img or photo_url(p),
+        "fallecido": 1 if fallecido else 0,
+    }
+
+def _id(el: Elemento) -> str:
+    return el["data"]["id"]
+
+def _orden(op: str, el: Optional[Elemento]) -> int:
+    # Primero lo que se quita, después los nodos y al final las aristas (necesitan sus nodos)
+    if op == "remove":
+        return 0
+    return 2 if "source" in el["data"] else 1
+
+def _diferencias(antes: Dict[str, Elemento], despues: Dict[str, Elemento]) -> List[Operacion]:
+    ops: List[Operacion] = [("remove", k, None) for k in antes if k not in despues]
+    for k, el in despues.items():
+        previo = antes.get(k)
+        if previo is None:
+            ops.append(("add", k, el))
+        elif previo is not el and previo != el:
+            ops.append(("update", k, el))
+    return ops
+
+
+class ArbolFamilia:
+    """Grafo de Cytoscape de una familia, con lo necesario para parcharlo."""
+
+    def __init__(self, familia: str, matriz: db.FamiliaMatriz, previo: Optional["ArbolFamilia"] = None):
+        self.familia = familia
+        self.matriz = matriz
+        self.version = db.version(familia)
+        self.version_objetivo = self.version      # versión tras aplicar 'pendientes'
+        self.pendientes: List[Tuple[int, int]] = []  # (fila, col) de nacimientos sin dibujar
+        self.sucio = False                        # hubo cambios en el lugar (tick, colaterales)
+        # Mapas para deduplicar:
+        #   key_persona -> node_id (único en el grafo)
+        #   (r, c, i)   -> node_id (para “resolver” al crear edges)
+        self.seen_person: Dict[str, str] = {}
+        self.pos_to_node: Dict[Tuple[int, int, int], str] = {}
+        self.nodos: Dict[str, Elemento] = {}
+        self.origen: Dict[str, Tuple[int, int, int]] = {}   # dónde se dibuja cada nodo
+        self.personas: Dict[str, dict] = {}
+        self.firmas: Dict[str, tuple] = {}
+        self.uniones: List[Elemento] = []
+        self._lista: Optional[List[Elemento]] = None
+        self.origen_union: Dict[str, Tuple[int, int]] = {}   # union_id -> (fila, col)
+        self._indice: Optional[_Indice] = None
+        # Revisiones (se heredan del grafo anterior al rearmar)
+        self.linaje = previo.linaje if previo else uuid.uuid4().hex[:8]
+        self.revision = previo.revision if previo else 0
+        self.historial: deque = previo.historial if previo else deque(maxlen=HISTORIAL)
+        self._ops: Optional[List[Operacion]] = None   # None mientras se arma por primera vez
+
+        # --- 1) Dónde se dibuja cada persona (SIN duplicar) y layout por celdas ---
+        for r, fila in enumerate(matriz):
+            for c, celda in enumerate(fila):
+                for i, p in enumerate(celda):
+                    self._ubicar(r, c, i, p)
+        self.disposicion = Disposicion(matriz, self._dibujado)
+        # --- 2) Nodos de personas ---
+        for node_id, (r, c, i) in self.origen.items():
+            self._poner(node_id, {"data": _datos_persona(node_id, self.personas[node_id]),
+                                  "position": self.disposicion.persona(r, c, i)}, "add")
+        # --- 3) Uniones matrimoniales centradas + edges ---
+        self._armar_uniones()
+        self._ops = []
+        if previo is not None:
+            self._ops = _diferencias(previo.mapa(), self.mapa())
+            self._cerrar_revision()
+
+    def _ubicar(self, r: int, c: int, i: int, p: dict) -> Optional[str]:
+        """Registra la persona del lugar; devuelve el id si es un nodo nuevo."""
+        k = person_key(p)
+        if k in self.seen_person:
+            # Ya existe: no dibujamos otro nodo, solo mapeamos posición->nodo existente
+            self.pos_to_node[(r, c, i)] = self.seen_person[k]
+            return None
+        node_id = f"p-{k}"
+        self.seen_person[k] = node_id
+        self.pos_to_node[(r, c, i)] = node_id
+        self.origen[node_id] = (r, c, i)
+        self.personas[node_id] = p
+        self.firmas[node_id] = _firma(p)
+        return node_id
+
+    def _dibujado(self, r: int, c: int, i: int) -> Tuple[int, int, int]:
+        return self.origen[self.pos_to_node[(r, c, i)]]
+
+    def _poner(self, node_id: str, el: Elemento, op: str = "update") -> None:
+        self.nodos[node_id] = el
+        if self._ops is not None:
+            self._ops.append((op, node_id, el))
+
+    def _armar_uniones(self) -> None:
+        matriz = self.matriz
+        elements: List[Elemento] = []
+        seen_unions = set()  # evitar duplicados
+        origen_union: Dict[str, Tuple[int, int]] = {}
+
+        for r, fila in enumerate(matriz):
+            if not es_fila_pareja(r):
+                continue
+
+            for c, celda in enumerate(fila):
+                # parejas por pares consecutivos [0,1], [2,3], ...
+                pairs = [(k, k + 1) for k in range(0, len(celda) - 1, 2)]
+                for pair_idx, (iA, iB) in enumerate(pairs):
+                    idA = self.pos_to_node.get((r, c, iA))
+                    idB = self.pos_to_node.get((r, c, iB))
+                    if not idA or not idB:
+                        continue
+
+                    pA, pB = celda[iA], celda[iB]
+
+                    # 1) Ambos deben estar casados
+                    if pA.get("estado_civil") != "Casado" or pB.get("estado_civil") != "Casado":
+                        continue
+
+                    # 2) Evitar uniones duplicadas (misma pareja en otra fila/columna)
+                    cedA, cedB = (pA.get("cedula") or "").strip(), (pB.get("cedula") or "").strip()
+                    union_key = tuple(sorted([cedA, cedB]))
+                    if union_key in seen_unions:
+                        continue
+                    seen_unions.add(union_key)
+
+                    # Crear nodo unión centrado
+                    union_id = f"u-{r}-{c}-{pair_idx}"
+                    origen_union[union_id] = (r, c)
+                    elements.append({
+                        "data": {"id": union_id, "kind": "union"},
+                        "position": self.disposicion.union(r, c, pair_idx)
+                    })
+
+                    # Matrimonio: dos segmentos hacia el centro
+                    elements.append({
+                        "data": {"id": f"mA-{r}-{c}-{pair_idx}",
+                                 "source": idA, "target": union_id, "etype": "marriage"}
+                    })
+                    elements.append({
+                        "data": {"id": f"mB-{r}-{c}-{pair_idx}",
+                                 "source": idB, "target": union_id, "etype": "marriage"}
+                    })
+
+                    # Hijos: fila r+1, misma columna c (cuelgan de la unión)
+                    if r + 1 < len(matriz) and c < len(matriz[r + 1]):
+                        hijos = set()
+                        for j in range(len(matriz[r + 1][c])):
+                            child_node = self.pos_to_node.get((r + 1, c, j))
+                            if not child_node or child_node in hijos:
+                                continue  # la misma persona dos veces en la celda: una sola arista
+                            hijos.add(child_node)
+                            elements.append({
+                                "data": {"id": f"h-{union_id}-{child_node}",
+                                         "source": union_id, "target": child_node, "etype": "child"}
+                            })
+
+        if self._ops is not None:
+            self._ops.extend(_diferencias({_id(el): el for el in self.uniones},
+                                          {_id(el): el for el in elements}))
+        self.uniones = elements
+        self.origen_union = origen_union
+        self._lista = None
+
+    # ---------------- Parches ----------------
+    def nacimientos(self) -> None:
+        """Dibuja los nacimientos pendientes: nodos nuevos, layout desde la primera fila
+        con nacimientos y reubicadas solo las personas de las celdas que se movieron."""
+        celdas = sorted(set(self.pendientes))
+        nuevos = set()
+        for r, c in celdas:
+            for i, p in enumerate(self.matriz[r][c]):
+                if (r, c, i) not in self.pos_to_node:
+                    node_id = self._ubicar(r, c, i, p)
+                    if node_id:
+                        nuevos.add(node_id)
+        for r, c in sorted(self.disposicion.recalcular(celdas[0][0]) | set(celdas)):
+            for i in range(len(self.matriz[r][c])):
+                node_id = self.pos_to_node[(r, c, i)]
+                if self.origen[node_id] != (r, c, i):
+                    continue
+                posicion = self.disposicion.persona(r, c, i)
+                if node_id in nuevos:
+                    self._poner(node_id, {"data": _datos_persona(node_id, self.personas[node_id]),
+                                          "position": posicion}, "add")
+                elif self.nodos[node_id]["position"] != posicion:
+                    self._poner(node_id, {"data": self.nodos[node_id]["data"], "position": posicion})
+        self.pendientes.clear()
+        self.version = self.version_objetivo
+        self._armar_uniones()
+        self._cerrar_revision()
+
+    def refrescar(self) -> int:
+        """Re-renderiza los nodos cuya firma cambió. Devuelve cuántos."""
+        cambiados = 0
+        uniones = False
+        for node_id, p in self.personas.items():
+            firma = _firma(p)
+            previa = self.firmas[node_id]
+            if firma == previa:
+                continue
+            self.firmas[node_id] = firma
+            nodo = self.nodos[node_id]
+            # La foto solo depende de cédula y género (lo común en un tick es la edad)
+            img = nodo["data"]["img"] if _FOTO(firma) == _FOTO(previa) else None
+            self._poner(node_id, {"data": _datos_persona(node_id, p, img), "position": nodo["position"]})
+            # Qué uniones se dibujan depende de cédula y estado civil
+            uniones = uniones or _UNION(firma) != _UNION(previa)
+            cambiados += 1
+        self.sucio = False
+        if uniones:
+            self._armar_uniones()
+        elif cambiados:
+            self._lista = None
+        self._cerrar_revision()
+        return cambiados
+
+    def _cerrar_revision(self) -> None:
+        """Si el parche cambió algo, lo guarda como una revisión nueva."""
+        if self._ops:
+            self.revision += 1
+            self._ops.sort(key=lambda o: _orden(o[0], o[2]))
+            self.historial.append((self.revision, self._ops))
+            self._indice = None
+        self._ops = []
+
+    def elementos(self) -> List[Elemento]:
+        if self._lista is None:
+            self._lista = list(self.nodos.values()) + self.uniones
+        return self._lista
+
+    def mapa(self) -> Dict[str, Elemento]:
+        return {_id(el): el for el in self.elementos()}
+
+    def indice(self) -> "_Indice":
+        if self._indice is None:
+            self._indice = _Indice(self)
+        return self._indice
+
+    @property
+    def cursor(self) -> str:
+        return f"{self.linaje}.{self.revision}"
+
+    def cambios_desde(self, revision: int) -> Optional[List[Dict[str, Any]]]:
+        """Operaciones para pasar de 'revision' a la actual (una por elemento),
+        o None si esa revisión ya no está en el historial."""
+        if revision > self.revision:
+            return None
+        if revision < self.revision and (not self.historial or self.historial[0][0] > revision + 1):
+            return None
+        primera: Dict[str, str] = {}
+        ultima: Dict[str, Tuple[str, Optional[Elemento]]] = {}
+        for rev, ops in self.historial:
+            if rev <= revision:
+                continue
+            for op, k, el in ops:
+                primera.setdefault(k, op)
+                ultima[k] = (op, el)
+        salida: List[Tuple[str, str, Optional[Elemento]]] = []
+        for k, (op, el) in ultima.items():
+            existia = primera[k] != "add"
+            existe = op != "remove"
+            if existia and existe:
+                salida.append(("update", k, el))
+            elif existia:
+                salida.append(("remove", k, None))
+            elif existe:
+                salida.append(("add", k, el))
+        salida.sort(key=lambda o: _orden(o[0], o[2]))
+        return [{"op": op, "id": k} if el is None else {"op": op, "element": el}
+                for op, k, el in salida]
+
+
+# ===========================================================
+# Ventanas (vista parcial de familias grandes)
+# ===========================================================
+
+# Zonas de un grupo (bits altos de su clave: zona << 40 | fila << 20 | col)
+_ARRIBA, _ABAJO, _IZQ, _DER, _CELDA, _FILA = range(6)
+_ZONAS = ("arriba", "abajo", "izquierda", "derecha", "celda", "fila")
+
+class _Indice:
+    """Nodos (personas y uniones) en arreglos NumPy + aristas por índice.
+    Se arma una vez por revisión y no se modifica: se puede leer sin _lock."""
+
+    def __init__(self, a: ArbolFamilia):
+        self.nodos: List[Elemento] = []
+        fila, col, xs, ys, persona, fallecido = [], [], [], [], [], []
+        pos: Dict[str, int] = {}
+        for node_id, el in a.nodos.items():
+            r, c, _ = a.origen[node_id]
+            pos[node_id] = len(self.nodos)
+            self.nodos.append(el)
+            fila.append(r); col.append(c)
+            xs.append(el["position"]["x"]); ys.append(el["position"]["y"])
+            persona.append(True); fallecido.append(bool(el["data"]["fallecido"]))
+        self.aristas: List[Elemento] = []
+        for el in a.uniones:
+            d = el["data"]
+            if "source" in d:
+                self.aristas.append(el)
+                continue
+            r, c = a.origen_union[d["id"]]
+            pos[d["id"]] = len(self.nodos)
+            self.nodos.append(el)
+            fila.append(r); col.append(c)
+            xs.append(el["position"]["x"]); ys.append(el["position"]["y"])
+            persona.append(False); fallecido.append(False)
+        self.fila = np.array(fila, dtype=np.int64)
+        self.col = np.array(col, dtype=np.int64)
+        self.x = np.array(xs, dtype=np.float64)
+        self.y = np.array(ys, dtype=np.float64)
+        self.persona = np.array(persona, dtype=bool)
+        self.fallecido = np.array(fallecido, dtype=bool)
+        self.origen = np.array([pos[e["data"]["source"]] for e in self.aristas], dtype=np.int64)
+        self.destino = np.array([pos[e["data"]["target"]] for e in self.aristas], dtype=np.int64)
+
+def _nombre_grupo(clave: int) -> Tuple[str, int, int, int]:
+    zona, fila, col = clave >> 40, (clave >> 20) & 0xFFFFF, clave & 0xFFFFF
+    if zona in (_ARRIBA, _ABAJO):
+        return f"g-{_ZONAS[zona]}", zona, -1, -1
+    if zona == _CELDA:
+        return f"g-celda-{fila}-{col}", zona, fila, col
+    return f"g-{_ZONAS[zona]}-{fila}", zona, fila, -1
+
+def _ventana(ix: _Indice, caja: Tuple[float, float, float, float],
+             filas: Tuple[int, int], limite: int) -> Dict[str, Any]:
+    x0, y0, x1, y1 = caja
+    f0, f1 = filas
+    n = len(ix.nodos)
+    en_filas = (ix.fila >= f0) & (ix.fila <= f1)
+    dentro = en_filas & (ix.x >= x0) & (ix.x <= x1) & (ix.y >= y0) & (ix.y <= y1)
+
+    # ---- Afuera: un grupo arriba, uno abajo y, en la franja visible, uno a cada lado por generación
+    arriba = ~dentro & ((ix.fila < f0) | (ix.y < y0))
+    abajo = ~dentro & ~arriba & ((ix.fila > f1) | (ix.y > y1))
+    lado = ~dentro & ~arriba & ~abajo
+    izq = lado & (ix.x < x0)
+    der = lado & ~izq
+    clave = np.full(n, -1, dtype=np.int64)
+    clave[arriba] = _ARRIBA << 40
+    clave[abajo] = _ABAJO << 40
+    clave[izq] = (_IZQ << 40) | (ix.fila[izq] << 20)
+    clave[der] = (_DER << 40) | (ix.fila[der] << 20)
+
+    # ---- Adentro: personas sueltas, o agrupadas por celda / generación si son demasiadas
+    visibles = int((dentro & ix.persona).sum())
+    detalle = "personas"
+    if visibles > limite:
+        celdas = (_CELDA << 40) | (ix.fila << 20) | ix.col
+        if len(np.unique(celdas[dentro & ix.persona])) <= limite:
+            detalle = "celdas"
+            clave[dentro] = celdas[dentro]
+        else:
+            detalle = "filas"
+            clave[dentro] = (_FILA << 40) | (ix.fila[dentro] << 20)
+
+    # ---- Grupos: conteos, posición media y caja de sus personas
+    agrupado = clave >= 0
+    claves, inv = np.unique(clave[agrupado], return_inverse=True)
+    per = ix.persona[agrupado]
+    personas = np.bincount(inv, weights=per, minlength=len(claves))
+    fallecidos = np.bincount(inv, weights=per & ix.fallecido[agrupado], minlength=len(claves))
+    peso = np.where(per, 1.0, 0.0)
+    gx = np.bincount(inv, weights=ix.x[agrupado] * peso, minlength=len(claves))
+    gy = np.bincount(inv, weights=ix.y[agrupado] * peso, minlength=len(claves))
+    xmin = np.full(len(claves), np.inf); xmax = np.full(len(claves), -np.inf)
+    ymin = np.full(len(claves), np.inf); ymax = np.full(len(claves), -np.inf)
+    np.minimum.at(xmin, inv[per], ix.x[agrupado][per]); np.maximum.at(xmax, inv[per], ix.x[agrupado][per])
+    np.minimum.at(ymin, inv[per], ix.y[agrupado][per]); np.maximum.at(ymax, inv[per], ix.y[agrupado][per])
+
+    elements: List[Elemento] = []
+    ids_grupo: List[Optional[str]] = []
+    for g, k in enumerate(claves.tolist()):
+        cant = int(personas[g])
+        if not cant:
+            ids_grupo.append(None)  # solo uniones: sin nodo (ni aristas)
+            continue
+        gid, zona, fila, col = _nombre_grupo(k)
+        ids_grupo.append(gid)
+        x, y = gx[g] / cant, gy[g] / cant
+        if zona < _CELDA:
+            # Los de afuera, pegados al borde de la ventana
+            x = min(max(x, x0 - CELL_W / 2), x1 + CELL_W / 2)
+            y = min(max(y, y0 - CELL_H / 2), y1 + CELL_H / 2)
+        muertos = int(fallecidos[g])
+        elements.append({
+            "data": {
+                "id": gid, "kind": "grupo", "zona": _ZONAS[zona],
+                "fila": fila, "columna": col,
+                "label": f"{cant} persona{'s' if cant != 1 else ''}",
+                "personas": cant, "fallecidos": muertos,
+                "caja": {"x1": float(xmin[g]), "y1": float(ymin[g]),
+                         "x2": float(xmax[g]), "y2": float(ymax[g])},
+            },
+            "position": {"x": float(x), "y": float(y)},
+        })
+
+    # ---- Nodos sueltos
+    sueltos = np.flatnonzero(~agrupado)
+    elements[:0] = [ix.nodos[i] for i in sueltos.tolist()]
+
+    # ---- Aristas: entre sueltos tal cual; con un grupo, redirigidas y sin repetir
+    rep = np.arange(n, dtype=np.int64)
+    rep[agrupado] = n + inv
+    vacios = [g for g, gid in enumerate(ids_grupo) if gid is None]
+    if vacios:
+        rep[agrupado & np.isin(rep - n, vacios)] = -1
+    ro, rd = rep[ix.origen], rep[ix.destino]
+    interior = np.zeros(len(claves) + 1, dtype=bool)
+    interior[:len(claves)] = (claves >> 40) >= _CELDA
+    ambos_grupo = (ro >= n) & (rd >= n)
+    sirve = (ro >= 0) & (rd >= 0) & (ro != rd)
+    sirve &= ~ambos_grupo | (interior[np.where(ro >= n, ro - n, -1)] & interior[np.where(rd >= n, rd - n, -1)])
+    vistas = set()
+    for e in np.flatnonzero(sirve).tolist():
+        o, d = int(ro[e]), int(rd[e])
+        el = ix.aristas[e]
+        if o < n and d < n:
+            elements.append(el)
+            continue
+        etype = el["data"].get("etype")
+        if (o, d, etype) in vistas:
+            continue
+        vistas.add((o, d, etype))
+        so = ix.nodos[o]["data"]["id"] if o < n else ids_grupo[o - n]
+        sd = ix.nodos[d]["data"]["id"] if d < n else ids_grupo[d - n]
+        elements.append({"data": {"id": f"e-{so}-{sd}-{etype}", "source": so, "target": sd,
+                                  "etype": etype, "agrupada": 1}})
+
+    return {
+        "detalle": detalle,
+        "total": int(ix.persona.sum()),
+        "visibles": visibles,
+        "elements": elements,
+    }
+
+
+_cache: Dict[str, ArbolFamilia] = {}
+_lock = threading.Lock()  # varios lectores de db pueden pedir/parchar a la vez
+
+def _al_dia(familia: str, matriz: db.FamiliaMatriz) -> ArbolFamilia:
+    """Grafo de la familia con todo lo pendiente aplicado (llamar con _lock)."""
+    a = _cache.get(familia)
+    v = db.version(familia)
+    if a is None or a.matriz is not matriz or (a.version != v and a.version_objetivo != v):
+        a = _cache[familia] = ArbolFamilia(familia, matriz, previo=a)
+    if a.pendientes:
+        a.nacimientos()
+    if a.sucio:
+        a.refrescar()
+    return a
+
+def elementos(familia: Optional[str]) -> List[Elemento]:
+    """Elementos de Cytoscape de la familia (leer con db.lectura() o db.cerrojo)."""
+    return instantanea(familia)[0]
+
+def instantanea(familia: Optional[str]) -> Tuple[List[Elemento], Optional[str]]:
+    """(elementos, cursor): el cursor sirve para pedir después cambios() desde acá."""
+    matriz = db.obtener_matriz(familia) if familia else None
+    if not matriz:
+        return [], None
+    with _lock:
+        a = _al_dia(familia, matriz)
+        return a.elementos(), a.cursor
+
+def cambios(familia: Optional[str], cursor: Optional[str]) -> Dict[str, Any]:
+    """Parches desde 'cursor': {"cursor", "cambios": [{"op": "add"|"update", "element"}
+    | {"op": "remove", "id"}]}. Si el cursor no sirve (otro linaje, muy viejo o
+    vacío) devuelve {"cursor", "reset": True, "elements": [...]} con el grafo entero."""
+    matriz = db.obtener_matriz(familia) if familia else None
+    if not matriz:
+        return {"cursor": None, "reset": True, "elements": []}
+    with _lock:
+        a = _al_dia(familia, matriz)
+        linaje, _, rev = (cursor or "").partition(".")
+        ops = a.cambios_desde(int(rev)) if linaje == a.linaje and rev.isdigit() else None
+        if ops is None:
+            return {"cursor": a.cursor, "reset": True, "elements": a.elementos()}
+        return {"cursor": a.cursor, "cambios": ops}
+
+def ventana(familia: Optional[str], caja: Optional[Tuple[float, float, float, float]] = None,
+            filas: Optional[Tuple[int, int]] = None, limite: int = LIMITE_VENTANA) -> Dict[str, Any]:
+    """Vista acotada del árbol: {"cursor", "detalle": "personas"|"celdas"|"filas",
+    "total", "visibles", "elements"}. 'caja' = (x1, y1, x2, y2) en coordenadas del
+    árbol y 'filas' = (desde, hasta) de generaciones; sin ellos, toda la familia."""
+    matriz = db.obtener_matriz(familia) if familia else None
+    if not matriz:
+        return {"cursor": None, "detalle": "personas", "total": 0, "visibles": 0, "elements": []}
+    with _lock:
+        a = _al_dia(familia, matriz)
+        ix, cursor = a.indice(), a.cursor
+    inf = float("inf")
+    res = _ventana(ix, caja or (-inf, -inf, inf, inf), filas or (0, 0xFFFFF), max(1, limite))
+    res["cursor"] = cursor
+    return res
+
+def registrar_delta(delta: Dict[str, Any]) -> None:
+    """Para el on_delta del gestor: anota los nacimientos y marca cambios en el lugar."""
+    with _lock:
+        por_familia: Dict[str, List[Tuple[int, int]]] = {}
+        for fam, fila, col, _ in delta.get("nacimientos", ()):
+            por_familia.setdefault(fam, []).append((fila, col))
+        for fam, a in list(_cache.items()):
+            a.sucio = True
+            nuevos = por_familia.get(fam)
+            if not nuevos:
+                continue
+            # Cada nacimiento suma una versión; si hubo algo más, se rearma entero.
+            if a.version_objetivo + len(nuevos) == db.version(fam):
+                a.pendientes.extend(nuevos)
+                a.version_objetivo = db.version(fam)
+            else:
+                a.pendientes.clear()
+                a.version_objetivo = -1
+
+def marcar(familia: str) -> None:
+    """Avisar que se modificaron dicts de personas en el lugar (sin pasar por db)."""
+    with _lock:
+        a = _cache.get(familia)
+        if a is not None:
+            a.sucio = True
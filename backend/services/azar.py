@@ -0,0 +1,72 @@
+# services/azar.py
+# Azar "por contador" para el simulador: cada sorteo es una función pura de
+# (semilla, familia, tick, fase, persona[, intento]), sin estado compartido.
+# Así la historia de una familia no depende del orden de proceso, de cuántas
+# familias haya ni de qué otras personas existan: se puede repartir entre hilos,
+# correr en lote o repetir un tick y obtener exactamente lo mismo.
+#
+# La mezcla es el finalizador de SplitMix64 aplicado en cadena sobre cada
+# componente de la clave; la versión NumPy y la escalar dan los mismos bits.
+from __future__ import annotations
+
+from hashlib import blake2b
+from typing import Sequence, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+_M = (1 << 64) - 1
+_C0, _C1, _C2 = 0x9E3779B97F4A7C15, 0xBF58476D1CE4E5B9, 0x94D049BB133111EB
+_ESCALA = 2.0 ** -53
+
+# Fases (parte de la clave: un mismo tick/persona da sorteos distintos por fase)
+MUERTE = 1
+NACIMIENTO = 2
+GENERO = 3
+NOMBRE = 4
+UNION = 5
+AFINIDAD = 6
+
+def hash64(texto: str) -> int:
+    """Entero de 64 bits estable entre ejecuciones (a diferencia de hash())."""
+    return int.from_bytes(blake2b(texto.encode("utf-8"), digest_size=8).digest(), "little")
+
+def hashes64(textos: Sequence[str]) -> np.ndarray:
+    return np.fromiter((hash64(t) for t in textos), dtype=np.uint64, count=len(textos))
+
+def _mezclar(z: int) -> int:
+    z = (z + _C0) & _M
+    z = ((z ^ (z >> 30)) * _C1) & _M
+    z = ((z ^ (z >> 27)) * _C2) & _M
+    return z ^ (z >> 31)
+
+def _mezclar_np(z: np.ndarray) -> np.ndarray:
+    z = z + np.uint64(_C0)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_C1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_C2)
+    return z ^ (z >> np.uint64(31))
+
+
+class Flujo:
+    """Sorteos de un (semilla, familia, tick, fase); cada persona/intento tiene el suyo."""
+
+    def __init__(self, semilla: int, familia: str, tick: int, fase: int):
+        k = _mezclar(semilla & _M)
+        k = _mezclar(k ^ hash64(familia))
+        k = _mezclar(k ^ (tick & _M))
+        self._clave = _mezclar(k ^ fase)
+
+    def uniforme(self, persona: int, intento: int = 0) -> float:
+        """U[0, 1) para la persona (hash64 de su clave) y el número de intento."""
+        z = _mezclar(_mezclar(self._clave ^ persona) ^ intento)
+        return (z >> 11) * _ESCALA
+
+    def uniformes(self, personas: np.ndarray, intento: int = 0) -> np.ndarray:
+        """Versión en bloque de uniforme() para un arreglo uint64 de personas."""
+        with np.errstate(over="ignore"):
+            z = _mezclar_np(_mezclar_np(personas ^ np.uint64(self._clave)) ^ np.uint64(intento))
+        return (z >> np.uint64(11)).astype(np.float64) * _ESCALA
+
+    def elegir(self, opciones: Sequence[T], persona: int, intento: int = 0) -> T:
+        return opciones[int(self.uniforme(persona, intento) * len(opciones))]
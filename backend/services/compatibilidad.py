@@ -0,0 +1,275 @@
+# services/compatibilidad.py
+# Compatibilidad de parejas en bloque: las mismas reglas que validar_union de /love
+# (mayores de 18, disponibles, brecha de edad ≤ 15, ≥ 2 afinidades en común y ≥ 70%
+# de afinidad, apellidos distintos, no hermanos y sin parentesco cercano), pero para
+# todas las personas de una familia a la vez en lugar de un par por llamada.
+#
+# Por familia (y por versión de db y día, porque la edad sale de la fecha de
+# nacimiento) se arma una vez:
+#   - las personas elegibles (adultas, disponibles y vivas) ordenadas por edad: la
+#     ventana de ±15 años de cada una es un rango contiguo (searchsorted);
+#   - las afinidades como máscaras de bits (uint64 por cada 64 afinidades distintas):
+#     las coincidencias de un par son un popcount del AND;
+#   - el apellido y la celda de hermanos (filas 1 y 3) como enteros, para filtrar
+#     por genética con comparaciones de arreglos;
+#   - padres y abuelos (grafo de db) y ancestros de cada uno: los pares donde alguno
+#     tiene padres registrados se revisan con parentesco_cercano().
+# candidatos(clave, n) ordena la fila de esa persona una vez y la guarda; pares()
+# recorre todas las ventanas y devuelve todos los pares compatibles. emparejar()
+# (fase de uniones del simulador) busca cada pareja solo entre las personas del otro
+# género, que también están ordenadas por edad: su ventana es otro searchsorted.
+#
+#   compatibilidad.para(fam).candidatos(clave, 10)
+#   -> [{"nombre_completo", "cedula", "edad", "score", "comunes"}, ...]
+from __future__ import annotations
+
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import db
+
+EDAD_MINIMA = 18
+BRECHA_MAXIMA = 15
+COMUNES_MINIMAS = 2
+AFINIDAD_MINIMA = 70
+
+_TABLA_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    """Bits en 1 por fila de un arreglo (n, palabras) de uint64."""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(x).sum(axis=-1, dtype=np.int64)
+    return _TABLA_BITS[x.view(np.uint8)].reshape(x.shape[0], -1).sum(axis=-1, dtype=np.int64)
+
+def _edad(p: dict, hoy: date) -> Optional[int]:
+    # Igual que en /love: edad real según fecha_nacimiento (AAAA-MM-DD)
+    try:
+        y, m, d = map(int, (p.get("fecha_nacimiento") or "")[:10].split("-"))
+        return hoy.year - y - ((hoy.month, hoy.day) < (m, d))
+    except Exception:
+        return None
+
+def disponible(p: dict) -> bool:
+    est = (p.get("estado_civil") or "").strip().lower()
+    return not est.startswith("casad") and not p.get("union_con")
+
+def _full(p: dict) -> str:
+    return p.get("nombre_completo") or f"{p.get('nombre','')} {p.get('apellidos','')}".strip()
+
+def _genero(p: dict) -> int:
+    g = (p.get("genero") or "").lower()
+    return 0 if g.startswith("f") else 1 if g.startswith("m") else -1
+
+def _cercanos(familia: str, clave: str) -> frozenset:
+    """Padres y abuelos registrados (un ancestro común a esa distancia: hermanos, medio
+    hermanos, primos hermanos o tío/a con sobrino/a)."""
+    padres = db.padres_de(familia, clave)
+    return frozenset(padres).union(*(db.padres_de(familia, c) for c in padres))
+
+def _parientes(a: str, b: str, cercanos_a: frozenset, cercanos_b: frozenset,
+               ancestros_a: set, ancestros_b: set) -> Optional[str]:
+    if b in ancestros_a or a in ancestros_b:
+        return "Uno es ancestro del otro."
+    if not cercanos_a.isdisjoint(cercanos_b):
+        return "Comparten un padre o un abuelo."
+    return None
+
+def parentesco_cercano(familia: str, a: str, b: str) -> Optional[str]:
+    """Motivo por el que las claves a y b no pueden unirse por parentesco (uno ancestro
+    del otro, o un padre/abuelo en común), o None."""
+    return _parientes(a, b, _cercanos(familia, a), _cercanos(familia, b),
+                      db.ancestros_de(familia, a), db.ancestros_de(familia, b))
+
+
+class MatrizCompatibilidad:
+    """Personas elegibles de una familia en arreglos, para puntuar pares en bloque.
+    'personas' son los (dict, edad) a considerar; por defecto, todas las de la matriz
+    con su edad real (el simulador pasa sus adultos vivos con la edad simulada)."""
+
+    def __init__(self, familia: str, personas: Optional[Iterable[Tuple[dict, Optional[int]]]] = None):
+        self.familia = familia
+        self.version = db.version(familia)
+        self.hoy = date.today()
+        if personas is None:
+            personas = ((p, _edad(p, self.hoy)) for fila in db.obtener_matriz(familia) or []
+                        for celda in fila for p in celda)
+        elegibles: List[Tuple[int, int, str, dict]] = []
+        vistas = set()
+        for p, e in personas:
+            clave = db.clave_persona(p)
+            if clave in vistas:
+                continue   # cuenta la primera aparición, como en find_person de /love
+            vistas.add(clave)
+            if e is not None and e >= EDAD_MINIMA and disponible(p) and not p.get("fecha_defuncion"):
+                elegibles.append((e, len(elegibles), clave, p))
+        elegibles.sort(key=lambda t: (t[0], t[1]))   # por edad; el orden de la matriz desempata
+        self.personas: List[dict] = [p for *_, p in elegibles]
+        self.claves: List[str] = [c for _, _, c, _ in elegibles]
+        self.indice: Dict[str, int] = {c: i for i, c in enumerate(self.claves)}
+        n = len(self.personas)
+        self.edad = np.array([e for e, *_ in elegibles], dtype=np.int32)
+        self.genero = np.array([_genero(p) for p in self.personas], dtype=np.int8)
+        # Índices de cada género, en orden de edad (la ventana de emparejar())
+        self._por_genero = [np.flatnonzero(self.genero == g) for g in (0, 1)]
+        self._edad_genero = [self.edad[ix] for ix in self._por_genero]
+
+        # Afinidades -> bits
+        bits: Dict[str, int] = {}
+        conjuntos = [set(p.get("afinidades") or []) for p in self.personas]
+        for s in conjuntos:
+            for a in s:
+                bits.setdefault(a, len(bits))
+        palabras = max(1, (len(bits) + 63) // 64)
+        enteros = [sum(1 << bits[a] for a in s) for s in conjuntos]
+        self.mascara = np.array([[(m >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(palabras)] for m in enteros],
+                                dtype=np.uint64).reshape(n, palabras)
+        self.n_afinidades = np.array([len(s) for s in conjuntos], dtype=np.int64)
+
+        # Genética: apellido (vacío = nunca coincide) y celda de hermanos (filas 1 y 3)
+        apellidos: Dict[str, int] = {}
+        self.apellido = np.empty(n, dtype=np.int64)
+        self.celda = np.full(n, -1, dtype=np.int64)   # fila << 32 | col
+        self.lugar = np.full(n, -1, dtype=np.int64)   # índice en esa celda
+        self.varias: Dict[int, List[Tuple[int, int, int]]] = {}  # más de una posición de hijo: se revisa a mano
+        posiciones = db.posiciones_por_clave(familia)
+        for i, p in enumerate(self.personas):
+            ap = (p.get("apellidos") or "").strip().lower()
+            self.apellido[i] = apellidos.setdefault(ap, len(apellidos)) if ap else -1 - i
+            pos = [t for t in posiciones.get(self.claves[i], ()) if t[0] in (1, 3)]
+            if len(pos) == 1:
+                self.celda[i] = pos[0][0] << 32 | pos[0][1]
+                self.lugar[i] = pos[0][2]
+            elif pos:
+                self.varias[i] = pos
+        self._con_varias = np.fromiter(self.varias, dtype=np.int64, count=len(self.varias))
+        # Parentesco por el grafo: solo importa si alguno de los dos tiene padres registrados
+        self.cercanos = [_cercanos(familia, c) for c in self.claves]
+        self.ancestros = [db.ancestros_de(familia, c) if k else set() for c, k in zip(self.claves, self.cercanos)]
+        self.con_padres = np.array([bool(k) for k in self.cercanos], dtype=bool)
+        self._filas: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._pares: Optional[Tuple[np.ndarray, ...]] = None
+
+    def _ventana(self, i: int, solo_mayores: bool = False) -> np.ndarray:
+        """Índices dentro de ±BRECHA_MAXIMA años de i (si solo_mayores, los que van después de i)."""
+        e = self.edad[i]
+        hi = int(np.searchsorted(self.edad, e + BRECHA_MAXIMA, side="right"))
+        lo = i + 1 if solo_mayores else int(np.searchsorted(self.edad, e - BRECHA_MAXIMA, side="left"))
+        return np.arange(lo, hi)
+
+    def _puntuar(self, i: int, j: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(j, score, comunes) de los compatibles con i entre los índices j."""
+        comunes = _popcount(self.mascara[j] & self.mascara[i])
+        union = self.n_afinidades[j] + self.n_afinidades[i] - comunes
+        score = np.round(100 * comunes / np.maximum(union, 1)).astype(np.int64)
+        ok = ((comunes >= COMUNES_MINIMAS) & (score >= AFINIDAD_MINIMA) & (j != i)
+              & (self.apellido[j] != self.apellido[i])
+              & ((self.celda[j] != self.celda[i]) | (self.celda[i] < 0) | (self.lugar[j] == self.lugar[i])))
+        j, score, comunes = j[ok], score[ok], comunes[ok]
+        if self.varias:
+            revisar = np.flatnonzero(np.isin(j, self._con_varias) | (i in self.varias))
+            ok = np.ones(len(j), dtype=bool)
+            ok[revisar] = [self._no_hermanos(i, int(j[k])) for k in revisar]
+            j, score, comunes = j[ok], score[ok], comunes[ok]
+        revisar = np.flatnonzero(self.con_padres[j] | self.con_padres[i])
+        if len(revisar):
+            ok = np.ones(len(j), dtype=bool)
+            ok[revisar] = [self._parientes(i, int(j[k])) is None for k in revisar]
+            j, score, comunes = j[ok], score[ok], comunes[ok]
+        return j, score, comunes
+
+    def _parientes(self, i: int, j: int) -> Optional[str]:
+        return _parientes(self.claves[i], self.claves[j], self.cercanos[i], self.cercanos[j],
+                          self.ancestros[i], self.ancestros[j])
+
+    def _no_hermanos(self, i: int, j: int) -> bool:
+        pi, pj = self._posiciones(i), self._posiciones(j)
+        return not any(fa == fb and ca == cb and ia != ib and fa in (1, 3)
+                       for fa, ca, ia in pi for fb, cb, ib in pj)
+
+    def _posiciones(self, i: int) -> List[Tuple[int, int, int]]:
+        if i in self.varias:
+            return self.varias[i]
+        c = int(self.celda[i])
+        return [(c >> 32, c & 0xFFFFFFFF, int(self.lugar[i]))] if c >= 0 else []
+
+    def _fila(self, i: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Compatibles de i, ya ordenados: más afinidad, más coincidencias, edad más cercana."""
+        fila = self._filas.get(i)
+        if fila is None:
+            j, score, comunes = self._puntuar(i, self._ventana(i))
+            orden = np.lexsort((j, np.abs(self.edad[j] - self.edad[i]), -comunes, -score))
+            fila = self._filas[i] = (j[orden], score[orden], comunes[orden])
+        return fila
+
+    def candidatos(self, clave: str, n: int = 10) -> List[Dict[str, Any]]:
+        """Las n mejores parejas posibles para la persona (vacío si ella no es elegible)."""
+        i = self.indice.get(clave)
+        if i is None:
+            return []
+        out = []
+        for j, score, comunes in zip(*self._fila(i)):
+            p = self.personas[j]
+            if p.get("fecha_defuncion") or not disponible(p):
+                continue   # cambió en el lugar después de armar la matriz
+            out.append({"nombre_completo": _full(p), "cedula": self.claves[j], "edad": int(self.edad[j]),
+                        "score": int(score), "comunes": int(comunes)})
+            if len(out) >= n:
+                break
+        return out
+
+    def pares(self) -> List[Tuple[str, str, int, int]]:
+        """Todos los pares compatibles (clave_a, clave_b, score, comunes), del mejor al peor."""
+        if self._pares is None:
+            a, b, s, c = [], [], [], []
+            for i in range(len(self.personas)):
+                j, score, comunes = self._puntuar(i, self._ventana(i, solo_mayores=True))
+                a.append(np.full(len(j), i)); b.append(j); s.append(score); c.append(comunes)
+            a, b, s, c = (np.concatenate(x) if x else np.empty(0, dtype=np.int64) for x in (a, b, s, c))
+            orden = np.lexsort((b, a, -c, -s))
+            self._pares = (a[orden], b[orden], s[orden], c[orden])
+        a, b, s, c = self._pares
+        return [(self.claves[i], self.claves[j], int(x), int(y))
+                for i, j, x, y in zip(a.tolist(), b.tolist(), s.tolist(), c.tolist())]
+
+
+    def emparejar(self, buscan: Sequence[str], maximo: int) -> List[Tuple[str, str, int, int]]:
+        """Hasta 'maximo' parejas de géneros opuestos sin repetir personas: cada clave de
+        'buscan', en ese orden y si sigue libre, se queda con su mejor compatible libre.
+        Devuelve [(clave, clave_pareja, score, comunes)]."""
+        libre = np.ones(len(self.personas), dtype=bool)
+        out: List[Tuple[str, str, int, int]] = []
+        for clave in buscan:
+            if len(out) >= maximo:
+                break
+            i = self.indice.get(clave)
+            if i is None or not libre[i] or self.genero[i] < 0:
+                continue
+            otros, edades = self._por_genero[1 - self.genero[i]], self._edad_genero[1 - self.genero[i]]
+            lo = int(np.searchsorted(edades, self.edad[i] - BRECHA_MAXIMA, side="left"))
+            hi = int(np.searchsorted(edades, self.edad[i] + BRECHA_MAXIMA, side="right"))
+            j = otros[lo:hi]
+            j, score, comunes = self._puntuar(i, j[libre[j]])
+            if not len(j):
+                continue
+            k = np.lexsort((j, np.abs(self.edad[j] - self.edad[i]), -comunes, -score))[0]
+            libre[i] = libre[j[k]] = False
+            out.append((clave, self.claves[j[k]], int(score[k]), int(comunes[k])))
+        return out
+
+
+# -----------------------------
+# Caché por familia/versión/día
+# -----------------------------
+_cache: Dict[str, MatrizCompatibilidad] = {}
+_lock = threading.Lock()
+
+def para(familia: str) -> MatrizCompatibilidad:
+    """Matriz de la familia; se rehace si cambió db.version(familia) o el día."""
+    with _lock:
+        m = _cache.get(familia)
+        if m is None or m.version != db.version(familia) or m.hoy != date.today():
+            m = _cache[familia] = MatrizCompatibilidad(familia)
+        return m
@@ -4,21 +4,176 @@
 #   cada fila = lista de columnas (subfamilias)
 #   cada celda = lista de personas (dicts)
 
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Tuple
 from datetime import datetime, date
+from bisect import insort
+from contextlib import contextmanager
+from functools import wraps
+import threading
 import unicodedata
 
 FamiliaMatriz = List[List[List[dict]]]
 familias: Dict[str, FamiliaMatriz] = {}
 
+# Índices por familia (se mantienen al día en cada alta/unión/limpieza):
+#   "por_cedula": clave_persona -> dict persona (primera aparición registrada)
+#   "por_nombre": nombre normalizado -> [claves] (sin repetir)
+#   "posiciones": nombre normalizado -> [(fila, columna, idx)] en orden de la matriz
+#   "por_progenitor": cédula -> [dicts hijo] cuyo padre_cedula/madre_cedula es esa cédula
+# Grafo de parentesco (listas de adyacencia por clave_persona):
+#   "padres" / "hijos" / "conyuges": clave -> [claves]
+# Cierre transitivo (caché que se actualiza al agregar cada arista padre->hijo):
+#   "ancestros" / "descendientes": clave -> {claves}
+# Convención de la matriz: filas pares = parejas (por pares [0,1], [2,3], ... de la celda),
+# fila impar r = hijos de la pareja en (r-1, misma columna). Vale para cualquier profundidad.
+Posicion = Tuple[int, int, int]
+IndiceFamilia = Dict[str, dict]
+indices: Dict[str, IndiceFamilia] = {}
+
+# Versión por familia: sube con cada mutación hecha vía db. Las estructuras derivadas
+# (p. ej. services/poblacion.py) la guardan y se reconstruyen si ya no coincide.
+versiones: Dict[str, int] = {}
+
+# Diario de escritura anticipada (lo asigna services/persistencia.py).
+# Si está definido, recibe (operacion, argumentos) ANTES de aplicar cada mutación;
+# los argumentos usan los mismos nombres que la función de db para poder re-ejecutarla.
+journal: Callable[[str, Dict[str, Any]], None] | None = None
+OPERACIONES_DIARIO = (
+    "crear_familia", "limpiar_familia", "limpiar_todo", "agregar_persona",
+    "unir_pareja", "actualizar_persona", "colocar_pareja",
+)
+
+class CerrojoLE:
+    """
+    Cerrojo lectores/escritor para familias/índices.
+      - `with cerrojo:`          escritura exclusiva (reentrante para el hilo que la tiene)
+      - `with cerrojo.lectura():` lectura compartida (reentrante; no-op para el escritor)
+      - `cerrojo.ceder()`         entre dos escrituras seguidas, deja pasar a los lectores en espera
+    Prioriza al escritor: si uno espera, no entran lectores nuevos, así el simulador no
+    queda postergado por un flujo continuo de requests. No se puede pasar de lectura a
+    escritura en el mismo hilo (dos hilos haciéndolo se bloquearían entre sí).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._lectores = 0
+        self._escritor: int | None = None
+        self._profundidad = 0
+        self._esperando = 0
+        self._lectores_esperando = 0
+        self._local = threading.local()
+
+    # ---- escritura ----
+    def acquire(self) -> bool:
+        yo = threading.get_ident()
+        with self._cond:
+            if self._escritor == yo:
+                self._profundidad += 1
+                return True
+            if getattr(self._local, "lecturas", 0):
+                raise RuntimeError("db: no se puede escribir dentro de una lectura (cerrojo.lectura())")
+            self._esperando += 1
+            try:
+                while self._escritor is not None or self._lectores:
+                    self._cond.wait()
+            finally:
+                self._esperando -= 1
+            self._escritor = yo
+            self._profundidad = 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._profundidad -= 1
+            if self._profundidad == 0:
+                self._escritor = None
+                self._cond.notify_all()
+
+    def ceder(self) -> None:
+        """Para un escritor que toma el cerrojo muchas veces seguidas (advance): espera a
+        que entren los lectores que quedaron esperando antes de volver a escribir. Sin
+        esto el mismo hilo lo recupera antes de que los lectores se despierten."""
+        with self._cond:
+            if self._escritor == threading.get_ident():
+                return
+            while self._lectores_esperando:
+                self._cond.wait()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    # ---- lectura ----
+    def _entrar_lectura(self) -> None:
+        n = getattr(self._local, "lecturas", 0)
+        if n == 0 and self._escritor != threading.get_ident():
+            with self._cond:
+                if self._escritor is not None or self._esperando:
+                    self._lectores_esperando += 1
+                    try:
+                        while self._escritor is not None or self._esperando:
+                            self._cond.wait()
+                    finally:
+                        self._lectores_esperando -= 1
+                    self._cond.notify_all()
+                self._lectores += 1
+            self._local.compartida = True
+        elif n == 0:
+            self._local.compartida = False  # el escritor ya tiene acceso exclusivo
+        self._local.lecturas = n + 1
+
+    def _salir_lectura(self) -> None:
+        self._local.lecturas -= 1
+        if self._local.lecturas == 0 and self._local.compartida:
+            with self._cond:
+                self._lectores -= 1
+                if self._lectores == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def lectura(self):
+        self._entrar_lectura()
+        try:
+            yield
+        finally:
+            self._salir_lectura()
+
+# Cada mutación de db, el tick del simulador y los snapshots de persistencia toman la
+# escritura (un snapshot nunca ve una operación a medio aplicar). Las vistas de Flask
+# que recorren matrices o dicts de personas leen dentro de `lectura()`.
+cerrojo = CerrojoLE()
+lectura = cerrojo.lectura
+
+def _registrar(op: str, **args) -> None:
+    if journal:
+        journal(op, args)
+
+def _tocar(familia: str) -> None:
+    versiones[familia] = versiones.get(familia, 0) + 1
+
+def version(familia: str) -> int:
+    return versiones.get(familia, 0)
+
+def _exclusivo(fn):
+    @wraps(fn)
+    def envuelta(*args, **kwargs):
+        with cerrojo:
+            return fn(*args, **kwargs)
+    return envuelta
+
 # ------------------ API base ------------------
 
+@_exclusivo
 def crear_familia(nombre: str) -> bool:
     """Crea una familia con matriz vacía. Devuelve False si ya existe o nombre vacío."""
     nombre = (nombre or "").strip()
     if not nombre or nombre in familias:
         return False
+    _registrar("crear_familia", nombre=nombre)
     familias[nombre] = []  # matriz vacía
+    indices[nombre] = _indice_vacio()
+    _tocar(nombre)
     return True
 
 def listar_familias() -> List[str]:
@@ -32,16 +187,25 @@ def obtener_matriz(nombre: str) -> FamiliaMatriz | None:
     """Devuelve la matriz de una familia o None si no existe."""
     return familias.get(nombre)
 
+@_exclusivo
 def limpiar_familia(nombre: str) -> bool:
     """Resetea la matriz de una familia concreta."""
     if nombre in familias:
+        _registrar("limpiar_familia", nombre=nombre)
         familias[nombre] = []
+        indices[nombre] = _indice_vacio()
+        _tocar(nombre)
         return True
     return False
 
+@_exclusivo
 def limpiar_todo() -> None:
     """Elimina todas las familias y datos (¡cuidado!)."""
+    _registrar("limpiar_todo")
+    for nombre in familias:
+        _tocar(nombre)
     familias.clear()
+    indices.clear()
 
 def _tamano_dinamico(matriz: FamiliaMatriz, fila: int, columna: int) -> None:
     """Asegura que la matriz tenga al menos [fila][columna]."""
@@ -50,17 +214,275 @@ def _tamano_dinamico(matriz: FamiliaMatriz, fila: int, columna: int) -> None:
     while len(matriz[fila]) <= columna:
         matriz[fila].append([])
 
-def agregar_persona(persona: dict, nombre_familia: str, fila: int, columna: int) -> None:
+@_exclusivo
+def agregar_persona(persona: dict, nombre_familia: str, fila: int, columna: int,
+                    registrar: bool = True) -> None:
     """
     Inserta una persona en la familia y posición dados.
     Lanza ValueError si la familia no existe.
+    registrar=False: no va al diario (el simulador lo guarda dentro del delta de su tick).
     """
     if not existe_familia(nombre_familia):
         raise ValueError("Familia no seleccionada o no existe")
 
+    if registrar:
+        _registrar("agregar_persona", persona=persona, nombre_familia=nombre_familia, fila=fila, columna=columna)
     m = familias[nombre_familia]
     _tamano_dinamico(m, fila, columna)
     m[fila][columna].append(persona)
+    _indexar(nombre_familia, persona, (fila, columna, len(m[fila][columna]) - 1))
+    _tocar(nombre_familia)
+
+# ------------------ Índices (cédula / nombre / posiciones) ------------------
+
+def _norm_txt(s: str) -> str:
+    s = (s or "").strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+
+def _nombre_completo(p: dict) -> str:
+    return p.get("nombre_completo") or f"{p.get('nombre') or ''} {p.get('apellidos') or ''}".strip()
+
+def clave_persona(p: dict) -> str:
+    """Clave única de una persona: su cédula o, si no tiene, nombre|apellidos|nacimiento."""
+    ced = (p.get("cedula") or "").strip()
+    if ced:
+        return ced
+    return f"{p.get('nombre') or ''}|{p.get('apellidos') or ''}|{p.get('fecha_nacimiento') or ''}"
+
+def _indice_vacio() -> IndiceFamilia:
+    return {
+        "por_cedula": {}, "por_nombre": {}, "posiciones": {}, "por_progenitor": {},
+        "padres": {}, "hijos": {}, "conyuges": {},
+        "ancestros": {}, "descendientes": {},
+    }
+
+def _indexar(familia: str, persona: dict, pos: Posicion) -> None:
+    """Registra una aparición de 'persona' en la posición 'pos' de la familia."""
+    idx = indices.setdefault(familia, _indice_vacio())
+    clave = clave_persona(persona)
+    nombre = _norm_txt(_nombre_completo(persona))
+
+    idx["por_cedula"].setdefault(clave, persona)
+    claves = idx["por_nombre"].setdefault(nombre, [])
+    if clave not in claves:
+        claves.append(clave)
+    insort(idx["posiciones"].setdefault(nombre, []), pos)
+    for campo in ("padre_cedula", "madre_cedula"):
+        ced = persona.get(campo)
+        if ced:
+            hijos = idx["por_progenitor"].setdefault(ced, [])
+            if not any(h is persona for h in hijos):
+                hijos.append(persona)
+    _enlazar(familia, persona, pos)
+
+def _arista(lista_adj: Dict[str, List[str]], desde: str, hacia: str) -> bool:
+    """Agrega 'hacia' a la lista de 'desde' si no estaba. Devuelve True si era nueva."""
+    vecinos = lista_adj.setdefault(desde, [])
+    if hacia in vecinos:
+        return False
+    vecinos.append(hacia)
+    return True
+
+def _enlazar_padre_hijo(familia: str, padre: str, hijo: str) -> None:
+    idx = indices[familia]
+    if padre and hijo and padre != hijo:
+        _arista(idx["padres"], hijo, padre)
+        if _arista(idx["hijos"], padre, hijo):
+            _actualizar_cierre(idx, padre, hijo)
+
+def _actualizar_cierre(idx: IndiceFamilia, padre: str, hijo: str) -> None:
+    """Arista nueva padre->hijo: el padre y sus ancestros pasan a ser ancestros
+    del hijo y de toda su descendencia (y viceversa). Solo toca esos dos conjuntos."""
+    anc, desc = idx["ancestros"], idx["descendientes"]
+    arriba = {padre} | anc.get(padre, set())
+    abajo = {hijo} | desc.get(hijo, set())
+    for x in abajo:
+        anc.setdefault(x, set()).update(arriba)
+    for y in arriba:
+        desc.setdefault(y, set()).update(abajo)
+
+def _enlazar_conyuges(familia: str, a: str, b: str) -> None:
+    idx = indices[familia]
+    if a and b and a != b:
+        _arista(idx["conyuges"], a, b)
+        _arista(idx["conyuges"], b, a)
+
+def _enlazar(familia: str, persona: dict, pos: Posicion) -> None:
+    """Deduce las aristas de parentesco de una aparición nueva en 'pos'."""
+    m = familias.get(familia) or []
+    fila, col, k = pos
+    clave = clave_persona(persona)
+    celda = m[fila][col]
+
+    if fila % 2 == 0:
+        # Fila de parejas: cónyuge = su par en la celda; hijos = celda (fila+1, col)
+        par = k ^ 1
+        if par < len(celda):
+            _enlazar_conyuges(familia, clave_persona(celda[par]), clave)
+        if fila + 1 < len(m) and col < len(m[fila + 1]):
+            for h in m[fila + 1][col]:
+                if not (h.get("padre_cedula") or h.get("madre_cedula")):
+                    _enlazar_padre_hijo(familia, clave, clave_persona(h))
+        return
+
+    # Fila de hijos: padres explícitos (nacimientos del simulador) o la pareja de arriba
+    explicitos = [c for c in (persona.get("padre_cedula"), persona.get("madre_cedula")) if c]
+    if explicitos:
+        for c in explicitos:
+            _enlazar_padre_hijo(familia, c, clave)
+    elif col < len(m[fila - 1]):
+        for p in m[fila - 1][col]:
+            _enlazar_padre_hijo(familia, clave_persona(p), clave)
+
+def reindexar_familia(nombre: str) -> None:
+    """Reconstruye los índices de una familia desde su matriz.
+    Usar tras editar la matriz 'a mano' (borrar o mover personas entre celdas)."""
+    indices[nombre] = _indice_vacio()
+    _tocar(nombre)
+    for i, fila in enumerate(familias.get(nombre) or []):
+        for j, celda in enumerate(fila):
+            for k, p in enumerate(celda):
+                if isinstance(p, dict):
+                    _indexar(nombre, p, (i, j, k))
+
+def buscar_por_cedula(familia: str, cedula: str) -> dict | None:
+    """Persona de la familia con esa cédula (o clave), sin recorrer la matriz."""
+    idx = indices.get(familia)
+    return idx["por_cedula"].get((cedula or "").strip()) if idx else None
+
+def cedulas_por_nombre(familia: str, nombre_completo: str) -> List[str]:
+    """Claves de las personas cuyo nombre completo normalizado coincide."""
+    idx = indices.get(familia)
+    return list(idx["por_nombre"].get(_norm_txt(nombre_completo), [])) if idx else []
+
+def nombres_indexados(familia: str) -> Dict[str, List[str]]:
+    """Nombre completo normalizado -> claves, en orden de alta (solo lectura)."""
+    idx = indices.get(familia)
+    return idx["por_nombre"] if idx else {}
+
+def posiciones_de(familia: str, nombre_completo: str) -> List[Posicion]:
+    """Todas las posiciones (fila, columna, idx) donde aparece la persona, en orden de la matriz."""
+    idx = indices.get(familia)
+    return list(idx["posiciones"].get(_norm_txt(nombre_completo), [])) if idx else []
+
+def posiciones_por_clave(familia: str) -> Dict[str, List[Posicion]]:
+    """Clave -> posiciones de su nombre (lo de posiciones_de, para todas las personas
+    de una vez y sin normalizar nombres). Las listas son las del índice: solo lectura."""
+    idx = indices.get(familia)
+    if not idx:
+        return {}
+    pos = idx["posiciones"]
+    return {c: pos.get(n, []) for n, claves in idx["por_nombre"].items() for c in claves}
+
+def _vecinos(familia: str, tipo: str, clave: str) -> List[str]:
+    idx = indices.get(familia)
+    return list(idx[tipo].get(clave, [])) if idx else []
+
+def padres_de(familia: str, clave: str) -> List[str]:
+    """Claves de los padres (O(grado))."""
+    return _vecinos(familia, "padres", clave)
+
+def hijos_de(familia: str, clave: str) -> List[str]:
+    """Claves de los hijos (O(grado))."""
+    return _vecinos(familia, "hijos", clave)
+
+def conyuges_de(familia: str, clave: str) -> List[str]:
+    """Claves de las parejas (O(grado))."""
+    return _vecinos(familia, "conyuges", clave)
+
+def ancestros_de(familia: str, clave: str) -> set:
+    """Todos los ancestros (cualquier generación) desde la caché de cierre."""
+    idx = indices.get(familia)
+    return set(idx["ancestros"].get(clave, ())) if idx else set()
+
+def descendientes_de(familia: str, clave: str) -> set:
+    """Todos los descendientes (cualquier generación) desde la caché de cierre."""
+    idx = indices.get(familia)
+    return set(idx["descendientes"].get(clave, ())) if idx else set()
+
+def hijos_registrados(familia: str, cedula: str) -> List[dict]:
+    """Dicts de los hijos que declaran esa cédula como padre_cedula o madre_cedula."""
+    idx = indices.get(familia)
+    return list(idx["por_progenitor"].get(cedula, ())) if idx and cedula else []
+
+def apariciones(familia: str, clave: str) -> List[dict]:
+    """Todos los dicts (sin repetir) que representan a la persona en la matriz.
+    Una misma persona puede estar copiada en varias filas (p. ej. hijo en fila 1 y pareja en fila 2)."""
+    p = buscar_por_cedula(familia, clave)
+    if not p:
+        return []
+    m = familias.get(familia) or []
+    out, vistos = [], set()
+    for i, j, k in posiciones_de(familia, _nombre_completo(p)):
+        d = m[i][j][k]
+        if id(d) not in vistos and clave_persona(d) == clave:
+            vistos.add(id(d))
+            out.append(d)
+    return out or [p]
+
+@_exclusivo
+def actualizar_persona(familia: str, clave: str, cambios: Dict[str, Any]) -> bool:
+    """Aplica 'cambios' a todas las apariciones de la persona. False si no existe."""
+    if not buscar_por_cedula(familia, clave):
+        return False
+    _registrar("actualizar_persona", familia=familia, clave=clave, cambios=cambios)
+    for d in apariciones(familia, clave):
+        d.update(cambios)
+    _tocar(familia)
+    return True
+
+@_exclusivo
+def colocar_pareja(familia: str, columna: int, clave_a: str, clave_b: str, fila: int = 2) -> bool:
+    """
+    Ubica a la pareja en (fila, columna): primero la saca de cualquier otra celda
+    de esa fila y luego la agrega (sin duplicar). Reindexa la familia.
+    """
+    m = obtener_matriz(familia)
+    pa, pb = buscar_por_cedula(familia, clave_a), buscar_por_cedula(familia, clave_b)
+    if m is None or not pa or not pb:
+        return False
+    _registrar("colocar_pareja", familia=familia, columna=columna, clave_a=clave_a, clave_b=clave_b, fila=fila)
+
+    _tamano_dinamico(m, fila, columna)
+    for celda in m[fila]:
+        celda[:] = [x for x in celda if clave_persona(x) not in (clave_a, clave_b)]
+    m[fila][columna].extend([pa, pb])
+    reindexar_familia(familia)
+    return True
+
+def reconstruir_contadores_cedula() -> None:
+    """Recalcula los contadores de _cedula() desde las personas cargadas
+    (tras restaurar datos persistidos, para no repetir cédulas)."""
+    prov_por_prefijo = {v: k for k, v in PROV_PREFIJO.items()}
+    for m in familias.values():
+        for fila in m:
+            for celda in fila:
+                for p in celda:
+                    ced = (p.get("cedula") or "").strip()
+                    if len(ced) == 9 and ced.isdigit() and ced[0] in prov_por_prefijo:
+                        prov = prov_por_prefijo[ced[0]]
+                        _contador_por_prov[prov] = max(_contador_por_prov.get(prov, 0), int(ced[5:]))
+                        key = (p.get("nombre"), p.get("apellidos"), p.get("fecha_nacimiento"))
+                        _cedulas_persona.setdefault(key, ced)
+
+def parejas(familia: str) -> List[Tuple[str, str]]:
+    """Parejas (clave_a, clave_b) sin repetir, en el orden en que se unieron."""
+    idx = indices.get(familia)
+    out, vistas = [], set()
+    for a, conyuges in (idx["conyuges"].items() if idx else ()):
+        for b in conyuges:
+            if (b, a) not in vistas:
+                vistas.add((a, b))
+                out.append((a, b))
+    return out
+
+def buscar_por_nombre(familia: str, nombre_completo: str) -> dict | None:
+    """Primera aparición (en orden de la matriz) de la persona con ese nombre completo."""
+    m = familias.get(familia) or []
+    for i, j, k in posiciones_de(familia, nombre_completo):
+        return m[i][j][k]
+    return None
 
 # ------------------ Helpers de seed ------------------
 
@@ -442,21 +864,11 @@ def fallecidos_menores_de_50(familia: str) -> list[str]:
 
 # ========= Utilidades para unir pareja =========
 
-def _norm_txt(s: str) -> str:
-    s = (s or "").strip().lower()
-    s = unicodedata.normalize("NFD", s)
-    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-
 def _find_persona(familia: str, nombre_completo: str):
     """Devuelve (persona_dict, (fila, col, idx)) o (None, None)."""
     m = obtener_matriz(familia) or []
-    target = _norm_txt(nombre_completo)
-    for i, fila in enumerate(m):
-        for j, celda in enumerate(fila):
-            for k, p in enumerate(celda):
-                nc = p.get("nombre_completo") or f"{p.get('nombre','')} {p.get('apellidos','')}"
-                if _norm_txt(nc) == target:
-                    return p, (i, j, k)
+    for i, j, k in posiciones_de(familia, nombre_completo):
+        return m[i][j][k], (i, j, k)
     return None, None
 
 def _edad(p: dict) -> int | None:
@@ -542,6 +954,7 @@ def validar_union(familia: str, a: str, b: str) -> tuple[bool, float, list[str]]
     ok = len(reasons) == 0
     return ok, score, reasons
 
+@_exclusivo
 def unir_pareja(familia: str, a: str, b: str) -> tuple[bool, str]:
     """Crea una nueva celda en fila 2 con la pareja (no mueve ni borra apariciones previas)."""
     m = obtener_matriz(familia)
@@ -553,11 +966,16 @@ def unir_pareja(familia: str, a: str, b: str) -> tuple[bool, str]:
     if not pa or not pb:
         return False, "No se encontró a una de las personas."
 
+    _registrar("unir_pareja", familia=familia, a=a, b=b)
     # Asegurar fila 2 y al menos una columna nueva
     while len(m) <= 2:
         m.append([])
     # nueva columna al final
     m[2].append([pa, pb])
+    col = len(m[2]) - 1
+    _indexar(familia, pa, (2, col, 0))
+    _indexar(familia, pb, (2, col, 1))
+    _tocar(familia)
     return True, "Pareja creada."
 
 
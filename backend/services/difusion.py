@@ -0,0 +1,115 @@
+# services/difusion.py
+# Difusión de eventos del servidor a los navegadores (Server-Sent Events).
+#
+# Un solo publicador (el tick del simulador, el reloj) y N suscriptores: cada
+# conexión SSE tiene su propia cola acotada y publicar() solo hace put_nowait en
+# cada una, así que un cliente lento nunca frena al simulador. Si la cola de un
+# cliente se llena se lo da por atrasado y se cierra su stream; EventSource
+# reconecta solo y arranca desde el estado actual.
+#
+#   Response(difusion.stream(inicial=[("reloj", {...})]), mimetype="text/event-stream")
+#   difusion.publicar("tick", {...})
+from __future__ import annotations
+
+import json
+import queue
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+COLA_MAX = 256          # eventos sin leer por cliente antes de cortarlo
+LATIDO_SEG = 15.0       # comentario ":" para detectar conexiones muertas (y proxies)
+
+Evento = Tuple[str, Any]  # (tipo, datos JSON)
+
+
+class Suscripcion:
+    """Cola de eventos de una conexión."""
+
+    def __init__(self, maximo: int = COLA_MAX):
+        self.cola: "queue.Queue[Evento]" = queue.Queue(maxsize=maximo)
+        self.atrasada = False
+
+    def entregar(self, evento: Evento) -> bool:
+        try:
+            self.cola.put_nowait(evento)
+            return True
+        except queue.Full:
+            self.atrasada = True
+            return False
+
+
+class Difusor:
+    """Reparte cada evento publicado a todas las suscripciones activas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: List[Suscripcion] = []
+        self.stats: Dict[str, int] = {"publicados": 0, "descartados": 0}
+
+    def suscribir(self, maximo: int = COLA_MAX) -> Suscripcion:
+        sus = Suscripcion(maximo)
+        with self._lock:
+            self._subs.append(sus)
+        return sus
+
+    def desuscribir(self, sus: Suscripcion) -> None:
+        with self._lock:
+            if sus in self._subs:
+                self._subs.remove(sus)
+
+    def publicar(self, tipo: str, datos: Any) -> int:
+        """Encola el evento en cada suscripción; devuelve a cuántas llegó."""
+        with self._lock:
+            subs = list(self._subs)
+            self.stats["publicados"] += 1
+        entregados = 0
+        for sus in subs:
+            if sus.atrasada:
+                continue
+            if sus.entregar((tipo, datos)):
+                entregados += 1
+            else:
+                self.stats["descartados"] += 1
+        return entregados
+
+    @property
+    def suscriptores(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+
+def formatear(tipo: str, datos: Any) -> str:
+    """Un evento en formato SSE (datos en una línea de JSON)."""
+    return f"event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+def stream(inicial: Iterable[Evento] = (), latido_seg: float = LATIDO_SEG,
+           difusor: Optional[Difusor] = None, maximo: int = COLA_MAX) -> Iterator[str]:
+    """Generador para la respuesta SSE: primero 'inicial', después lo que se publique.
+    Se suscribe al empezar a iterar y se desuscribe al terminar (cliente desconectado,
+    atrasado o servidor cerrando)."""
+    difusor = difusor or _difusor
+    sus = difusor.suscribir(maximo)
+    try:
+        yield "retry: 3000\n\n"
+        for tipo, datos in inicial:
+            yield formatear(tipo, datos)
+        while not sus.atrasada:
+            try:
+                tipo, datos = sus.cola.get(timeout=latido_seg)
+            except queue.Empty:
+                yield ": latido\n\n"  # si el cliente se fue, esta escritura corta el stream
+                continue
+            yield formatear(tipo, datos)
+    finally:
+        difusor.desuscribir(sus)
+
+
+# Instancia de la app
+_difusor = Difusor()
+
+def publicar(tipo: str, datos: Any) -> int:
+    return _difusor.publicar(tipo, datos)
+
+def suscriptores() -> int:
+    return _difusor.suscriptores
@@ -0,0 +1,125 @@
+# services/disposicion.py
+# Layout por capas (estilo Sugiyama) del árbol de una familia.
+#
+# Las capas son las filas de la matriz (generaciones) y cada celda es un "bloque"
+# con un lugar (SLOT) por persona; las personas y los nodos unión se ubican dentro
+# de su bloque, así que el layout se calcula por celda y no por persona.
+#   1) Orden (reducción de cruces): los bloques de cada fila se ordenan por el
+#      baricentro de lo que tienen arriba: una celda de hijos, bajo la celda de sus
+#      padres; una celda de parejas, bajo sus miembros ya dibujados en otra fila.
+#   2) Coordenadas: cada bloque quiere quedar en su baricentro; los que se pisan se
+#      juntan y se centran en el promedio de lo que quería cada uno (el mínimo
+#      desplazamiento cuadrático sin superponerse ni cambiar el orden).
+# Cada celda reserva lugares de más (crece ×1.5, como un arreglo dinámico): un
+# nacimiento solo recentra a los hermanos de su celda y el resto de la fila se
+# mueve únicamente cuando la celda se queda sin lugar.
+# Una fila solo depende de las de arriba: recalcular(desde) rehace esa fila y las
+# siguientes y devuelve las celdas que se movieron o cambiaron de tamaño, para
+# que services/arbol.py reubique solo esas personas.
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from . import db
+
+# ====== Layout espacioso ======
+CELL_W = 560
+CELL_H = 300
+PAD_X = 180
+PAD_Y = 140
+SLOT = 180  # separación dentro de la celda (parejas)
+SEPARACION = CELL_W - 2 * SLOT  # hueco mínimo entre celdas vecinas de una fila
+
+Lugar = Tuple[int, int, int]  # (fila, col, índice en la celda)
+
+def es_fila_pareja(r: int) -> bool:
+    # Parejas en filas 0 y 2; sus hijos en la fila siguiente
+    return r in (0, 2)
+
+def capacidad(n: int) -> int:
+    """Lugares reservados para una celda de n personas: 2, 3, 5, 8, 12, 18, 27..."""
+    cap = 2
+    while cap < n:
+        cap += (cap + 1) // 2
+    return cap
+
+def _acomodar(ideal: List[float], ancho: List[float]) -> List[float]:
+    """Centros de bloques (en su orden) lo más cerca posible de 'ideal' sin pisarse:
+    x[i] - x[i-1] >= (ancho[i-1] + ancho[i]) / 2 + SEPARACION.
+    Con o[i] = dónde quedaría i con todos pegados, x[i] = q[i] + o[i] y la condición
+    es q no decreciente: regresión isotónica (pool adjacent violators) sobre ideal - o."""
+    o = [0.0] * len(ideal)
+    for i in range(1, len(ideal)):
+        o[i] = o[i - 1] + (ancho[i - 1] + ancho[i]) / 2 + SEPARACION
+    grupos: List[List[float]] = []  # [suma, cuenta, último índice]
+    for i, v in enumerate(ideal):
+        grupos.append([v - o[i], 1, i])
+        while len(grupos) > 1 and grupos[-2][0] * grupos[-1][1] > grupos[-1][0] * grupos[-2][1]:
+            s, k, ultimo = grupos.pop()
+            grupos[-1][0] += s
+            grupos[-1][1] += k
+            grupos[-1][2] = ultimo
+    x: List[float] = []
+    for s, k, ultimo in grupos:
+        q = s / k
+        x.extend(q + o[i] for i in range(len(x), int(ultimo) + 1))
+    return x
+
+
+class Disposicion:
+    """Centro x de cada celda de la matriz; personas y uniones se ubican dentro.
+    'dibujado(r, c, i)' dice dónde se dibuja la persona de ese lugar (la primera
+    aparición, si está en varias celdas)."""
+
+    def __init__(self, matriz: db.FamiliaMatriz, dibujado: Callable[[int, int, int], Lugar]):
+        self.matriz = matriz
+        self.dibujado = dibujado
+        self.x: List[List[float]] = []
+        self.n: List[List[int]] = []
+        self.recalcular(0)
+
+    def persona(self, r: int, c: int, i: int) -> Dict[str, float]:
+        n = self.n[r][c]
+        return {"x": self.x[r][c] + (i - (n - 1) / 2) * SLOT, "y": PAD_Y + r * CELL_H}
+
+    def union(self, r: int, c: int, k: int) -> Dict[str, float]:
+        """Nodo unión de la pareja k de la celda (lugares 2k y 2k+1): entre los dos."""
+        n = self.n[r][c]
+        return {"x": self.x[r][c] + (2 * k + 0.5 - (n - 1) / 2) * SLOT, "y": PAD_Y + r * CELL_H + 12}
+
+    def _ideal(self, r: int, c: int) -> Optional[float]:
+        if r > 0 and es_fila_pareja(r - 1):
+            # Hijos: bajo la celda de sus padres
+            return self.x[r - 1][c] if c < len(self.x[r - 1]) else None
+        xs = []
+        for i in range(len(self.matriz[r][c])):
+            r2, c2, i2 = self.dibujado(r, c, i)
+            if r2 < r:
+                xs.append(self.persona(r2, c2, i2)["x"])
+        return sum(xs) / len(xs) if xs else None
+
+    def recalcular(self, desde: int = 0) -> Set[Tuple[int, int]]:
+        """Rehace las filas desde 'desde'; devuelve las celdas (fila, col) cuyo centro
+        o cantidad de lugares cambió."""
+        movidas: Set[Tuple[int, int]] = set()
+        for r in range(desde, len(self.matriz)):
+            fila = self.matriz[r]
+            n = [len(celda) for celda in fila]
+            ideal = [self._ideal(r, c) for c in range(len(fila))]
+            ideal = [PAD_X + c * CELL_W if v is None else v for c, v in enumerate(ideal)]
+            orden = sorted(range(len(fila)), key=lambda c: (ideal[c], c))
+            centros = _acomodar([ideal[c] for c in orden], [capacidad(n[c]) * SLOT for c in orden])
+            x = [0.0] * len(fila)
+            for c, v in zip(orden, centros):
+                x[c] = round(v, 1)
+            if r < len(self.x):
+                antes_x, antes_n = self.x[r], self.n[r]
+                self.x[r], self.n[r] = x, n
+            else:
+                antes_x, antes_n = [], []
+                self.x.append(x)
+                self.n.append(n)
+            movidas.update((r, c) for c in range(len(fila))
+                           if c >= len(antes_x) or antes_x[c] != x[c] or antes_n[c] != n[c])
+        del self.x[len(self.matriz):], self.n[len(self.matriz):]
+        return movidas
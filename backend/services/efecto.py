@@ -4,20 +4,20 @@ from typing import List, Dict
 # ----------------------------------------
 # Helpers
 # ----------------------------------------
-def edad_actual(persona: Dict) -> int | None:
+def edad_actual(persona: Dict, hoy: date | None = None) -> int | None:
     """Devuelve edad actual a partir de fecha de nacimiento YYYY-MM-DD."""
     try:
         if not persona.get("fecha_nacimiento"):
             return None
         y, m, d = map(int, persona["fecha_nacimiento"][:10].split("-"))
-        today = date.today()
+        today = hoy or date.today()
         return today.year - y - ((today.month, today.day) < (m, d))
     except Exception:
         return None
 
 
-def es_menor(persona: Dict) -> bool:
-    e = edad_actual(persona)
+def es_menor(persona: Dict, hoy: date | None = None) -> bool:
+    e = edad_actual(persona, hoy)
     return e is not None and e < 18
 
 
@@ -29,7 +29,7 @@ def _full(p: Dict) -> str:
 # Reglas de efectos colaterales
 # ----------------------------------------
 
-def asignar_tutores(menor: Dict, posibles_tutores: List[Dict]) -> List[Dict]:
+def asignar_tutores(menor: Dict, posibles_tutores: List[Dict], hoy: date | None = None) -> List[Dict]:
     """
     Elige todos los tutores posibles para un menor según prioridad:
     1. Hermanos mayores de 18
@@ -41,7 +41,7 @@ def asignar_tutores(menor: Dict, posibles_tutores: List[Dict]) -> List[Dict]:
     candidatos: List[Dict] = []
 
     def es_adulto(p: Dict) -> bool:
-        return (edad_actual(p) or 0) >= 18
+        return (edad_actual(p, hoy) or 0) >= 18
 
     # 1. Hermanos mayores
     hermanos = [t for t in posibles_tutores if "hermano" in (t.get("rol") or "").lower() and es_adulto(t)]
@@ -72,26 +72,29 @@ def aplicar_tutores_en_familia(matriz: list[list[list[Dict]]]) -> None:
     """
     Si ambos padres de un menor mueren, asigna el primer tutor vivo disponible
     en orden de prioridad.
+    La lista de candidatos no depende del menor (solo se lo excluye a él), así que
+    se arma una vez por familia y no una vez por cada huérfano.
     """
+    hoy = date.today()
+    candidatos: List[Dict] | None = None
     for fila in matriz:
         for celda in fila:
             for p in celda:
-                if es_menor(p):
+                if es_menor(p, hoy):
                     madre_viva = not bool(p.get("madre_defuncion"))
                     padre_vivo = not bool(p.get("padre_defuncion"))
 
                     # Solo aplica si ambos padres están muertos
                     if not madre_viva and not padre_vivo:
-                        # Todos los demás adultos de la familia menos el menor
-                        posibles = [x for row in matriz for cell in row for x in cell if x != p]
-
-                        # Lista de tutores potenciales en orden de prioridad
-                        candidatos = asignar_tutores(p, posibles)
+                        if candidatos is None:
+                            # Lista de tutores potenciales en orden de prioridad (toda la familia)
+                            todos = [x for row in matriz for cell in row for x in cell]
+                            candidatos = asignar_tutores(p, todos, hoy)
 
                         tutor_asignado = None
                         for t in candidatos:
                             # Aquí podés definir bien qué significa "muerto" en tu estructura
-                            if not t.get("fecha_defuncion"):  # si no tiene fecha de defunción
+                            if t != p and not t.get("fecha_defuncion"):  # si no tiene fecha de defunción
                                 tutor_asignado = _full(t)
                                 break  # detenemos en el primero válido
 
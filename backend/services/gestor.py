@@ -1,18 +1,28 @@
 # backend/services/gestor.py
 from __future__ import annotations
 
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 import threading
-import random
+import sys
+import time
 from typing import Callable, Optional, Dict, Any, List
 import logging
 
 log = logging.getLogger(__name__)
 
-from . import db  # usa tu db.py (misma carpeta services)
+import numpy as np
+
+from . import azar, compatibilidad, db, efecto, poblacion  # usa tu db.py (misma carpeta services)
 
 Cambio = Dict[str, Any]  # {"tipo": "cumple|fallecimiento|union|nacimiento", ...}
 
+# Qué hacer cuando un tick tarda más que tick_seg y se pasan una o más horas programadas:
+#   "saltar"        -> se descartan los ticks vencidos (esos años virtuales no ocurren)
+#   "lote"          -> el siguiente tick avanza de una vez los años vencidos + el suyo
+#   "contrapresion" -> se reprograma desde el final del tick (el año virtual se estira)
+POLITICAS_DESBORDE = ("saltar", "lote", "contrapresion")
+
 # ===========================================================
 # Helpers generales
 # ===========================================================
@@ -37,11 +47,6 @@ def _personas_en_familia(nombre_familia: str):
                     continue
                 yield p
 
-def _vivas(personas):
-    for p in personas:
-        if not p.get("fecha_defuncion"):
-            yield p
-
 def _nombre_completo(p: dict) -> str:
     return (
         p.get("nombre_completo")
@@ -62,26 +67,6 @@ def _edad_simulada(p: dict, ref: date) -> Optional[int]:
     except Exception:
         return None
 
-def _prob_muerte(edad: Optional[int]) -> float:
-    """Probabilidad simple, creciente con la edad (ajustable).
-    A partir de los 100 años la muerte es segura.
-    """
-    if edad is None:
-        return 0.001
-    if edad < 1:
-        return 0.001
-    if edad < 40:
-        return 0.003
-    if edad < 60:
-        return 0.005
-    if edad < 75:
-        return 0.015
-    if edad < 85:
-        return 0.04
-    if edad < 100:
-        return 0.08
-    return 1.0  # Nadie vive más de 100 años
-
 def _primer_apellido(apellidos: str) -> str:
     return (apellidos or "").split()[0] if apellidos else ""
 
@@ -104,6 +89,115 @@ def _edad_por_fecha_iso(fecha_iso: str, ref: date) -> Optional[int]:
         return None
 
 
+# ===========================================================
+# Fases del tick compartidas con la re-ejecución del diario
+# ===========================================================
+# Delta de un tick (lo que persistencia guarda como una sola línea "tick"):
+#   {"hoy": iso, "anios": n,
+#    "muertes": [[familia, clave]],
+#    "colaterales": [[familia, fila, col, idx, {campo: valor}]],
+#    "nacimientos": [[familia, fila, col, bebe]],
+#    "uniones": [[familia, col, clave_a, clave_b]]}
+# Los cumpleaños no se listan: todos los vivos suman 'anios', así que basta con 'hoy'.
+# Edades y muertes se calculan en bloque sobre services/poblacion.py.
+
+CAMPOS_COLATERALES = ("tutores_legales", "prob_union", "salud_emocional", "esperanza_vida")
+
+def _delta_vacio(hoy_iso: str, anios: int) -> Dict[str, Any]:
+    return {"hoy": hoy_iso, "anios": anios, "muertes": [], "colaterales": [], "nacimientos": [], "uniones": []}
+
+def _poblacion(familia: str, hoy: date) -> poblacion.PoblacionFamilia:
+    return poblacion.de(familia, lambda: _personas_en_familia(familia),
+                        lambda p: _edad_simulada(p, hoy))
+
+def _cumple_familia(familia: str, hoy: date, anios: int) -> Optional[Cambio]:
+    """Suma 'anios' a las personas vivas de la familia (evento resumen o None)."""
+    cumplen = _poblacion(familia, hoy).envejecer(anios)
+    if not cumplen:
+        return None
+    return {"tipo": "cumple", "familia": familia, "personas": cumplen, "anios": anios}
+
+def _fase_cumpleanos(hoy: date, anios: int) -> List[Cambio]:
+    """Suma 'anios' a todas las personas vivas (un evento resumen por familia)."""
+    eventos = (_cumple_familia(fam, hoy, anios) for fam in db.listar_familias())
+    return [e for e in eventos if e]
+
+def _fallecer(pob: poblacion.PoblacionFamilia, i: int, fecha_iso: str) -> None:
+    """Marca la defunción en todas las apariciones de la persona y avisa a sus hijos."""
+    pob.morir(i, fecha_iso)
+    cedula = pob.dicts[i][0].get("cedula")
+    if not cedula:
+        return
+    # Propagar defunción a los hijos (índice inverso de db: solo toca a los hijos reales)
+    for hijo in db.hijos_registrados(pob.familia, cedula):
+        if hijo.get("madre_cedula") == cedula:
+            hijo["madre_defuncion"] = True
+        if hijo.get("padre_cedula") == cedula:
+            hijo["padre_defuncion"] = True
+
+def _foto_colaterales(matriz) -> List[tuple]:
+    return [tuple(p.get(c) for c in CAMPOS_COLATERALES) for fila in matriz for celda in fila for p in celda]
+
+def _diff_colaterales(familia: str, matriz, antes: List[tuple]) -> List[list]:
+    """Campos que efecto.procesar_colaterales cambió, por posición (fila, col, idx)."""
+    out = []
+    n = 0
+    for i, fila in enumerate(matriz):
+        for j, celda in enumerate(fila):
+            for k, p in enumerate(celda):
+                cambios = {c: p[c] for c, v in zip(CAMPOS_COLATERALES, antes[n]) if p.get(c) != v}
+                if cambios:
+                    out.append([familia, i, j, k, cambios])
+                n += 1
+    return out
+
+def _nacer(pob: poblacion.PoblacionFamilia, fila: int, columna: int, bebe: dict) -> None:
+    """Agrega al bebé (fuera del diario: viaja en el delta) y lo anota en sus padres."""
+    db.agregar_persona(bebe, pob.familia, fila, columna, registrar=False)
+    pob.agregar(bebe)
+    for campo in ("padre_cedula", "madre_cedula"):
+        if bebe.get(campo):
+            for p in db.apariciones(pob.familia, bebe[campo]):
+                p.setdefault("hijos", []).append(bebe["cedula"])
+
+def _unir(pob: poblacion.PoblacionFamilia, columna: int, clave_a: str, clave_b: str, anio: int) -> None:
+    """Casa a la pareja (en todas sus apariciones) y la ubica en (2, columna), como
+    colocar_pareja de /love pero fuera del diario: viaja en el delta."""
+    pa = db.buscar_por_cedula(pob.familia, clave_a)
+    pb = db.buscar_por_cedula(pob.familia, clave_b)
+    if not pa or not pb:
+        return
+    for clave, otro in ((clave_a, pb), (clave_b, pa)):
+        for d in db.apariciones(pob.familia, clave):
+            d.update({"estado_civil": "Casado", "union_con": _nombre_completo(otro), "anio_union": anio})
+    for p in (pa, pb):
+        db.agregar_persona(p, pob.familia, 2, columna, registrar=False)
+        pob.agregar(p)
+
+def _columna_nueva(familia: str) -> int:
+    """Primera columna libre de la fila 2 (ahí nacen en fila 3 los hijos de la pareja)."""
+    m = db.obtener_matriz(familia) or []
+    return len(m[2]) if len(m) > 2 else 0
+
+def aplicar_delta(delta: Dict[str, Any]) -> None:
+    """Re-ejecuta un tick registrado (persistencia lo usa al restaurar el diario)."""
+    with db.cerrojo:
+        hoy_iso = delta["hoy"]
+        hoy = date.fromisoformat(hoy_iso)
+        _fase_cumpleanos(hoy, int(delta.get("anios", 1)))
+        for fam, clave in delta.get("muertes", ()):
+            pob = _poblacion(fam, hoy)
+            if clave in pob.fila:
+                _fallecer(pob, pob.fila[clave], hoy_iso)
+        for fam, i, j, k, cambios in delta.get("colaterales", ()):
+            m = db.obtener_matriz(fam) or []
+            m[i][j][k].update(cambios)
+        for fam, fila, col, bebe in delta.get("nacimientos", ()):
+            _nacer(_poblacion(fam, hoy), fila, col, dict(bebe))
+        for fam, col, a, b in delta.get("uniones", ()):
+            _unir(_poblacion(fam, hoy), col, a, b, hoy.year)
+
+
 # ===========================================================
 # Clase principal
 # ===========================================================
@@ -113,7 +207,10 @@ class GestorEventos:
     Simulador:
       - Cada tick (10s por defecto) avanza 1 año 'virtual' para TODAS las personas vivas (p['edad'] += 1).
       - Muertes aleatorias (según edad).
-      - Uniones (parejas M/F) con compatibilidad suficiente.
+        (ambas fases en bloque sobre las columnas de services/poblacion.py)
+      - Uniones (parejas M/F) con compatibilidad suficiente (services/compatibilidad.py),
+        hasta max_uniones_por_familia_por_tick por familia; la pareja va a una columna
+        nueva de la fila 2 y desde el tick siguiente puede tener hijos.
       - Nacimientos en parejas: bebé va a fila (fila_pareja+1) y misma columna de la pareja; cédula autogenerada.
     """
 
@@ -124,16 +221,50 @@ class GestorEventos:
         anios_por_tick: int = 1, 
         rng_seed: Optional[int] = None,
         on_change: Optional[Callable[[List[Cambio]], None]] = None,
+        on_delta: Optional[Callable[[Dict[str, Any]], None]] = None,
         max_uniones_por_familia_por_tick: int = 1,
         prob_nacimiento_por_pareja_por_tick: float = 0.25,
+        politica_desborde: str = "lote",
+        trabajadores: int = 1,
     ):
+        if politica_desborde not in POLITICAS_DESBORDE:
+            raise ValueError(f"politica_desborde debe ser una de {POLITICAS_DESBORDE}")
         self.tick_seg = tick_seg
         self.anios_por_tick = anios_por_tick
         self.on_change = on_change
-        self._timer: Optional[threading.Timer] = None
+        self.on_delta = on_delta
+        self.politica_desborde = politica_desborde
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
         self._running = False
-        self.hoy: date = date.today()
-        self.rng = random.Random(rng_seed)
+        self._metricas: Dict[str, Any] = {
+            "ticks": 0,             # ticks programados ejecutados
+            "desbordes": 0,         # ticks que terminaron después de la siguiente hora programada
+            "ticks_saltados": 0,    # política "saltar"
+            "anios_en_lote": 0,     # años extra avanzados por la política "lote"
+            "ultimo_seg": 0.0, "max_seg": 0.0, "total_seg": 0.0,   # duración del tick
+            "atraso_seg": 0.0, "max_atraso_seg": 0.0,              # inicio real - hora programada
+            "deriva_seg": 0.0,      # corrimiento acumulado del calendario ("contrapresion")
+        }
+        # Reloj: 'hoy' es la fecha de los datos (cambia en cada tick); reloj() la
+        # interpola hacia el próximo tick para mostrarla (ver más abajo)
+        self._reloj_lock = threading.Lock()
+        self.hoy = date.today()
+        # Azar por contador (services/azar.py): cada sorteo depende solo de
+        # (semilla, familia, tick, fase, persona), no del orden ni de otras familias.
+        self.semilla = rng_seed if rng_seed is not None else int(np.random.SeedSequence().entropy) & ((1 << 64) - 1)
+        # Fases por familia en paralelo (hilos), solo en un intérprete sin GIL (3.13t):
+        # casi todo _fases_familia es Python puro (colaterales, sorteo de nacimientos,
+        # matriz de compatibilidad), así que con GIL los hilos no escalan y solo suman
+        # cambios de contexto. Ahí se corre en serie.
+        self.trabajadores = max(1, trabajadores)
+        if self.trabajadores > 1 and getattr(sys, "_is_gil_enabled", lambda: True)():
+            log.warning("trabajadores=%s ignorado: este intérprete tiene GIL y el tick por familia "
+                        "no escala con hilos; se usa 1 (hace falta Python sin GIL, 3.13t)",
+                        self.trabajadores)
+            self.trabajadores = 1
+        self._pool = (ThreadPoolExecutor(self.trabajadores, thread_name_prefix="gestor-familia")
+                      if self.trabajadores > 1 else None)
         self.max_uniones_por_familia_por_tick = max_uniones_por_familia_por_tick
         self.prob_nacimiento_por_pareja_por_tick = prob_nacimiento_por_pareja_por_tick
 
@@ -146,116 +277,352 @@ class GestorEventos:
             "María","Ana","Sofía","Valeria","Emma","Camila",
             "Lucía","Sara","Zoe","Luna","Mía"
         ]
+        # Afinidades de los bebés: en parte heredadas de los padres, en parte de esta lista
+        # (sin afinidades nadie nacido en la simulación podría unirse después)
+        self.afinidades = [
+            "música","lectura","viajes","deporte","cocina","cine","tecnología",
+            "fotografía","arte","baile","senderismo","yoga","ciencia","videojuegos"
+        ]
 
     # ---------------- Ciclo de vida ----------------
     def start(self):
         if self._running:
             return
         self._running = True
-        self._programar_siguiente_tick()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="gestor-ticks", daemon=True)
+        self._hilo.start()
 
     def stop(self):
         self._running = False
-        if self._timer:
-            self._timer.cancel()
-            self._timer = None
+        self._detener.set()
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=max(1.0, self.tick_seg))
+        self._hilo = None
+
+    # ---------------- Reloj simulado ----------------
+    @property
+    def hoy(self) -> date:
+        """Fecha simulada del último tick: la que ven los datos y el diario."""
+        return self._marca[0]
+
+    @hoy.setter
+    def hoy(self, valor: date) -> None:
+        with self._reloj_lock:
+            self._marca = (valor, time.monotonic())  # (fecha, momento real en que se fijó)
+            self._visto = valor
+
+    def reloj(self) -> date:
+        """
+        Único reloj de la simulación para mostrar (/api/time, stream): mientras el
+        simulador corre avanza de 'hoy' hacia la fecha del próximo tick en proporción
+        al tiempo real transcurrido, sin pasarla (si el tick se atrasa, espera), y
+        nunca retrocede. No depende de quién lo consulte ni de cuántas veces.
+        """
+        with self._reloj_lock:
+            hoy, desde = self._marca
+            if self._running and self.tick_seg > 0:
+                frac = min(1.0, (time.monotonic() - desde) / self.tick_seg)
+                siguiente = _add_years_safe(hoy, self.anios_por_tick)
+                fecha = hoy + timedelta(days=int(frac * (siguiente - hoy).days))
+                if fecha > self._visto:
+                    self._visto = fecha
+            return self._visto
 
     def step_once(self) -> List[Cambio]:
         """Ejecuta un tick manualmente (útil para pruebas o botones en UI)."""
         return self._tick()
 
-    def _programar_siguiente_tick(self):
-        if not self._running:
-            return
-        self._timer = threading.Timer(self.tick_seg, self._tick_and_reschedule)
-        self._timer.daemon = True
-        self._timer.start()
-
-    def _tick_and_reschedule(self):
-        try:
-            self._tick()
-        finally:
-            self._programar_siguiente_tick()
+    def _bucle(self):
+        """
+        Planificador de tasa fija: el tick k está programado para inicio + k*tick_seg,
+        sin importar cuánto tardó el anterior. Si un tick termina pasada la hora del
+        siguiente, es un desborde y se aplica self.politica_desborde.
+        """
+        proximo = time.monotonic() + self.tick_seg
+        anios = self.anios_por_tick
+        while not self._detener.wait(max(0.0, proximo - time.monotonic())):
+            inicio = time.monotonic()
+            try:
+                self._tick(anios)
+            except Exception:
+                log.exception("Tick del simulador falló")
+            fin = time.monotonic()
+
+            # Horas programadas que vencieron mientras corría este tick
+            vencidos = int((fin - proximo) // self.tick_seg)
+            self._medir(fin - inicio, inicio - proximo, vencidos)
+
+            anios = self.anios_por_tick
+            if vencidos <= 0:
+                proximo += self.tick_seg
+            elif self.politica_desborde == "saltar":
+                proximo += (vencidos + 1) * self.tick_seg
+            elif self.politica_desborde == "lote":
+                proximo += (vencidos + 1) * self.tick_seg
+                anios = (vencidos + 1) * self.anios_por_tick
+            else:  # "contrapresion"
+                self._metricas["deriva_seg"] += fin - proximo
+                proximo = fin + self.tick_seg
+
+    def _medir(self, duracion: float, atraso: float, vencidos: int) -> None:
+        m = self._metricas
+        m["ticks"] += 1
+        m["ultimo_seg"] = duracion
+        m["max_seg"] = max(m["max_seg"], duracion)
+        m["total_seg"] += duracion
+        m["atraso_seg"] = max(0.0, atraso)
+        m["max_atraso_seg"] = max(m["max_atraso_seg"], m["atraso_seg"])
+        if vencidos > 0:
+            m["desbordes"] += 1
+            if self.politica_desborde == "saltar":
+                m["ticks_saltados"] += vencidos
+            elif self.politica_desborde == "lote":
+                m["anios_en_lote"] += vencidos * self.anios_por_tick
+            log.warning("Tick de %.2fs con tick_seg=%ss: %s hora(s) vencida(s), política %r",
+                        duracion, self.tick_seg, vencidos, self.politica_desborde)
+
+    def metricas(self) -> Dict[str, Any]:
+        """Latencia y atraso del planificador (para /api/sim/metricas)."""
+        m = dict(self._metricas)
+        m["promedio_seg"] = m["total_seg"] / m["ticks"] if m["ticks"] else 0.0
+        m["tick_seg"] = self.tick_seg
+        m["politica_desborde"] = self.politica_desborde
+        m["hoy"] = self.hoy.isoformat()
+        return m
 
     # ===========================================================
     # Lógica principal del simulador
     # ===========================================================
 
-    def _tick(self) -> List[Cambio]:
+    def _tick(self, anios: Optional[int] = None) -> List[Cambio]:
+        """Un paso del simulador que avanza 'anios' (por defecto anios_por_tick)."""
         eventos: List[Cambio] = []
-
-        # Avanza el "hoy" simulado
-        self.hoy = _add_years_safe(self.hoy, self.anios_por_tick)
+        self._paso(anios or self.anios_por_tick, eventos)
 
         # ---------------------------------------------------
-        # 1) Cumpleaños
+        # Notificación a la UI
         # ---------------------------------------------------
-        for fam in db.listar_familias():
-            for p in _vivas(_personas_en_familia(fam)):
-                e = _edad_simulada(p, self.hoy)
-                if e is None:
-                    p["edad"] = self.anios_por_tick
-                else:
-                    p["edad"] = int(e) + self.anios_por_tick
-                eventos.append({
-                    "tipo": "cumple",
-                    "familia": fam,
-                    "cedula": p.get("cedula",""),
-                    "nombre": _nombre_completo(p),
-                    "nueva_edad": p["edad"],
-                })
+        if self.on_change:
+            try:
+                self.on_change(eventos)
+            except Exception:
+                pass
 
-        # ---------------------------------------------------
-        # 2) Fallecimientos
-        # ---------------------------------------------------
-        from . import efecto  # asegúrate de importar arriba del archivo
+        return eventos
 
+    def advance(self, years: int, eventos: bool = False) -> Dict[str, Any]:
+        """
+        Avanza 'years' años virtuales de una sola vez (fast-forward para análisis "qué pasa si").
+        Toma el cerrojo año por año (no durante todo el recorrido, que puede ser de minutos)
+        y entre uno y otro deja pasar a los lectores; no arma eventos salvo eventos=True y
+        no notifica a on_change. Cada año sigue yendo al diario como un delta.
+        Devuelve un resumen: nacimientos, fallecimientos, uniones y vivos por familia, duración.
+        El resumen sale de los propios deltas: si el ticker corre en el medio, sus años no cuentan.
+        """
+        t0 = time.perf_counter()
+        lista: Optional[List[Cambio]] = [] if eventos else None
+        nacimientos: Dict[str, int] = {}
+        fallecimientos: Dict[str, int] = {}
+        uniones: Dict[str, int] = {}
+        pasos = max(0, years) // self.anios_por_tick
+        anios = 0
+        if not pasos:
+            with db.cerrojo:
+                desde = hasta = self.hoy
+                vivos_antes = vivos_despues = self._vivos_por_familia()
+        for k in range(pasos):
+            db.cerrojo.ceder()
+            with db.cerrojo:
+                if k == 0:
+                    desde, vivos_antes = self.hoy, self._vivos_por_familia()
+                delta = self._paso(self.anios_por_tick, lista)
+                hasta = self.hoy
+                if k == pasos - 1:
+                    vivos_despues = self._vivos_por_familia()
+            anios += delta["anios"]
+            for fam, *_ in delta["nacimientos"]:
+                nacimientos[fam] = nacimientos.get(fam, 0) + 1
+            for fam, _ in delta["muertes"]:
+                fallecimientos[fam] = fallecimientos.get(fam, 0) + 1
+            for fam, *_ in delta["uniones"]:
+                uniones[fam] = uniones.get(fam, 0) + 1
+
+        segundos = time.perf_counter() - t0
+        resumen: Dict[str, Any] = {
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "anios": anios,
+            "nacimientos": sum(nacimientos.values()),
+            "fallecimientos": sum(fallecimientos.values()),
+            "uniones": sum(uniones.values()),
+            "familias": {
+                fam: {
+                    "vivos_antes": vivos_antes.get(fam, 0),
+                    "vivos_despues": vivos_despues.get(fam, 0),
+                    "nacimientos": nacimientos.get(fam, 0),
+                    "fallecimientos": fallecimientos.get(fam, 0),
+                    "uniones": uniones.get(fam, 0),
+                }
+                for fam in db.listar_familias()
+            },
+            "segundos": round(segundos, 4),
+        }
+        if lista is not None:
+            resumen["eventos"] = lista
+        return resumen
+
+    def _vivos_por_familia(self) -> Dict[str, int]:
+        """Vivos por familia contados sobre los dicts de db (primera aparición de cada clave,
+        como poblacion.py). No usa _poblacion: armarla acá, con otra fecha que la de _paso,
+        dejaría edades que el diario no repite al restaurar."""
+        vivos: Dict[str, int] = {}
         for fam in db.listar_familias():
-            matriz = db.obtener_matriz(fam) or []
-            for p in _vivas(_personas_en_familia(fam)):
-                edad = _edad_simulada(p, self.hoy)
-                if self.rng.random() < _prob_muerte(edad):
-                    # Marcar fecha de defunción
-                    p["fecha_defuncion"] = self.hoy.isoformat()
-
-                    # Propagar defunción a los hijos
-                    for fila in matriz:
-                        for celda in fila:
-                            for hijo in celda:
-                                if hijo.get("madre_cedula") == p.get("cedula"):
-                                    hijo["madre_defuncion"] = True
-                                if hijo.get("padre_cedula") == p.get("cedula"):
-                                    hijo["padre_defuncion"] = True
-
+            vistas: Dict[str, bool] = {}
+            for p in _personas_en_familia(fam):
+                vistas.setdefault(db.clave_persona(p), not p.get("fecha_defuncion"))
+            vivos[fam] = sum(vistas.values())
+        return vivos
+
+    def _paso(self, anios: int, eventos: Optional[List[Cambio]]) -> Dict[str, Any]:
+        """Fases de un tick (cumpleaños, muertes + colaterales, nacimientos, uniones) bajo db.cerrojo.
+        Agrega los eventos a 'eventos' si no es None y devuelve el delta registrado."""
+        with db.cerrojo:
+            # Avanza el "hoy" simulado
+            self.hoy = _add_years_safe(self.hoy, anios)
+            hoy_iso = self.hoy.isoformat()
+            delta = _delta_vacio(hoy_iso, anios)
+
+            # ---------------------------------------------------
+            # 1) Cumpleaños, fallecimientos + colaterales y sorteo de nacimientos y uniones.
+            #    Las familias no interactúan: cada una corre por separado (en paralelo
+            #    si hay pool) con su propio flujo aleatorio.
+            # ---------------------------------------------------
+            familias = db.listar_familias()
+            if self._pool and len(familias) > 1:
+                resultados = list(self._pool.map(self._fases_familia, familias, [anios] * len(familias)))
+            else:
+                resultados = [self._fases_familia(fam, anios) for fam in familias]
+
+            # ---------------------------------------------------
+            # 2) Unión de resultados en el orden de las familias (determinista)
+            # ---------------------------------------------------
+            for fam, r in zip(familias, resultados):
+                pob = r["poblacion"]
+                delta["muertes"].extend([fam, pob.claves[i]] for i in r["muertos"])
+                delta["colaterales"].extend(r["colaterales"])
+                if eventos is None:
+                    continue
+                if r["cumple"]:
+                    eventos.append(r["cumple"])
+                for i in r["muertos"]:
+                    p = pob.dicts[i][0]
                     eventos.append({
                         "tipo": "fallecimiento",
                         "familia": fam,
                         "cedula": p.get("cedula", ""),
                         "nombre": _nombre_completo(p),
-                        "fecha": self.hoy.isoformat(),
+                        "fecha": hoy_iso,
                     })
 
-            # Después de procesar muertes en esta familia → aplicar efectos colaterales
-            efecto.procesar_colaterales(matriz)
+            # ---------------------------------------------------
+            # 3) Nacimientos: se materializan en serie, porque las cédulas
+            #    salen de los contadores globales de db
+            # ---------------------------------------------------
+            for fam, r in zip(familias, resultados):
+                for col_idx, padre, madre, genero, nombre, afinidades in r["nacimientos"]:
+                    bebe = self._crear_bebe_dict_local(hoy_iso, padre, madre, genero, nombre, afinidades)
 
+                    # Insertar en fila 3, misma columna (y registrarlo en los padres)
+                    _nacer(r["poblacion"], 3, col_idx, bebe)
+                    delta["nacimientos"].append([fam, 3, col_idx, dict(bebe)])
 
-        # ---------------------------------------------------
-        # 3) Nacimientos automáticos (solo parejas existentes en fila 2)
-        #     - Usa probabilidad self.prob_nacimiento_por_pareja_por_tick
-        #     - Máximo 2 nacimientos extra por pareja (por tick)
-        # ---------------------------------------------------
-        eventos.extend(self._auto_nacimientos_tick(max_bebes_por_pareja=2))
+                    # Evento para UI
+                    if eventos is not None:
+                        eventos.append({
+                            "tipo": "nacimiento",
+                            "familia": fam,
+                            "columna": col_idx,
+                            "fila": 3,
+                            "nombre": bebe["nombre_completo"],
+                            "cedula": bebe["cedula"],
+                            "fecha": hoy_iso,
+                            "padres": [
+                                _nombre_completo(padre),
+                                _nombre_completo(madre),
+                            ],
+                        })
+
+            # ---------------------------------------------------
+            # 4) Uniones: cada pareja a una columna nueva de la fila 2 (después de
+            #    los nacimientos, así que sus hijos llegan desde el tick siguiente)
+            # ---------------------------------------------------
+            for fam, r in zip(familias, resultados):
+                for clave_a, clave_b, score, comunes in r["uniones"]:
+                    col = _columna_nueva(fam)
+                    _unir(r["poblacion"], col, clave_a, clave_b, self.hoy.year)
+                    delta["uniones"].append([fam, col, clave_a, clave_b])
+
+                    if eventos is not None:
+                        pa, pb = (db.buscar_por_cedula(fam, c) for c in (clave_a, clave_b))
+                        eventos.append({
+                            "tipo": "union",
+                            "familia": fam,
+                            "columna": col,
+                            "fila": 2,
+                            "nombres": [_nombre_completo(pa), _nombre_completo(pb)],
+                            "cedulas": [clave_a, clave_b],
+                            "afinidad": score,
+                            "fecha": hoy_iso,
+                        })
+
+            # ---------------------------------------------------
+            # Delta del tick → persistencia (dentro del cerrojo: ningún snapshot
+            # puede quedar "entre" el estado nuevo y su registro en el diario)
+            # ---------------------------------------------------
+            if self.on_delta:
+                try:
+                    self.on_delta(delta)
+                except Exception:
+                    log.exception("No se pudo registrar el delta del tick")
+
+        return delta
+
+    def _flujo(self, familia: str, fase: int) -> azar.Flujo:
+        """Sorteos de esta familia en el tick actual (el tick es el día simulado)."""
+        return azar.Flujo(self.semilla, familia, self.hoy.toordinal(), fase)
+
+    def _fases_familia(self, familia: str, anios: int) -> Dict[str, Any]:
+        """
+        Trabajo de un tick que solo toca a 'familia' (seguro de correr en paralelo con otras):
+        cumpleaños, fallecimientos, efectos colaterales y sorteo de nacimientos y uniones.
+        No crea bebés (eso usa contadores globales) ni toca la matriz para las uniones:
+        devuelve qué parejas tienen hijos y qué parejas se forman.
+        """
+        hoy_iso = self.hoy.isoformat()
+        pob = _poblacion(familia, self.hoy)
 
-        # ---------------------------------------------------
-        # Notificación a la UI
-        # ---------------------------------------------------
-        if self.on_change:
-            try:
-                self.on_change(eventos)
-            except Exception:
-                pass
+        cumple = _cumple_familia(familia, self.hoy, anios)
 
-        return eventos
+        muertos = pob.sortear_muertes(self._flujo(familia, azar.MUERTE), anios)
+        for i in muertos:
+            _fallecer(pob, i, hoy_iso)
+
+        # Después de procesar muertes en esta familia → aplicar efectos colaterales
+        matriz = db.obtener_matriz(familia) or []
+        antes = _foto_colaterales(matriz)
+        efecto.procesar_colaterales(matriz)
+        colaterales = _diff_colaterales(familia, matriz, antes)
+
+        # Nacimientos automáticos (solo parejas existentes en fila 2)
+        #   - Usa probabilidad self.prob_nacimiento_por_pareja_por_tick
+        #   - Máximo 2 nacimientos extra por pareja (por tick)
+        nacimientos = self._sortear_nacimientos(familia, anios, max_bebes_por_pareja=2)
+
+        uniones = self._sortear_uniones(familia)
+
+        return {"poblacion": pob, "cumple": cumple, "muertos": muertos,
+                "colaterales": colaterales, "nacimientos": nacimientos, "uniones": uniones}
 
     # ===========================================================
     # Nacimientos automáticos (helpers)
@@ -304,10 +671,9 @@ class GestorEventos:
             })
         return out
 
-    def _crear_bebe_dict_local(self, hoy_iso: str, padre: dict, madre: dict) -> dict:
+    def _crear_bebe_dict_local(self, hoy_iso: str, padre: dict, madre: dict,
+                               genero: str, nombre: str, afinidades: List[str]) -> dict:
         """Crea el bebé con banderas que tu renderer espera (nivel, tipo, mostrar_en_arbol)."""
-        genero = "Femenino" if self.rng.random() < 0.5 else "Masculino"
-        nombre = self.rng.choice(self.nombres_f if genero == "Femenino" else self.nombres_m)
         ap1 = (padre.get("apellidos") or "").split()[0] if padre else ""
         ap2 = (madre.get("apellidos") or "").split()[0] if madre else ""
         apellidos = f"{ap1} {ap2}".strip()
@@ -328,66 +694,93 @@ class GestorEventos:
             "genero": genero,
             "residencia": provincia,
             "estado_civil": "Soltero",
-            "afinidades": [],
+            "afinidades": afinidades,
             "padre_cedula": padre.get("cedula",""),
             "madre_cedula": madre.get("cedula",""),
             "edad": 0,
         }
 
-    def _auto_nacimientos_tick(self, max_bebes_por_pareja: int = 2) -> List[Cambio]:
+    def _sortear_nacimientos(self, familia: str, anios: int = 1,
+                             max_bebes_por_pareja: int = 2) -> List[tuple]:
         """
-        Crea bebés en (3, col) únicamente para parejas existentes en (2, col),
+        Decide los bebés de la familia en (3, col), únicamente para parejas existentes en (2, col),
         con probabilidad self.prob_nacimiento_por_pareja_por_tick y
         máximo `max_bebes_por_pareja` por pareja en este tick.
+        Con anios > 1 (tick en lote) la probabilidad se compone: 1 - (1 - p)^anios.
+        Devuelve [(col, padre, madre, genero, nombre, afinidades)]; _paso los crea e inserta.
+        Los sorteos se toman por pareja (hash de ambas claves) e intento.
         """
-        eventos: List[Cambio] = []
-        hoy_iso = self.hoy.isoformat()
+        prob = 1 - (1 - self.prob_nacimiento_por_pareja_por_tick) ** anios
+        out: List[tuple] = []
+        f_nace = self._flujo(familia, azar.NACIMIENTO)
+        f_genero = self._flujo(familia, azar.GENERO)
+        f_nombre = self._flujo(familia, azar.NOMBRE)
+        f_afinidad = self._flujo(familia, azar.AFINIDAD)
+
+        parejas = self._parejas_validas_en_fila2(familia)
+
+        # Jarvis, si quiere solo una pareja random por familia, descomenta esta línea:
+        # parejas = [f_nace.elegir(parejas, 0)]
+
+        for pareja in parejas:
+            claves = sorted(db.clave_persona(pareja[k]) for k in ("padre", "madre"))
+            h = azar.hash64("|".join(claves))
+            bebes_creados = 0
+            intentos = 0
+            max_intentos = max(1, max_bebes_por_pareja * 3)  # evita bucles si prob es baja
+
+            while bebes_creados < max_bebes_por_pareja and intentos < max_intentos:
+                intentos += 1
+                if f_nace.uniforme(h, intentos) >= prob:
+                    continue  # este intento no nace
+
+                genero = "Femenino" if f_genero.uniforme(h, bebes_creados) < 0.5 else "Masculino"
+                nombre = f_nombre.elegir(self.nombres_f if genero == "Femenino" else self.nombres_m, h, bebes_creados)
+                afinidades = self._afinidades_bebe(f_afinidad, h, bebes_creados, pareja["padre"], pareja["madre"])
+                out.append((pareja["col_idx"], pareja["padre"], pareja["madre"], genero, nombre, afinidades))
+                bebes_creados += 1
 
-        for fam in db.listar_familias():
-            parejas = self._parejas_validas_en_fila2(fam)
-            if not parejas:
-                continue
-
-            # Jarvis, si quiere solo una pareja random por familia, descomenta esta línea:
-            # parejas = [self.rng.choice(parejas)]
-
-            for pareja in parejas:
-                col_idx = pareja["col_idx"]
-                padre = pareja["padre"]
-                madre = pareja["madre"]
-
-                bebes_creados = 0
-                intentos = 0
-                max_intentos = max(1, max_bebes_por_pareja * 3)  # evita bucles si prob es baja
-
-                while bebes_creados < max_bebes_por_pareja and intentos < max_intentos:
-                    intentos += 1
-                    if self.rng.random() >= self.prob_nacimiento_por_pareja_por_tick:
-                        continue  # este intento no nace
-
-                    bebe = self._crear_bebe_dict_local(hoy_iso, padre, madre)
-
-                    # Insertar en fila 3, misma columna
-                    db.agregar_persona(bebe, fam, 3, col_idx)
+        return out
 
-                    # Registrar en padres
-                    padre.setdefault("hijos", []).append(bebe["cedula"])
-                    madre.setdefault("hijos", []).append(bebe["cedula"])
+    def _afinidades_bebe(self, flujo: azar.Flujo, pareja: int, bebe: int,
+                         padre: dict, madre: dict, cuantas: int = 3) -> List[str]:
+        """'cuantas' afinidades distintas: cada una, con probabilidad 1/2 heredada de
+        alguno de los padres y si no de self.afinidades (sorteos por pareja y bebé)."""
+        heredables = list(dict.fromkeys((padre.get("afinidades") or []) + (madre.get("afinidades") or [])))
+        out: List[str] = []
+        for intento in range(4 * cuantas):  # tope por si se repiten
+            if len(out) >= cuantas:
+                break
+            clave = bebe * 64 + intento
+            opciones = heredables if heredables and flujo.uniforme(pareja, clave) < 0.5 else self.afinidades
+            a = flujo.elegir(opciones, pareja, clave + 32)
+            if a not in out:
+                out.append(a)
+        return out
 
-                    # Evento para UI
-                    eventos.append({
-                        "tipo": "nacimiento",
-                        "familia": fam,
-                        "columna": col_idx,
-                        "fila": 3,
-                        "nombre": bebe["nombre_completo"],
-                        "cedula": bebe["cedula"],
-                        "fecha": hoy_iso,
-                        "padres": [
-                            _nombre_completo(padre),
-                            _nombre_completo(madre),
-                        ],
-                    })
-                    bebes_creados += 1
+    # ===========================================================
+    # Uniones automáticas (helpers)
+    # ===========================================================
 
-        return eventos
+    def _sortear_uniones(self, familia: str) -> List[tuple]:
+        """
+        Parejas que se forman este tick en la familia, como mucho
+        self.max_uniones_por_familia_por_tick. Mismas reglas que /love (edad, disponibilidad,
+        afinidad, genética; ver services/compatibilidad.py) con la edad simulada y géneros
+        opuestos. Cada soltero elegible busca pareja con probabilidad prob_union/100
+        (la viudez la baja); los que buscan van en orden aleatorio y cada uno se queda con
+        su mejor compatible libre, buscado solo en la ventana de edad del otro género.
+        Devuelve [(clave_a, clave_b, score, comunes)]; _paso las ubica en la matriz.
+        """
+        if self.max_uniones_por_familia_por_tick <= 0:
+            return []
+        pob = _poblacion(familia, self.hoy)
+        adultos = np.flatnonzero(pob.viva[:pob.n] & (pob.edad[:pob.n] >= compatibilidad.EDAD_MINIMA))
+        m = compatibilidad.MatrizCompatibilidad(
+            familia, ((pob.dicts[i][0], int(pob.edad[i])) for i in adultos.tolist()))
+        if not m.claves:
+            return []
+        sorteo = self._flujo(familia, azar.UNION).uniformes(azar.hashes64(m.claves))
+        quiere = np.array([p.get("prob_union", 100) for p in m.personas], dtype=np.float64) / 100
+        buscan = [m.claves[i] for i in np.argsort(sorteo, kind="stable") if sorteo[i] < quiere[i]]
+        return m.emparejar(buscan, self.max_uniones_por_familia_por_tick)
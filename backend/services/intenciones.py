@@ -0,0 +1,127 @@
+# services/intenciones.py
+# Enrutador de las preguntas del /chat.
+#
+# Cada intención es (nombre, palabras, extractor):
+#   - palabras: grupos que tienen que aparecer todos en el texto normalizado, y de
+#     cada grupo alcanza con una alternativa (como los "in" del if/elif de antes);
+#   - extractor: saca los argumentos (nombres de personas) del texto.
+# Todas las palabras de la tabla se buscan en una sola pasada con una regex
+# combinada; va dentro de un lookahead para encontrar también las que se solapan,
+# así que da lo mismo que "palabra in texto". Gana la primera intención de la tabla
+# que tenga todas sus palabras. Todo se compila al importar: una intención nueva
+# agrega palabras a la regex, no otra comparación por consulta.
+#
+#   intenciones.clasificar(intenciones.normalizar("¿Primos de Ana?"))
+#   -> ("primos", {"nombre": "ana"})
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+Argumentos = Dict[str, str]
+Extractor = Callable[[str], Argumentos]
+
+_NO_ALFANUM = re.compile(r"[^a-z0-9\s]")
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes ni signos (solo letras a-z, dígitos y espacios)."""
+    texto = texto.lower()
+    if not texto.isascii():  # en ASCII la descomposición NFD no cambia nada
+        texto = unicodedata.normalize("NFD", texto)
+        texto = "".join(ch for ch in texto if unicodedata.category(ch) != "Mn")
+    return _NO_ALFANUM.sub("", texto).strip()
+
+
+# ---------------- Extractores ----------------
+_STOP_NOMBRE = {"de", "la", "el", "los", "las", "y", "del", "al", "persona", "personas"}
+_RUIDO_FINAL = {"estan", "esta", "vivos", "actualmente", "ahora", "hoy"}
+
+_RE_PRIMOS = re.compile(r"primos(?:\s+de)?\s+(?P<nombre>.+)$")
+_RE_ANTEPASADOS = re.compile(r"\bantepasados\s+maternos(?:\s+de)?\s+(?P<nombre>.+)$")
+_RE_DESCENDIENTES_VIVOS = re.compile(r"descendientes(?:\s+de)?\s+(?P<nombre>.+?)\s+(?:estan\s+)?vivos\b")
+_RE_DESCENDIENTES = re.compile(r"descendientes(?:\s+de)?\s+(?P<nombre>.+)$")
+
+def _sin_argumentos(texto: str) -> Argumentos:
+    return {}
+
+def _pareja(texto: str) -> Argumentos:
+    """'relacion entre A y B' -> {"a", "b"}; vacío si no hay exactamente dos nombres."""
+    partes = texto.split("entre", 1)[1].strip().split(" y ")
+    if len(partes) != 2:
+        return {}
+    return {"a": partes[0].replace("persona", "").strip(),
+            "b": partes[1].replace("persona", "").strip()}
+
+def _nombre_primos(texto: str) -> Argumentos:
+    m = _RE_PRIMOS.search(texto.replace("de primer grado", "").replace("primer grado", ""))
+    if m:
+        return {"nombre": m.group("nombre").strip().strip("?!.:,;").strip()}
+    return {"nombre": texto.split()[-1].strip("?!.:,;")}
+
+def _nombre_antepasados(texto: str) -> Argumentos:
+    m = _RE_ANTEPASADOS.search(texto)
+    raw = m.group("nombre") if m else (texto.split()[-1] if texto.split() else "")
+    tokens = [t for t in raw.split() if t not in _STOP_NOMBRE and not t.isdigit()]
+    return {"nombre": " ".join(tokens).strip().title()}
+
+def _nombre_descendientes(texto: str) -> Argumentos:
+    # Soporta: "descendientes de X vivos", "cuales descendientes de X estan vivos actualmente", etc.
+    m = _RE_DESCENDIENTES_VIVOS.search(texto)
+    if m:
+        nombre = m.group("nombre").strip()
+    else:
+        # Fallback: toma lo que sigue a "descendientes de" y limpia ruido al final
+        m = _RE_DESCENDIENTES.search(texto)
+        nombre = (m.group("nombre") if m else texto).strip()
+    # Quitar tokens de cierre *iterativamente* (no solo uno)
+    toks = [t for t in nombre.split() if t]
+    while toks and toks[-1] in _RUIDO_FINAL:
+        toks.pop()
+    return {"nombre": " ".join(toks)}
+
+
+# ---------------- Tabla (en orden de prioridad) ----------------
+def _alguna(*palabras: str) -> Tuple[Tuple[str, ...], ...]:
+    return (palabras,)
+
+def _todas(*palabras: str) -> Tuple[Tuple[str, ...], ...]:
+    return tuple((p,) for p in palabras)
+
+INTENCIONES: List[Tuple[str, Tuple[Tuple[str, ...], ...], Extractor]] = [
+    ("saludo", _alguna("hola", "buenas", "hey"), _sin_argumentos),
+    ("despedida", _alguna("adios", "chao", "bye"), _sin_argumentos),
+    ("relacion", _todas("relacion", "entre"), _pareja),                       # P1
+    ("primos", _todas("primos"), _nombre_primos),                            # P2
+    ("antepasados_maternos", _todas("antepasados", "maternos"), _nombre_antepasados),  # P3
+    ("descendientes_vivos", _todas("descendientes", "vivos"), _nombre_descendientes),  # P4
+    ("nacidos_10_anios", _alguna("ultimos 10 anos"), _sin_argumentos),      # P5
+    ("parejas_con_hijos", _todas("parejas", "hijos"), _sin_argumentos),      # P6
+    ("fallecidos_menores_50", _todas("fallecieron", "50"), _sin_argumentos),  # P7
+]
+
+def _compilar():
+    palabras = sorted({p for _, grupos, _ in INTENCIONES for g in grupos for p in g}, key=len, reverse=True)
+    buscador = re.compile("(?=(" + "|".join(map(re.escape, palabras)) + "))")
+    # En cada posición la regex se queda con la palabra más larga; las más cortas que
+    # empiezan igual (prefijos) también están en el texto
+    prefijos = {p: frozenset(q for q in palabras if p.startswith(q)) for p in palabras}
+    # Cada grupo como conjunto: se cumple si comparte alguna palabra con las encontradas
+    tabla = [(nombre, [frozenset(g) for g in grupos], extractor) for nombre, grupos, extractor in INTENCIONES]
+    return buscador, prefijos, tabla
+
+_BUSCADOR, _PREFIJOS, _TABLA = _compilar()
+
+def palabras_en(texto: str) -> FrozenSet[str]:
+    """Palabras clave de la tabla que aparecen en el texto (una sola pasada)."""
+    return frozenset().union(*(_PREFIJOS[m.group(1)] for m in _BUSCADOR.finditer(texto)))
+
+def clasificar(texto: str) -> Optional[Tuple[str, Argumentos]]:
+    """(intención, argumentos) para un texto ya normalizado, o None si ninguna aplica."""
+    vistas = palabras_en(texto)
+    if not vistas:
+        return None
+    for nombre, grupos, extractor in _TABLA:
+        if all(not g.isdisjoint(vistas) for g in grupos):
+            return nombre, extractor(texto)
+    return None
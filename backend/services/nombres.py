@@ -0,0 +1,278 @@
+# services/nombres.py
+# Resolución de nombres escritos por el usuario (chat, búsqueda de /love) a cédulas.
+#
+# db solo encuentra nombres completos exactos (tras quitar tildes y mayúsculas), así
+# que "descendientes de luis espinoza" no encuentra a "Luis Espinoza Sanchez". Acá se
+# arma, por familia y versión de db, un índice de los nombres distintos:
+#   - invertido por palabra: palabra -> nombres que la tienen;
+#   - vocabulario ordenado: palabras que empiezan con lo escrito (bisect);
+#   - trigramas de cada palabra: candidatas con errores de tipeo, que después se
+#     confirman con distancia de edición acotada.
+# db solo agrega nombres a su índice (salvo al reindexar), así que cuando la versión
+# cambia se indexan solo los nombres nuevos; si db rehízo su índice, se rehace este.
+# Cada palabra de la consulta tiene que coincidir con alguna del nombre (exacta >
+# prefijo > con un error > con dos > en el medio; lo parecido solo se busca si no
+# hubo nada exacto ni prefijo) y los nombres se ordenan por puntaje total; a
+# igual puntaje, primero el que tiene menos palabras de más.
+#
+#   nombres.para(fam).buscar("luis espinosa")
+#   -> [{"nombre_completo": "Luis Espinoza Sanchez", "cedulas": [...], "puntaje": 4.0}]
+#   items, cursor = nombres.para(fam).pagina("ro", 25, cursor)   # typeahead paginado
+#
+# Para una sola palabra (lo que se va tipeando) las listas de cada palabra ya están
+# en el orden del ranking, así que la primera página sale mezclándolas sin juntar
+# todos los candidatos: el costo depende de la página, no del tamaño de la familia.
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from . import db
+
+EXACTA = 3.0
+PREFIJO = 2.0
+PARECIDA = (1.0, 0.5)  # a distancia de edición 1 y 2
+ADENTRO = 0.25         # en el medio de la palabra ("cord" en "cordero"), si nada más sirvió
+
+_PALABRA = re.compile(r"[a-z0-9]+")
+
+def _norm(s: str) -> str:
+    s = (s or "").strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+
+def palabras(texto: str) -> List[str]:
+    return _PALABRA.findall(_norm(texto))
+
+def _trigramas(palabra: str) -> Set[str]:
+    p = f"  {palabra} "
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+def _tolerancia(palabra: str) -> int:
+    # Palabras cortas: un error ya las vuelve otra cosa
+    if len(palabra) < 4:
+        return 0
+    return 1 if len(palabra) < 7 else 2
+
+def _distancia(a: str, b: str, tope: int) -> int:
+    """Levenshtein entre a y b, o tope + 1 si se pasa de 'tope'."""
+    if abs(len(a) - len(b)) > tope:
+        return tope + 1
+    previa = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + (ca != cb)))
+        if min(actual) > tope:
+            return tope + 1
+        previa = actual
+    return previa[-1]
+
+def _desde(lista: list, k: int) -> Iterator:
+    """lista[k:] sin copiarla."""
+    for j in range(k, len(lista)):
+        yield lista[j]
+
+def _id_cursor(cursor: Any) -> Optional[int]:
+    """Id de nombre de un cursor de pagina() (str o int del JSON), o None si no es uno."""
+    if isinstance(cursor, bool):
+        return None
+    if isinstance(cursor, int):
+        return cursor if cursor >= 0 else None
+    if isinstance(cursor, str) and cursor.isascii() and cursor.isdigit():
+        return int(cursor)
+    return None
+
+def _full(p: dict) -> str:
+    return p.get("nombre_completo") or f"{p.get('nombre') or ''} {p.get('apellidos') or ''}".strip()
+
+
+class IndiceNombres:
+    """Nombres distintos de una familia, buscables por palabras, prefijos y typos."""
+
+    def __init__(self, familia: str):
+        self.familia = familia
+        self.fuente = db.nombres_indexados(familia)   # nombre normalizado -> claves (de db)
+        self.leidos = 0                               # entradas de 'fuente' ya indexadas
+        self.nombres: List[str] = []                  # para mostrar, en orden de alta
+        self.claves: List[List[str]] = []             # las listas de db (crecen solas)
+        self.palabras: List[Set[str]] = []            # palabras de cada nombre
+        self.por_palabra: Dict[str, List[Tuple[int, int]]] = {}  # palabra -> [(largo, id)] ordenada
+        self.vocabulario: List[str] = []              # palabras, ordenadas
+        self.por_trigrama: Dict[str, List[str]] = {}
+        self.al_dia()
+
+    def al_dia(self) -> None:
+        """Indexa los nombres que db agregó desde la última vez."""
+        self.version = db.version(self.familia)
+        nuevas = []
+        for norma, claves in islice(self.fuente.items(), self.leidos, None):
+            i = len(self.nombres)
+            p = db.buscar_por_cedula(self.familia, claves[0]) if claves else None
+            self.nombres.append(_full(p) if p else norma)
+            self.claves.append(claves)
+            toks = set(_PALABRA.findall(norma))
+            self.palabras.append(toks)
+            for t in toks:
+                if t not in self.por_palabra:
+                    self.por_palabra[t] = []
+                    nuevas.append(t)
+                # el id es el mayor hasta ahora: queda al final de los de su largo
+                insort(self.por_palabra[t], (len(toks), i))
+        self.leidos = len(self.fuente)
+        if len(nuevas) > 64:
+            self.vocabulario = sorted(self.por_palabra)
+        else:
+            for t in nuevas:
+                insort(self.vocabulario, t)
+        for t in nuevas:
+            for g in _trigramas(t):
+                self.por_trigrama.setdefault(g, []).append(t)
+
+    def _coincidencias(self, q: str) -> Dict[str, float]:
+        """Palabras del vocabulario que sirven para la palabra 'q' de la consulta, con puntaje."""
+        out: Dict[str, float] = {}
+        if q in self.por_palabra:
+            out[q] = EXACTA
+        if len(q) >= 2:
+            i = bisect_left(self.vocabulario, q)
+            while i < len(self.vocabulario) and self.vocabulario[i].startswith(q):
+                out.setdefault(self.vocabulario[i], PREFIJO)
+                i += 1
+        tope = _tolerancia(q)
+        if tope and not out:
+            # Cada edición rompe como mucho 3 trigramas
+            tris = _trigramas(q)
+            minimo = max(1, len(tris) - 3 * tope)
+            comunes: Dict[str, int] = {}
+            for g in tris:
+                for t in self.por_trigrama.get(g, ()):
+                    comunes[t] = comunes.get(t, 0) + 1
+            for t, n in comunes.items():
+                if n >= minimo and t not in out:
+                    d = _distancia(q, t, tope)
+                    if d <= tope:
+                        out[t] = PARECIDA[d - 1]
+        if not out and len(q) >= 3:
+            out = {t: ADENTRO for t in self.vocabulario if q in t}
+        return out
+
+    def _clave(self, i: int, puntaje: float) -> Tuple[float, int, int]:
+        # Más puntaje primero; a igual puntaje, menos palabras de más; después, orden de alta
+        return (-puntaje, len(self.palabras[i]), i)
+
+    def _una_palabra(self, c: Dict[str, float], desde: Optional[Tuple[float, int, int]]) -> Iterator[Tuple[int, float]]:
+        """Ranking para una sola palabra sin juntar candidatos: por cada puntaje, mezcla
+        las listas (largo, id) de sus palabras, que ya están en el orden del ranking."""
+        por_puntaje: Dict[float, List[str]] = {}
+        for t, s in c.items():
+            por_puntaje.setdefault(s, []).append(t)
+        for s in sorted(por_puntaje, reverse=True):
+            if desde is not None and s > -desde[0]:
+                continue   # puntaje ya entregado en páginas anteriores
+            inicio = desde[1:] if desde is not None and s == -desde[0] else (0, -1)
+            listas = [_desde(self.por_palabra[t], bisect_right(self.por_palabra[t], inicio))
+                      for t in por_puntaje[s]]
+            previo = None
+            for largo, i in heapq.merge(*listas):
+                if i == previo:
+                    continue   # el nombre tiene dos palabras que coinciden
+                previo = i
+                if max(c.get(t, 0.0) for t in self.palabras[i]) == s:  # si no, salió con un puntaje mayor
+                    yield i, s
+
+    def _ranking(self, texto: str, desde: Optional[Tuple[float, int, int]]) -> Iterator[Tuple[int, float]]:
+        """(id, puntaje) de los nombres que coinciden con 'texto', en orden, después de 'desde'."""
+        consulta = list(dict.fromkeys(palabras(texto)))
+        if not consulta:
+            # Sin texto: todos, en orden de alta
+            inicio = desde[2] + 1 if desde is not None else 0
+            return ((i, 0.0) for i in range(inicio, len(self.nombres)))
+        coincidencias = [self._coincidencias(q) for q in consulta]
+        if len(coincidencias) == 1:
+            return self._una_palabra(coincidencias[0], desde)
+        # La palabra más selectiva arma los candidatos; las demás solo los filtran
+        coincidencias.sort(key=lambda c: sum(len(self.por_palabra[t]) for t in c))
+        puntajes: Dict[int, float] = {}
+        for t, s in coincidencias[0].items():
+            for _, i in self.por_palabra[t]:
+                if s > puntajes.get(i, 0.0):
+                    puntajes[i] = s
+        for c in coincidencias[1:]:
+            siguen: Dict[int, float] = {}
+            for i, s in puntajes.items():
+                mejor = max((c.get(t, 0.0) for t in self.palabras[i]), default=0.0)
+                if mejor:
+                    siguen[i] = s + mejor
+            puntajes = siguen
+        claves = ((self._clave(i, s), i, s) for i, s in puntajes.items())
+        return ((i, s) for clave, i, s in sorted(claves) if desde is None or clave > desde)
+
+    def pagina(self, texto: str, limite: int = 25,
+               cursor: Union[int, str, None] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Una página de candidatos para 'texto' y el cursor de la siguiente (None si no hay
+        más). El cursor es el id del último nombre entregado: la página siguiente empieza
+        justo después de él en el ranking, aunque mientras tanto se agreguen personas.
+        Un cursor que no se entiende (otro tipo, otro texto, fuera de rango) es la primera página."""
+        desde = None
+        i = _id_cursor(cursor)
+        if i is not None and i < len(self.nombres):
+            desde = self._clave(i, self._puntaje(texto, i))
+        ids = list(islice(self._ranking(texto, desde), limite + 1))
+        items = [{"nombre_completo": self.nombres[i], "cedulas": list(self.claves[i]), "puntaje": s}
+                 for i, s in ids[:limite]]
+        return items, (str(ids[limite - 1][0]) if len(ids) > limite else None)
+
+    def _puntaje(self, texto: str, i: int) -> float:
+        total = 0.0
+        for q in dict.fromkeys(palabras(texto)):
+            c = self._coincidencias(q)
+            total += max((c.get(t, 0.0) for t in self.palabras[i]), default=0.0)
+        return total
+
+    def buscar(self, texto: str, limite: Optional[int] = 10) -> List[Dict[str, Any]]:
+        """Candidatos para 'texto', del más parecido al menos; [] si alguna palabra no
+        coincide con nada (o si no hay texto)."""
+        if not palabras(texto):
+            return []
+        return [{"nombre_completo": self.nombres[i], "cedulas": list(self.claves[i]), "puntaje": s}
+                for i, s in islice(self._ranking(texto, None), limite)]
+
+    def mejores(self, texto: str) -> List[Dict[str, Any]]:
+        """Candidatos empatados en el mejor puntaje para 'texto' (uno solo si no hay dudas;
+        [] si no hay ninguno)."""
+        if not palabras(texto):
+            return []
+        out: List[Dict[str, Any]] = []
+        for i, s in self._ranking(texto, None):
+            if out and s != out[0]["puntaje"]:
+                break
+            out.append({"nombre_completo": self.nombres[i], "cedulas": list(self.claves[i]), "puntaje": s})
+        return out
+
+    def claves_de(self, texto: str) -> List[str]:
+        """Cédulas del mejor candidato para 'texto' ([] si no hay ninguno o si hay varios empatados)."""
+        mejores = self.mejores(texto)
+        return mejores[0]["cedulas"] if len(mejores) == 1 else []
+
+
+# -----------------------------
+# Caché por familia/versión
+# -----------------------------
+_cache: Dict[str, IndiceNombres] = {}
+_lock = threading.Lock()  # varios lectores de db pueden ponerlo al día a la vez
+
+def para(familia: str) -> IndiceNombres:
+    """Índice de la familia, al día con db.version(familia)."""
+    with _lock:
+        ix = _cache.get(familia)
+        if ix is None or ix.fuente is not db.nombres_indexados(familia):
+            ix = _cache[familia] = IndiceNombres(familia)
+        elif ix.version != db.version(familia):
+            ix.al_dia()
+        return ix
@@ -0,0 +1,154 @@
+# services/parentesco.py
+# Motor de parentesco sobre el grafo de db (padres / hijos / cónyuges por cédula).
+# Calcula los ancestros comunes más cercanos (LCA) y la distancia generacional
+# de cada persona hasta ellos; con eso nombra cualquier grado de primos y
+# generaciones de diferencia. Los parentescos políticos salen de "saltar" por
+# el cónyuge de A, el de B o ambos.
+from collections import deque
+
+from . import db
+
+_ORDINALES = ["primer", "segundo", "tercer", "cuarto", "quinto",
+              "sexto", "séptimo", "octavo", "noveno", "décimo"]
+
+_ASCENDIENTES = ["padre/madre", "abuelo/a", "bisabuelo/a", "tatarabuelo/a"]
+_DESCENDIENTES = ["hijo/a", "nieto/a", "bisnieto/a", "tataranieto/a"]
+
+# -----------------------------
+# Ancestros y LCA
+# -----------------------------
+def ancestros(familia: str, clave: str) -> dict[str, int]:
+    """{clave_ancestro: distancia} por BFS hacia arriba (incluye a la persona con 0)."""
+    dist = {clave: 0}
+    q = deque([clave])
+    while q:
+        actual = q.popleft()
+        for p in db.padres_de(familia, actual):
+            if p not in dist:
+                dist[p] = dist[actual] + 1
+                q.append(p)
+    return dist
+
+def hermanos(familia: str, clave: str) -> set[str]:
+    """Otros hijos de cualquiera de sus padres (O(grado))."""
+    return {h for p in db.padres_de(familia, clave) for h in db.hijos_de(familia, p)} - {clave}
+
+def consanguinidad(familia: str, a: str, b: str) -> dict | None:
+    """
+    Relación de sangre entre a y b:
+      {"da": generaciones de a al LCA, "db": de b al LCA,
+       "lca": [claves de los ancestros comunes más cercanos]}
+    o None si no comparten ancestros.
+    """
+    anc_a = ancestros(familia, a)
+    anc_b = ancestros(familia, b)
+    comunes = anc_a.keys() & anc_b.keys()
+    if not comunes:
+        return None
+    mejor = min((anc_a[c] + anc_b[c], max(anc_a[c], anc_b[c])) for c in comunes)
+    lca = [c for c in comunes if (anc_a[c] + anc_b[c], max(anc_a[c], anc_b[c])) == mejor]
+    c0 = lca[0]
+    return {"da": anc_a[c0], "db": anc_b[c0], "lca": lca}
+
+# -----------------------------
+# Nombres de los parentescos
+# -----------------------------
+def _ordinal(n: int) -> str:
+    return _ORDINALES[n - 1] if 1 <= n <= len(_ORDINALES) else f"{n}.º"
+
+def _generacion(nombres: list[str], n: int, generico: str) -> str:
+    return nombres[n - 1] if 1 <= n <= len(nombres) else f"{generico} a {n} generaciones"
+
+def rol(da: int, db_: int, medio: bool = False) -> tuple[str, bool]:
+    """
+    Nombre del parentesco de A respecto de B a partir de las distancias al LCA.
+    Devuelve (texto, simetrico): si es simétrico se lee "A y B son <texto>",
+    si no "A es <texto> de B".
+    """
+    if da == 0:
+        return _generacion(_ASCENDIENTES, db_, "ancestro/a"), False
+    if db_ == 0:
+        return _generacion(_DESCENDIENTES, da, "descendiente"), False
+    if da == 1 and db_ == 1:
+        return ("medio hermanos" if medio else "hermanos"), True
+    if da == 1:
+        # tío/tía, tío/a abuelo/a, tío/a bisabuelo/a, ...
+        return ("tío/tía" if db_ == 2 else f"tío/a {_generacion(_ASCENDIENTES, db_ - 1, 'ancestro/a')}"), False
+    if db_ == 1:
+        return ("sobrino/a" if da == 2 else f"sobrino/a {_generacion(_DESCENDIENTES, da - 1, 'descendiente')}"), False
+
+    grado = min(da, db_) - 1
+    diferencia = abs(da - db_)
+    if diferencia == 0:
+        return f"primos de {_ordinal(grado)} grado", True
+    gen = "generación" if diferencia == 1 else "generaciones"
+    return f"primo/a de {_ordinal(grado)} grado, con {diferencia} {gen} de diferencia,", False
+
+def _rol_politico(texto: str, simetrico: bool, lado: str) -> tuple[str, bool]:
+    """
+    Traduce el rol de sangre hacia el cónyuge a su nombre político.
+    lado="b": el rol es de A respecto del cónyuge de B.
+    lado="a": el rol es del cónyuge de A respecto de B.
+    """
+    if texto == "hermanos":
+        return "cuñados", True
+    if lado == "b":
+        especiales = {"padre/madre": "suegro/a", "hijo/a": "hijastro/a"}
+    else:
+        especiales = {"hijo/a": "yerno/nuera", "padre/madre": "padrastro/madrastra"}
+    if texto in especiales:
+        return especiales[texto], False
+    return f"{texto} (político)", simetrico
+
+def _medios(familia: str, a: str, b: str) -> bool:
+    """Medio hermanos: los dos tienen padre y madre registrados y comparten solo uno.
+    Con un solo progenitor registrado no se sabe, se los llama hermanos."""
+    pa, pb = set(db.padres_de(familia, a)), set(db.padres_de(familia, b))
+    return len(pa) == len(pb) == 2 and len(pa & pb) == 1
+
+# -----------------------------
+# API
+# -----------------------------
+def relacion(familia: str, a: str, b: str) -> tuple[str, bool] | None:
+    """
+    Parentesco de A respecto de B (claves/cédulas) como (texto, simetrico), o None.
+    Orden de prioridad: pareja, sangre, político por un cónyuge, político por ambos.
+    """
+    if a == b:
+        return None
+    conyuges_a = db.conyuges_de(familia, a)
+    conyuges_b = db.conyuges_de(familia, b)
+    if b in conyuges_a:
+        return "pareja", True
+
+    sangre = consanguinidad(familia, a, b)
+    if sangre:
+        return rol(sangre["da"], sangre["db"], sangre["da"] == sangre["db"] == 1 and _medios(familia, a, b))
+
+    # A con el cónyuge de B, o el cónyuge de A con B
+    for lado, pares in (("b", [(a, cb) for cb in conyuges_b]),
+                        ("a", [(ca, b) for ca in conyuges_a])):
+        for x, y in pares:
+            if x == y:
+                continue
+            s = consanguinidad(familia, x, y)
+            if s:
+                return _rol_politico(*rol(s["da"], s["db"]), lado)
+
+    # Cónyuges de ambos
+    for ca in conyuges_a:
+        for cb in conyuges_b:
+            if ca == cb:
+                continue
+            s = consanguinidad(familia, ca, cb)
+            if s:
+                texto, _ = rol(s["da"], s["db"])
+                return ("concuñados" if texto == "hermanos" else "parientes políticos"), True
+
+    # Hermano/a del cónyuge de un hermano/a (se sigue llamando "cuñados")
+    for x, y in ((a, b), (b, a)):
+        for h in hermanos(familia, x):
+            for ch in db.conyuges_de(familia, h):
+                if y in hermanos(familia, ch):
+                    return "cuñados", True
+    return None
@@ -0,0 +1,324 @@
+# services/persistencia.py
+# Persistencia de db.familias: diario de escritura anticipada (JSON Lines) + snapshots.
+#
+#   <carpeta>/snapshot.json        -> estado completo hasta la operación 'seq'
+#   <carpeta>/diario.jsonl         -> una línea por mutación de db posterior al snapshot
+#   <carpeta>/diario.<seq>.jsonl   -> diario rotado (hasta 'seq') mientras se escribe un snapshot
+#
+# db llama a Almacen.registrar() ANTES de aplicar cada mutación, así que nada de lo
+# aplicado en memoria se pierde al reiniciar. Al arrancar se carga el snapshot y se
+# re-ejecutan las operaciones de los diarios. Cada `snapshot_cada` operaciones se escribe
+# un snapshot nuevo: el diario se rota a un archivo aparte, se escribe el snapshot y
+# recién entonces se borra el rotado. El arranque repite como mucho esa cantidad de
+# operaciones y el costo de escribir una mutación es agregar una línea.
+#
+# El simulador (gestor.py) no registra cada cambio de su tick: al final del tick manda
+# un único delta (fecha simulada, muertes, nacimientos, efectos colaterales) que se
+# guarda como operación "tick" y se re-ejecuta con gestor.aplicar_delta. Un hilo
+# compactador escribe los snapshots en segundo plano (cada `compactar_cada_seg` o
+# cuando el diario llega a `snapshot_cada` líneas), fuera del camino del tick.
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import db, gestor
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT = "snapshot.json"
+DIARIO = "diario.jsonl"
+_ROTADO = re.compile(r"^diario\.(\d+)(?:\.\d+)?\.jsonl$")
+
+# ===========================================================
+# Snapshot (conserva que un mismo dict persona esté en varias celdas)
+# ===========================================================
+
+def serializar_familias() -> Dict[str, Any]:
+    """Familias como {"personas": [...], "familias": {nombre: [[[ref, ...]]]}}."""
+    refs: Dict[int, int] = {}
+    personas: list = []
+
+    def ref(p: dict) -> int:
+        if id(p) not in refs:
+            refs[id(p)] = len(personas)
+            personas.append(p)
+        return refs[id(p)]
+
+    fams = {
+        nombre: [[[ref(p) for p in celda] for celda in fila] for fila in m]
+        for nombre, m in db.familias.items()
+    }
+    return {"personas": personas, "familias": fams}
+
+def restaurar_familias(data: Dict[str, Any]) -> None:
+    """Reemplaza db.familias por el contenido de un snapshot y reconstruye índices."""
+    personas = data.get("personas") or []
+    db.familias.clear()
+    db.indices.clear()
+    for nombre, m in (data.get("familias") or {}).items():
+        db.familias[nombre] = [[[personas[i] for i in celda] for celda in fila] for fila in m]
+        db.reindexar_familia(nombre)
+    db.reconstruir_contadores_cedula()
+
+def _escribir_atomico(ruta: str, texto: str) -> None:
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(texto)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+# ===========================================================
+# Almacén
+# ===========================================================
+
+class Almacen:
+    """
+    Motor de almacenamiento detrás de la API de db (crear_familia, agregar_persona, ...).
+      - abrir(): carga snapshot + diario y se engancha como db.journal
+      - registrar(op, args): agrega la operación al diario (lo llama db)
+      - registrar_tick(delta): agrega el delta de un tick del simulador
+      - snapshot(): vuelca el estado completo y descarta el diario que ya cubre
+      - cerrar(): snapshot final y desengancha
+    Orden de cerrojos: db.cerrojo (o db.lectura) y luego self._lock (igual que las
+    mutaciones de db); self._escritura solo envuelve archivos, nunca toma cerrojos de db.
+    """
+
+    def __init__(self, carpeta: str, snapshot_cada: int = 1000, fsync: bool = True,
+                 compactar_cada_seg: float | None = 60.0):
+        self.carpeta = carpeta
+        self.snapshot_cada = snapshot_cada
+        self.fsync = fsync
+        self.compactar_cada_seg = compactar_cada_seg  # None: snapshots en línea, sin hilo
+        self.seq = 0                 # última operación aplicada
+        self.hoy: Optional[str] = None  # fecha simulada del último tick registrado
+        self.stats: Dict[str, Any] = {}
+        self._ops_en_diario = 0
+        self._lock = threading.RLock()
+        self._escritura = threading.Lock()  # un snapshot a disco a la vez
+        self._seq_snapshot = -1             # seq del último snapshot escrito
+        self._f = None
+        self._compactador: Optional[threading.Thread] = None
+        self._pedido = threading.Event()
+        self._cerrando = False
+        self.ruta_snapshot = os.path.join(carpeta, SNAPSHOT)
+        self.ruta_diario = os.path.join(carpeta, DIARIO)
+
+    # ---------------- Arranque ----------------
+    def abrir(self) -> Dict[str, Any]:
+        """Restaura el estado persistido (si hay) y empieza a registrar. Devuelve métricas."""
+        t0 = time.perf_counter()
+        os.makedirs(self.carpeta, exist_ok=True)
+        hay_datos = (os.path.exists(self.ruta_snapshot) or os.path.exists(self.ruta_diario)
+                     or bool(self._rotados()))
+
+        repetidas = 0
+        if hay_datos:
+            db.journal = None  # no volver a registrar lo que se re-ejecuta
+            self._cargar_snapshot()
+            repetidas = self._repetir_diario()
+            db.reconstruir_contadores_cedula()
+
+        with db.cerrojo, self._lock:
+            self._f = open(self.ruta_diario, "a", encoding="utf-8")
+            db.journal = self.registrar
+            # Base limpia: incluye lo repetido (o el seed) y descarta una posible línea cortada
+            self.snapshot()
+
+        if self.compactar_cada_seg:
+            self._cerrando = False
+            self._compactador = threading.Thread(target=self._compactar, name="compactador", daemon=True)
+            self._compactador.start()
+
+        self.stats = {
+            "restaurado": hay_datos,
+            "seq": self.seq,
+            "operaciones_repetidas": repetidas,
+            "hoy": self.hoy,
+            "segundos": round(time.perf_counter() - t0, 4),
+        }
+        log.info("Persistencia abierta en %s: %s", self.carpeta, self.stats)
+        return self.stats
+
+    def _cargar_snapshot(self) -> int:
+        if not os.path.exists(self.ruta_snapshot):
+            db.familias.clear()
+            db.indices.clear()
+            return 0
+        with open(self.ruta_snapshot, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        restaurar_familias(data)
+        self.seq = int(data.get("seq", 0))
+        self.hoy = data.get("hoy")
+        return self.seq
+
+    def _rotados(self) -> List[Tuple[int, str]]:
+        """Diarios rotados que quedaron (un cierre durante un snapshot), por seq."""
+        if not os.path.isdir(self.carpeta):
+            return []
+        rotados = []
+        for nombre in os.listdir(self.carpeta):
+            m = _ROTADO.match(nombre)
+            if m:
+                rotados.append((int(m.group(1)), os.path.join(self.carpeta, nombre)))
+        return sorted(rotados)
+
+    def _repetir_diario(self) -> int:
+        repetidas = 0
+        for ruta in [r for _, r in self._rotados()] + [self.ruta_diario]:
+            if not os.path.exists(ruta):
+                continue
+            with open(ruta, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                    except json.JSONDecodeError:
+                        log.warning("Diario: línea final incompleta ignorada (%s)", ruta)
+                        break  # escritura cortada por un cierre abrupto
+                    seq = int(entrada.get("seq", 0))
+                    if seq <= self.seq:
+                        continue  # ya está dentro del snapshot
+                    self._aplicar(entrada)
+                    self.seq = seq
+                    repetidas += 1
+        self._ops_en_diario = repetidas
+        return repetidas
+
+    def _aplicar(self, entrada: Dict[str, Any]) -> None:
+        op = entrada.get("op")
+        args = entrada.get("args") or {}
+        try:
+            if op == "tick":
+                gestor.aplicar_delta(args["delta"])
+                self.hoy = args["delta"]["hoy"]
+            elif op in db.OPERACIONES_DIARIO:
+                getattr(db, op)(**args)
+            else:
+                log.warning("Diario: operación desconocida %r", op)
+        except Exception:
+            log.exception("Diario: no se pudo repetir %r", op)
+
+    # ---------------- Escritura ----------------
+    def registrar(self, op: str, args: Dict[str, Any]) -> None:
+        """Hook de db.journal: se ejecuta antes de aplicar la mutación."""
+        with db.cerrojo, self._lock:
+            if self._f is None:
+                return
+            if self._ops_en_diario >= self.snapshot_cada:
+                if self._compactador and self._compactador.is_alive():
+                    self._pedido.set()
+                else:
+                    # El estado en memoria todavía no incluye 'op': el snapshot cubre hasta self.seq
+                    self.snapshot()
+            self.seq += 1
+            linea = json.dumps({"seq": self.seq, "op": op, "args": args}, ensure_ascii=False, default=str)
+            self._f.write(linea + "\n")
+            self._f.flush()
+            if self.fsync:
+                os.fsync(self._f.fileno())
+            self._ops_en_diario += 1
+
+    def registrar_tick(self, delta: Dict[str, Any]) -> None:
+        """on_delta del gestor: el tick ya está aplicado y el gestor tiene db.cerrojo,
+        así que ningún snapshot puede colarse entre el estado y esta línea."""
+        with db.cerrojo, self._lock:
+            self.registrar("tick", {"delta": delta})
+            self.hoy = delta.get("hoy")
+
+    def _compactar(self) -> None:
+        """Hilo compactador: pliega el diario en un snapshot nuevo periódicamente."""
+        while True:
+            self._pedido.wait(self.compactar_cada_seg)
+            self._pedido.clear()
+            if self._cerrando:
+                return
+            try:
+                if self._ops_en_diario:
+                    t0 = time.perf_counter()
+                    self.snapshot()
+                    log.debug("Snapshot compactado en %.3fs (seq=%s)", time.perf_counter() - t0, self.seq)
+            except Exception:
+                log.exception("Compactador: no se pudo escribir el snapshot")
+
+    def snapshot(self) -> None:
+        """
+        Escribe el estado completo (atómico) y descarta el diario que ya cubre.
+        Bajo db.lectura() (los lectores siguen, los escritores esperan) rota el diario a
+        diario.<seq>.jsonl y serializa; el archivo, el fsync y el borrado del rotado van
+        fuera de los cerrojos de db. Si se corta antes de terminar, el arranque repite
+        el rotado sobre el snapshot anterior.
+        """
+        with db.lectura():
+            with self._lock:
+                seq = self.seq
+                self._rotar()
+                data = serializar_familias()
+                data["seq"] = seq
+                data["hoy"] = self.hoy
+                data["guardado"] = time.time()
+            texto = json.dumps(data, ensure_ascii=False, default=str)
+        with self._escritura:
+            if seq <= self._seq_snapshot:
+                return  # ya hay uno igual o más nuevo en disco
+            _escribir_atomico(self.ruta_snapshot, texto)
+            self._seq_snapshot = seq
+            for hasta, ruta in self._rotados():
+                if hasta <= seq:
+                    os.remove(ruta)
+
+    def _rotar(self) -> None:
+        """Pasa el diario actual a diario.<seq>.jsonl y abre uno vacío (con self._lock y
+        sin escritores: todo lo que tiene es <= self.seq)."""
+        self._ops_en_diario = 0
+        if self._f is None or self._f.tell() == 0:
+            return
+        self._f.close()
+        destino, n = os.path.join(self.carpeta, f"diario.{self.seq}.jsonl"), 0
+        while os.path.exists(destino):  # otro rotado con el mismo seq que no llegó a borrarse
+            n += 1
+            destino = os.path.join(self.carpeta, f"diario.{self.seq}.{n}.jsonl")
+        os.replace(self.ruta_diario, destino)
+        self._f = open(self.ruta_diario, "a", encoding="utf-8")
+
+    def cerrar(self) -> None:
+        if self._compactador:
+            self._cerrando = True
+            self._pedido.set()
+            self._compactador.join(timeout=5)
+            self._compactador = None
+        with db.cerrojo, self._lock:
+            if self._f is None:
+                return
+            if db.journal == self.registrar:
+                db.journal = None
+            self.snapshot()
+            self._f.close()
+            self._f = None
+
+
+# Instancia activa (la crea la app al arrancar)
+almacen: Optional[Almacen] = None
+
+def abrir(carpeta: str, **kwargs) -> Almacen:
+    """Crea el almacén, restaura los datos persistidos y lo deja como db.journal."""
+    global almacen
+    almacen = Almacen(carpeta, **kwargs)
+    almacen.abrir()
+    return almacen
+
+def registrar_tick(delta: Dict[str, Any]) -> None:
+    """Para GestorEventos(on_delta=...): no hace nada si no hay almacén abierto."""
+    if almacen:
+        almacen.registrar_tick(delta)
+
+def cerrar() -> None:
+    global almacen
+    if almacen:
+        almacen.cerrar()
+        almacen = None
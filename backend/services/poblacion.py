@@ -0,0 +1,118 @@
+# services/poblacion.py
+# Almacén columnar (NumPy) de las personas de cada familia, para el simulador.
+# Una fila por persona (clave_persona), aunque esté copiada en varias celdas:
+#   edad  int32  edad simulada (-1 = desconocida)
+#   viva  bool
+#   hash  uint64 hash64 de la clave (la "persona" de los sorteos de services/azar.py)
+# El tick envejece y sortea muertes sobre estos arreglos en bloque; los resultados
+# se escriben de vuelta en los dicts (p["edad"], p["fecha_defuncion"]) para que el
+# resto de la app siga leyendo personas como siempre.
+# La caché se reconstruye solo si db.version(familia) cambió por fuera del simulador
+# (altas desde la app, uniones, restauración); los cambios del propio tick la mantienen.
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from . import azar, db
+
+# Probabilidad de muerte por tramo de edad: [0,1) [1,40) [40,60) [60,75) [75,85) [85,100) [100,...)
+# A partir de los 100 años la muerte es segura.
+LIMITES_EDAD = np.array([1, 40, 60, 75, 85, 100], dtype=np.int32)
+PROB_POR_TRAMO = np.array([0.001, 0.003, 0.005, 0.015, 0.04, 0.08, 1.0])
+
+def prob_muerte(edades: np.ndarray) -> np.ndarray:
+    """Probabilidad de morir en este tick para cada edad (edad desconocida = 0.001)."""
+    return PROB_POR_TRAMO[np.searchsorted(LIMITES_EDAD, edades, side="right")]
+
+
+class PoblacionFamilia:
+    """Columnas de edad/vida de una familia + los dicts de cada persona."""
+
+    def __init__(self, familia: str, personas: Iterable[dict], edad_de: Callable[[dict], Optional[int]]):
+        self.familia = familia
+        self.version = db.version(familia)
+        self.claves: List[str] = []
+        self.dicts: List[List[dict]] = []      # apariciones de cada persona
+        self.fila: Dict[str, int] = {}         # clave -> índice en las columnas
+        edades, vivas = [], []
+        for p in personas:
+            clave = db.clave_persona(p)
+            i = self.fila.get(clave)
+            if i is None:
+                i = self.fila[clave] = len(self.claves)
+                self.claves.append(clave)
+                self.dicts.append([])
+                e = edad_de(p)
+                edades.append(-1 if e is None else int(e))
+                vivas.append(not p.get("fecha_defuncion"))
+            self.dicts[i].append(p)
+        self.n = len(self.claves)
+        self.edad = np.array(edades, dtype=np.int32)
+        self.viva = np.array(vivas, dtype=bool)
+        self.hash = azar.hashes64(self.claves)
+
+    def _reservar(self, n: int) -> None:
+        """Crece las columnas al doble cuando hace falta (altas amortizadas O(1))."""
+        if n <= len(self.edad):
+            return
+        cap = max(n, 2 * len(self.edad), 16)
+        self.edad = np.resize(self.edad, cap)
+        self.viva = np.resize(self.viva, cap)
+        self.hash = np.resize(self.hash, cap)
+        self.viva[self.n:] = False
+
+    def agregar(self, persona: dict) -> None:
+        """Alta hecha por el simulador (ya insertada en db): queda sincronizada."""
+        clave = db.clave_persona(persona)
+        i = self.fila.get(clave)
+        if i is None:
+            self._reservar(self.n + 1)
+            i = self.fila[clave] = self.n
+            self.claves.append(clave)
+            self.dicts.append([])
+            e = persona.get("edad")
+            self.edad[i] = e if isinstance(e, int) else -1
+            self.viva[i] = not persona.get("fecha_defuncion")
+            self.hash[i] = azar.hash64(clave)
+            self.n += 1
+        self.dicts[i].append(persona)
+        self.version = db.version(self.familia)
+
+    def envejecer(self, anios: int) -> int:
+        """Suma 'anios' a todas las vivas (desconocida cuenta como 0). Devuelve cuántas."""
+        idx = np.flatnonzero(self.viva[:self.n])
+        edades = np.maximum(self.edad[idx], 0) + anios
+        self.edad[idx] = edades
+        for i, e in zip(idx.tolist(), edades.tolist()):
+            for p in self.dicts[i]:
+                p["edad"] = e
+        return len(idx)
+
+    def sortear_muertes(self, flujo: azar.Flujo, anios: int = 1) -> List[int]:
+        """Índices de las personas vivas que mueren en este tick (un sorteo por persona,
+        tomado de 'flujo' con su hash: no depende de quién más esté en la familia).
+        Si el tick cubre varios años, la probabilidad anual se compone: 1 - (1 - p)^anios."""
+        idx = np.flatnonzero(self.viva[:self.n])
+        prob = prob_muerte(self.edad[idx])
+        if anios > 1:
+            prob = 1 - (1 - prob) ** anios
+        sorteo = flujo.uniformes(self.hash[idx])
+        return idx[sorteo < prob].tolist()
+
+    def morir(self, i: int, fecha_iso: str) -> None:
+        self.viva[i] = False
+        for p in self.dicts[i]:
+            p["fecha_defuncion"] = fecha_iso
+
+
+_cache: Dict[str, PoblacionFamilia] = {}
+
+def de(familia: str, personas: Callable[[], Iterable[dict]],
+       edad_de: Callable[[dict], Optional[int]]) -> PoblacionFamilia:
+    """Población de la familia; se reconstruye si la familia cambió por fuera (db.version)."""
+    pob = _cache.get(familia)
+    if pob is None or pob.version != db.version(familia):
+        pob = _cache[familia] = PoblacionFamilia(familia, personas(), edad_de)
+    return pob
@@ -0,0 +1,39 @@
+# Las pruebas importan services/ desde backend/ y nunca tocan data/estado.
+import copy
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ARBOL_ESTADO_DIR", tempfile.mkdtemp(prefix="arbol-estado-"))
+
+from services import db  # noqa: E402
+
+
+def _estado():
+    return (db.familias, db.indices, db._contador_por_prov, db._cedulas_persona)
+
+def _poner(estado, vistas) -> None:
+    """Reemplaza el contenido de los dicts de db (los módulos los importan por referencia)
+    y sube la versión de cada familia por encima de todas las vistas: las cachés
+    derivadas (población, árbol, nombres...) se rearman sobre los dicts nuevos."""
+    for actual, nuevo in zip(_estado(), estado):
+        actual.clear()
+        actual.update(nuevo)
+    for fam in set(db.versiones) | set(db.familias):
+        db.versiones[fam] = max(v.get(fam, 0) for v in vistas) + 1
+
+
+@pytest.fixture(autouse=True)
+def estado_db():
+    """Cada prueba corre sobre una copia de familias/índices/versiones de db; al terminar
+    vuelven los originales, así ninguna depende de lo que agregó otra antes."""
+    originales = tuple(dict(d) for d in _estado())
+    versiones = dict(db.versiones)
+    journal = db.journal
+    _poner(copy.deepcopy(originales), [versiones])
+    yield
+    db.journal = journal
+    _poner(originales, [versiones, dict(db.versiones)])
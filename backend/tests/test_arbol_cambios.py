@@ -0,0 +1,60 @@
+# Feed de parches de arbol.cambios(): un cliente que arranca de instantanea() y aplica
+# los cambios cada tanto tiene que quedar igual al árbol armado en el servidor.
+import json
+from datetime import date
+
+from services import arbol, db
+from services import gestor as G
+
+
+def _canon(elementos):
+    return sorted(json.dumps(e, sort_keys=True) for e in elementos)
+
+
+def _aplicar(mapa, respuesta):
+    if respuesta.get("reset"):
+        mapa.clear()
+        mapa.update({e["data"]["id"]: e for e in respuesta["elements"]})
+        return
+    for op in respuesta["cambios"]:
+        if op["op"] == "remove":
+            assert op["id"] in mapa, op
+            del mapa[op["id"]]
+            continue
+        el = op["element"]
+        if op["op"] == "add":
+            assert el["data"]["id"] not in mapa, op
+        else:
+            assert el["data"]["id"] in mapa, op
+        mapa[el["data"]["id"]] = el
+
+
+def test_replica_del_cliente_sigue_al_servidor():
+    g = G.GestorEventos(tick_seg=1, rng_seed=3, on_delta=arbol.registrar_delta,
+                        prob_nacimiento_por_pareja_por_tick=0.5)
+    g.hoy = date(2025, 1, 1)
+    familias = db.listar_familias()
+    clientes = {}
+    for fam in familias:
+        els, cur = arbol.instantanea(fam)
+        clientes[fam] = [{e["data"]["id"]: e for e in els}, cur]
+
+    for t in range(60):
+        g._tick()
+        if t == 20:  # cambio desde la app: rearmado completo -> diff
+            db.agregar_persona({"nombre": "Zed", "apellidos": "X Y", "cedula": "777",
+                                "fecha_nacimiento": "2000-01-01"}, familias[0], 1, 0)
+        if t % 3:
+            continue
+        for fam, (mapa, cur) in clientes.items():
+            r = arbol.cambios(fam, cur)
+            _aplicar(mapa, r)
+            clientes[fam][1] = r["cursor"]
+            assert _canon(mapa.values()) == _canon(arbol.elementos(fam)), (t, fam)
+
+
+def test_cursor_de_otro_linaje_pide_reset():
+    fam = db.listar_familias()[0]
+    assert arbol.cambios(fam, "otro.1").get("reset")
+    _, cur = arbol.instantanea(fam)
+    assert arbol.cambios(fam, cur)["cambios"] == []
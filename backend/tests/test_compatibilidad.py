@@ -0,0 +1,49 @@
+# Filtro genético de las uniones: además de apellidos y hermanos de celda, nada de
+# primos hermanos, tío/a con sobrino/a ni ancestros (aunque estén en celdas distintas).
+from services import compatibilidad, db
+
+FAMILIA = "Prueba Compatibilidad"
+AFINIDADES = ["música", "lectura", "viajes"]
+
+
+def _persona(nombre, apellidos, cedula, genero, nacimiento="1990-01-01"):
+    return {"nombre": nombre, "apellidos": apellidos, "cedula": cedula, "genero": genero,
+            "fecha_nacimiento": nacimiento, "estado_civil": "Soltero", "afinidades": list(AFINIDADES)}
+
+
+def _familia():
+    """Abuelos en (0,0); sus hijos Ana y Beto en (1,0) y en parejas de fila 2; los hijos de
+    cada pareja (primos entre sí) en fila 3; Luz no es pariente de nadie."""
+    db.crear_familia(FAMILIA)
+    abuelo = _persona("Abel", "Mora Ruiz", "100", "Masculino", "1930-01-01")
+    abuela = _persona("Berta", "Soto Vega", "101", "Femenino", "1932-01-01")
+    ana = _persona("Ana", "Mora Soto", "110", "Femenino", "1975-01-01")
+    beto = _persona("Beto", "Mora Soto", "111", "Masculino", "1978-01-01")
+    ciro = _persona("Ciro", "Lara Paz", "120", "Masculino", "1974-01-01")
+    dora = _persona("Dora", "Rey Gil", "121", "Femenino", "1979-01-01")
+    for p, fila, col in ((abuelo, 0, 0), (abuela, 0, 0), (ana, 1, 0), (beto, 1, 0),
+                         (ciro, 2, 0), (ana, 2, 0), (beto, 2, 1), (dora, 2, 1)):
+        db.agregar_persona(p, FAMILIA, fila, col)
+    eva = _persona("Eva", "Lara Mora", "130", "Femenino", "1992-01-01")
+    fito = _persona("Fito", "Mora Rey", "131", "Masculino", "1993-01-01")
+    luz = _persona("Luz", "Vera Ortiz", "140", "Femenino", "1991-01-01")
+    db.agregar_persona(eva, FAMILIA, 3, 0)
+    db.agregar_persona(fito, FAMILIA, 3, 1)
+    db.agregar_persona(luz, FAMILIA, 1, 1)
+    return {p["nombre"]: db.clave_persona(p) for p in (abuelo, ana, beto, eva, fito, luz)}
+
+
+def test_primos_y_tios_no_son_compatibles():
+    c = _familia()
+    assert compatibilidad.parentesco_cercano(FAMILIA, c["Eva"], c["Fito"]) == "Comparten un padre o un abuelo."
+    assert compatibilidad.parentesco_cercano(FAMILIA, c["Beto"], c["Eva"]) == "Comparten un padre o un abuelo."
+    assert compatibilidad.parentesco_cercano(FAMILIA, c["Abel"], c["Eva"]) == "Uno es ancestro del otro."
+    assert compatibilidad.parentesco_cercano(FAMILIA, c["Fito"], c["Luz"]) is None
+
+    m = compatibilidad.MatrizCompatibilidad(FAMILIA)
+    pares = {frozenset(p[:2]) for p in m.pares()}
+    assert frozenset((c["Eva"], c["Fito"])) not in pares
+    assert frozenset((c["Beto"], c["Eva"])) not in pares
+    assert frozenset((c["Fito"], c["Luz"])) in pares
+    assert [x["cedula"] for x in m.candidatos(c["Fito"])] == [c["Luz"]]
+    assert m.emparejar([c["Fito"]], 1) == [(c["Fito"], c["Luz"], 100, 3)]
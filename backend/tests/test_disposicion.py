@@ -0,0 +1,50 @@
+# Disposicion.recalcular(): agregar nacimientos sobre el árbol cacheado tiene que dar lo
+# mismo que rearmarlo de cero, sin nodos encimados en ninguna fila.
+import json
+import random
+
+from services import arbol, db
+from services import disposicion as D
+
+FAMILIA = "Prueba Disposicion"
+
+
+def _canon(elementos):
+    return sorted(json.dumps(e, sort_keys=True) for e in elementos)
+
+
+def _sin_solapes(d):
+    for fila, xs in enumerate(d.x):
+        bloques = sorted((x - max(n, 1) * D.SLOT / 2, x + max(n, 1) * D.SLOT / 2)
+                         for x, n in zip(xs, d.n[fila]))
+        for (_, fin), (ini, _) in zip(bloques, bloques[1:]):
+            assert ini - fin >= D.SEPARACION - 1e-6, (fila, fin, ini)
+
+
+def test_incremental_igual_a_rearmado():
+    r = random.Random(0)
+    db.crear_familia(FAMILIA)
+    for i in range(1500):
+        db.agregar_persona({"nombre": f"N{i}", "apellidos": "A B", "cedula": f"9{i:08d}",
+                            "fecha_nacimiento": f"{r.randint(1930, 2020)}-0{r.randint(1, 9)}-1{r.randint(0, 9)}",
+                            "genero": "Femenino" if i % 2 else "Masculino", "estado_civil": "Casado"},
+                           FAMILIA, i % 4, (i * 7919) % (20 + 10 * (i % 4)))
+    m = db.obtener_matriz(FAMILIA)
+    arbol.elementos(FAMILIA)
+    for k in range(5):
+        bebes = []
+        for c in (r.randrange(len(m[3])) for _ in range(5)):
+            b = {"nombre": f"B{k}{c}", "apellidos": "A B", "cedula": f"8{k:02d}{c:06d}{len(bebes)}",
+                 "fecha_nacimiento": "2030-01-01", "genero": "Femenino", "estado_civil": "Soltero"}
+            db.agregar_persona(b, FAMILIA, 3, c)
+            bebes.append([FAMILIA, 3, c, b])
+        arbol.registrar_delta({"nacimientos": bebes})
+        incremental = arbol.elementos(FAMILIA)
+        a = arbol._cache[FAMILIA]
+        assert _canon(arbol.ArbolFamilia(FAMILIA, m).elementos()) == _canon(incremental), k
+        _sin_solapes(a.disposicion)
+
+
+def test_familias_semilla_sin_solapes():
+    for fam in db.listar_familias():
+        _sin_solapes(arbol.ArbolFamilia(fam, db.obtener_matriz(fam)).disposicion)
@@ -0,0 +1,39 @@
+# Tick paralelo por familia: solo se habilita sin GIL y da lo mismo que en serie.
+import copy
+import logging
+import sys
+from datetime import date
+
+from services import db
+from services import gestor as G
+
+
+def _gil(monkeypatch, habilitado):
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: habilitado, raising=False)
+
+
+def test_con_gil_no_usa_hilos(monkeypatch, caplog):
+    _gil(monkeypatch, True)
+    with caplog.at_level(logging.WARNING, logger=G.log.name):
+        g = G.GestorEventos(trabajadores=4)
+    assert g.trabajadores == 1 and g._pool is None
+    assert "GIL" in caplog.text
+
+
+def test_sin_gil_los_hilos_dan_lo_mismo_que_en_serie(monkeypatch):
+    _gil(monkeypatch, False)
+    estado = (db.familias, db.indices, db._contador_por_prov, db._cedulas_persona)
+    semilla = copy.deepcopy(estado)
+    deltas = []
+    for trabajadores in (1, 4):
+        for actual, nuevo in zip(estado, copy.deepcopy(semilla)):
+            actual.clear()
+            actual.update(nuevo)
+        for fam in db.familias:
+            db.versiones[fam] = db.version(fam) + 1
+        g = G.GestorEventos(rng_seed=7, prob_nacimiento_por_pareja_por_tick=0.3, trabajadores=trabajadores)
+        assert (g._pool is not None) == (trabajadores > 1)
+        g.hoy = date(2025, 1, 1)
+        deltas.append([g._paso(1, None) for _ in range(25)])
+    assert sum(len(d["muertes"]) + len(d["nacimientos"]) for d in deltas[0]) > 0
+    assert deltas[0] == deltas[1]
@@ -0,0 +1,78 @@
+# IndiceNombres.pagina(): recorrer todas las páginas da el mismo orden que puntuar a
+# todos los nombres por fuerza bruta, y un cursor ilegible es la primera página.
+import random
+
+import pytest
+
+from services import db, nombres
+
+FAMILIA = "Prueba Nombres"
+_N = ["Ana", "Luis", "María", "José", "Sofía", "Mateo", "Marta"] + [f"Nom{i}" for i in range(60)]
+_A = ["Rojas", "Vargas", "Mora", "Soto", "Jiménez", "Quesada"] + [f"Ape{i}" for i in range(80)]
+
+
+def _poblar(familia, n, base=0):
+    r = random.Random(base + 1)
+    for i in range(n):
+        k = r.choice([2, 3, 3, 4])
+        nom = r.choice(_N) + ("" if k < 4 else " " + r.choice(_N))
+        ape = " ".join(r.choice(_A) for _ in range(2 if k > 2 else 1))
+        db.agregar_persona({"nombre": nom, "apellidos": ape, "cedula": f"9{base + i:08d}",
+                            "fecha_nacimiento": "2000-01-01"}, familia, i % 4, i % 30)
+
+
+@pytest.fixture
+def ix():
+    db.crear_familia(FAMILIA)
+    _poblar(FAMILIA, 1500)
+    return nombres.para(FAMILIA)
+
+
+def _fuerza_bruta(ix, q):
+    pal = list(dict.fromkeys(nombres.palabras(q)))
+    out = []
+    for i in range(len(ix.nombres)):
+        s = 0
+        for w in pal:
+            c = ix._coincidencias(w)
+            mejor = max((c.get(t, 0) for t in ix.palabras[i]), default=0)
+            if not mejor:
+                break
+            s += mejor
+        else:
+            out.append((ix._clave(i, s), i))
+    return [ix.nombres[i] for _, i in sorted(out)]
+
+
+@pytest.mark.parametrize("q", ["ma", "so", "maria", "nom1", "rojas", "soto ma", "ape1 ape2", "quesda", "jim", "ola"])
+def test_paginas_igual_a_fuerza_bruta(ix, q):
+    todos, cur = [], None
+    while True:
+        items, cur = ix.pagina(q, 7, cur)
+        todos += [it["nombre_completo"] for it in items]
+        if not cur:
+            break
+    assert todos == _fuerza_bruta(ix, q)
+
+
+def test_altas_entre_paginas_no_repiten(ix):
+    items, cur = ix.pagina("ma", 20)
+    _poblar(FAMILIA, 200, base=100000)
+    siguientes, _ = nombres.para(FAMILIA).pagina("ma", 20, cur)
+    assert not {x["cedulas"][0] for x in items} & {x["cedulas"][0] for x in siguientes}
+
+
+def test_cursor_entero_igual_a_texto(ix):
+    _, cur = ix.pagina("ma", 5)
+    assert ix.pagina("ma", 5, int(cur)) == ix.pagina("ma", 5, cur)
+
+
+@pytest.mark.parametrize("cursor", [None, "", "x", "²", -1, True, 10 ** 9, [1], {"a": 1}])
+def test_cursor_ilegible_es_primera_pagina(ix, cursor):
+    assert ix.pagina("ma", 5, cursor) == ix.pagina("ma", 5)
+
+
+def test_mejores_devuelve_empates(ix):
+    mejores = ix.mejores("rojas")
+    assert len(mejores) > 1 and len({m["puntaje"] for m in mejores}) == 1
+    assert ix.claves_de("rojas") == []
@@ -0,0 +1,36 @@
+# Hermanos y medio hermanos según los progenitores registrados en el grafo de db.
+from services import db, parentesco
+
+FAMILIA = "Prueba Parentesco"
+
+
+def _persona(nombre, cedula, genero="Femenino"):
+    return {"nombre": nombre, "apellidos": "Prueba Uno", "cedula": cedula,
+            "fecha_nacimiento": "1980-01-01", "genero": genero}
+
+
+def _relacion(a, b):
+    return parentesco.relacion(FAMILIA, db.clave_persona(a), db.clave_persona(b))
+
+
+def test_un_solo_progenitor_registrado_son_hermanos():
+    db.crear_familia(FAMILIA)
+    madre, a, b = _persona("Madre", "101"), _persona("Ana", "102"), _persona("Bea", "103")
+    db.agregar_persona(madre, FAMILIA, 2, 0)
+    db.agregar_persona(a, FAMILIA, 3, 0)
+    db.agregar_persona(b, FAMILIA, 3, 0)
+    assert _relacion(a, b) == ("hermanos", True)
+
+
+def test_comparten_un_solo_progenitor_son_medio_hermanos():
+    db.crear_familia(FAMILIA)
+    padre = _persona("Padre", "201", "Masculino")
+    m1, m2 = _persona("Madre", "202"), _persona("Otra", "203")
+    a, b, c = _persona("Ana", "204"), _persona("Bea", "205"), _persona("Cora", "206")
+    for p, col in ((padre, 0), (m1, 0), (padre, 1), (m2, 1)):
+        db.agregar_persona(p, FAMILIA, 2, col)
+    db.agregar_persona(a, FAMILIA, 3, 0)
+    db.agregar_persona(c, FAMILIA, 3, 0)
+    db.agregar_persona(b, FAMILIA, 3, 1)
+    assert _relacion(a, c) == ("hermanos", True)
+    assert _relacion(a, b) == ("medio hermanos", True)
@@ -0,0 +1,102 @@
+# Lo que el simulador deja en el diario se repite igual al restaurar, venga de ticks
+# sueltos o de advance().
+import json
+import threading
+from datetime import date
+
+import pytest
+
+from services import db, persistencia
+from services import gestor as G
+
+
+def _estado():
+    return json.dumps({fam: [[[(db.clave_persona(p), p.get("estado_civil"), p.get("fecha_defuncion"),
+                                p.get("union_con"), p.get("edad")) for p in celda] for celda in fila]
+                             for fila in db.obtener_matriz(fam)]
+                       for fam in db.listar_familias()}, sort_keys=True)
+
+
+def _cierre_abrupto(almacen):
+    """Como un proceso que muere: sin snapshot final, solo lo que ya está en el diario."""
+    db.journal = None
+    almacen._f.close()
+    almacen._f = None
+
+
+@pytest.mark.parametrize("avanzar", [
+    lambda g: g.advance(30),
+    lambda g: [g._tick() for _ in range(30)],
+], ids=["advance", "ticks"])
+def test_restaurar_repite_el_simulador(tmp_path, avanzar):
+    almacen = persistencia.Almacen(str(tmp_path), snapshot_cada=10 ** 6, compactar_cada_seg=None)
+    almacen.abrir()
+    g = G.GestorEventos(rng_seed=42, prob_nacimiento_por_pareja_por_tick=0.25,
+                        on_delta=almacen.registrar_tick)
+    g.hoy = date(2025, 1, 1)
+    avanzar(g)
+    antes = _estado()
+    _cierre_abrupto(almacen)
+
+    restaurado = persistencia.Almacen(str(tmp_path), snapshot_cada=10 ** 6, compactar_cada_seg=None)
+    restaurado.abrir()
+    try:
+        assert restaurado.stats["operaciones_repetidas"] == 30
+        assert restaurado.hoy == g.hoy.isoformat()
+        assert _estado() == antes
+    finally:
+        restaurado.cerrar()
+
+
+def test_snapshot_escribe_el_archivo_sin_el_cerrojo_de_escritura(tmp_path, monkeypatch):
+    almacen = persistencia.Almacen(str(tmp_path), snapshot_cada=10 ** 6, compactar_cada_seg=None)
+    almacen.abrir()
+    fam = db.listar_familias()[0]
+    db.agregar_persona({"nombre": "Zed", "apellidos": "X Y", "cedula": "777"}, fam, 1, 0)
+    escritor_libre = []
+    escribir = persistencia._escribir_atomico
+
+    def tomar_cerrojo():
+        with db.cerrojo:
+            escritor_libre.append(True)
+
+    def espiar(ruta, texto):
+        # Otro hilo tiene que poder escribir en db mientras el snapshot va a disco
+        t = threading.Thread(target=tomar_cerrojo)
+        t.start()
+        t.join(timeout=2)
+        escribir(ruta, texto)
+
+    monkeypatch.setattr(persistencia, "_escribir_atomico", espiar)
+    try:
+        almacen.snapshot()
+        assert escritor_libre == [True]
+    finally:
+        almacen.cerrar()
+
+
+def test_corte_entre_rotar_y_escribir_el_snapshot(tmp_path, monkeypatch):
+    almacen = persistencia.Almacen(str(tmp_path), snapshot_cada=10 ** 6, compactar_cada_seg=None)
+    almacen.abrir()
+    fam = db.listar_familias()[0]
+    db.agregar_persona({"nombre": "Zed", "apellidos": "X Y", "cedula": "777"}, fam, 1, 0)
+
+    def cortar(ruta, texto):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(persistencia, "_escribir_atomico", cortar)
+    with pytest.raises(OSError):
+        almacen.snapshot()  # el diario ya quedó rotado, el snapshot no se escribió
+    db.agregar_persona({"nombre": "Ana", "apellidos": "Q R", "cedula": "778"}, fam, 1, 0)
+    antes = _estado()
+    _cierre_abrupto(almacen)
+    monkeypatch.undo()
+
+    restaurado = persistencia.Almacen(str(tmp_path), snapshot_cada=10 ** 6, compactar_cada_seg=None)
+    restaurado.abrir()
+    try:
+        assert restaurado.stats["operaciones_repetidas"] == 2
+        assert _estado() == antes
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["diario.jsonl", "snapshot.json"]
+    finally:
+        restaurado.cerrar()